@@ -1,79 +1,29 @@
 # app.py
 import os
-import io
-from contextlib import redirect_stdout
 
 import pandas as pd
 import streamlit as st
 
-from src.data_loader import load_historical_data, load_future_matches, load_team_strength
-from src.calculator import CornerOddsCalculator
+from src.data_loader import (
+    HistoryStore,
+    TeamRegistry,
+    load_form_history,
+    load_future_matches,
+    load_historical_data,
+    load_team_aliases,
+    load_team_strength,
+)
+from src.calculator import CornerOddsCalculator, ENGINES
+from src.distributions import DISTRIBUTIONS
+from src.results import MatchPrice
 from src.validator import OddsValidator
-from src.formatter import format_match_output
-from src.config import CONFIG
+from src.formatter import render_match_output
+from src.profiling import PROFILE_MODES, profile_call
+from src.config import CONFIG, PricingConfig
 
 
 # ---------- Helpers ----------
 
-def load_form_history_any(path: str) -> pd.DataFrame | None:
-    """
-    Поддерживает 2 формата:
-
-    A) ТВОЙ СЕЙЧАС:
-       Date,HomeTeam,AwayTeam,...,HC,AC
-       (берем именно угловые HC/AC)
-
-    B) СТАРЫЙ:
-       Date,p1,p2,score_p1,score_p2
-
-    Возвращаем унифицированный df:
-       Date,p1,p2,score_p1,score_p2
-    """
-    if not path or not os.path.exists(path):
-        return None
-
-    df = pd.read_csv(path)
-
-    # дата
-    if "Date" in df.columns:
-        df["Date"] = pd.to_datetime(df["Date"], dayfirst=True, errors="coerce")
-    else:
-        return None
-
-    cols = set(df.columns)
-
-    # Формат B
-    if {"p1", "p2", "score_p1", "score_p2"}.issubset(cols):
-        out = df[["Date", "p1", "p2", "score_p1", "score_p2"]].copy()
-        out["p1"] = out["p1"].astype(str).str.strip()
-        out["p2"] = out["p2"].astype(str).str.strip()
-        out["score_p1"] = pd.to_numeric(out["score_p1"], errors="coerce")
-        out["score_p2"] = pd.to_numeric(out["score_p2"], errors="coerce")
-        out = out.dropna(subset=["Date", "p1", "p2", "score_p1", "score_p2"])
-        return out
-
-    # Формат A (твоя лига-таблица сезона)
-    # Нужны HomeTeam, AwayTeam, HC, AC
-    if {"HomeTeam", "AwayTeam", "HC", "AC"}.issubset(cols):
-        out = df[["Date", "HomeTeam", "AwayTeam", "HC", "AC"]].copy()
-        out = out.rename(
-            columns={
-                "HomeTeam": "p1",
-                "AwayTeam": "p2",
-                "HC": "score_p1",
-                "AC": "score_p2",
-            }
-        )
-        out["p1"] = out["p1"].astype(str).str.strip()
-        out["p2"] = out["p2"].astype(str).str.strip()
-        out["score_p1"] = pd.to_numeric(out["score_p1"], errors="coerce")
-        out["score_p2"] = pd.to_numeric(out["score_p2"], errors="coerce")
-        out = out.dropna(subset=["Date", "p1", "p2", "score_p1", "score_p2"])
-        return out
-
-    return None
-
-
 def safe_team(x) -> str:
     if x is None:
         return ""
@@ -99,16 +49,18 @@ def run_and_capture_output(home_team, away_team, calculator, validator, historic
     )
     warnings = validator.validate(match_odds)
 
-    buf = io.StringIO()
-    with redirect_stdout(buf):
-        format_match_output(home_team, away_team, match_odds, warnings)
-    return buf.getvalue(), match_odds, warnings
+    text = render_match_output(home_team, away_team, match_odds, warnings, calculator.config)
+    return text, match_odds, warnings
 
 
 def markets_to_table(match_odds: dict) -> pd.DataFrame:
     """
     Собираем рынки в табличку (чтобы было удобно глазами смотреть).
     """
+    if isinstance(match_odds, MatchPrice):
+        df = _price_markets_table(match_odds)
+        return df.sort_values(["market", "line"], kind="stable").reset_index(drop=True)
+
     rows = []
 
     # 1X2
@@ -148,6 +100,26 @@ def markets_to_table(match_odds: dict) -> pd.DataFrame:
     return df
 
 
+_MARKET_TITLES = {
+    "odds_1x2": "1X2",
+    "totals": "Totals",
+    "individual_home": "IT Home",
+    "individual_away": "IT Away",
+}
+
+
+def _price_markets_table(price: MatchPrice) -> pd.DataFrame:
+    """
+    MatchPrice -> та же табличка прямо из раскладки рынков (без вложенных dict).
+    """
+    layout = price.layout
+    markets = [
+        f"AH ({team})" if section == "handicaps" else _MARKET_TITLES[section]
+        for section, team in zip(layout.sections, layout.teams)
+    ]
+    return pd.DataFrame({"market": markets, "line": list(layout.labels), "odds": price.odds})
+
+
 # ---------- Streamlit UI ----------
 
 st.set_page_config(page_title="Corners Odds App", layout="wide")
@@ -160,10 +132,28 @@ with st.sidebar:
     future_path = st.text_input("future_matches.csv", "data/future_matches.csv")
     strength_path = st.text_input("team_strength.csv", "data/team_strength.csv")
     form_path = st.text_input("history_5matches.csv", "data/history_5matches.csv")
+    use_store = st.checkbox(
+        "SQLite-хранилище истории",
+        value=False,
+        help=f"история и форма через {CONFIG['HISTORY_STORE_PATH']} (общий файл с predict.py --store)",
+    )
 
     st.divider()
     st.header("⚙️ Параметры расчёта")
     margin = st.slider("Маржа", 0.0, 0.20, float(CONFIG.get("MARGIN", 0.085)), 0.005)
+    engine = st.selectbox(
+        "Движок расчёта",
+        list(ENGINES),
+        index=list(ENGINES).index(CONFIG.get("PRICING_ENGINE", "mc")),
+        help="mc — Monte Carlo, exact — точные pmf Poisson, table — предрасчитанные таблицы",
+    )
+    distribution = st.selectbox(
+        "Распределение угловых",
+        list(DISTRIBUTIONS),
+        index=list(DISTRIBUTIONS).index(CONFIG.get("COUNT_DISTRIBUTION", "poisson")),
+        help="poisson — движок выше, negbin — с дисперсией, bivariate — с корреляцией хозяев/гостей "
+             "(параметр по истории, расчёт точными pmf)",
+    )
     n_sim = st.slider("Симуляции (Monte Carlo)", 1000, 200000, int(CONFIG.get("N_SIMULATIONS", 100000)), 1000)
 
     st.divider()
@@ -179,19 +169,23 @@ with st.sidebar:
     total_lines_str = st.text_input("TOTAL_LINES (через запятую)", ",".join(map(str, CONFIG.get("TOTAL_LINES", [8.5, 9.5, 10.5, 11.5]))))
     it_lines_str = st.text_input("IT_LINES (через запятую)", ",".join(map(str, CONFIG.get("IT_LINES", [3.5, 4.5, 5.5, 6.5]))))
 
+    # EWMA-профили команд (0 = плоские средние)
+    half_life = st.slider(
+        "PROFILE_HALF_LIFE (игр, 0 = выкл)", 0, 50, int(CONFIG.get("PROFILE_HALF_LIFE") or 0), 1,
+        help="EWMA: вес игры падает вдвое через N игр команды (base λ и профили for/against)",
+    )
+
     # Anchor (если используешь)
     anchor_weight = st.slider("ANCHOR_WEIGHT", 0.0, 1.0, float(CONFIG.get("ANCHOR_WEIGHT", 0.0)), 0.05)
 
     debug_form = st.checkbox("Печатать подробный Form debug (много текста)", value=False)
 
-# применяем настройки в CONFIG (чтобы formatter использовал новые линии)
-CONFIG["MARGIN"] = float(margin)
-CONFIG["N_SIMULATIONS"] = int(n_sim)
-CONFIG["FORM_N_GAMES"] = int(form_n)
-CONFIG["FORM_BETA"] = float(form_beta)
-CONFIG["FORM_CLIP_LOW"] = float(form_clip_low)
-CONFIG["FORM_CLIP_HIGH"] = float(form_clip_high)
-CONFIG["ANCHOR_WEIGHT"] = float(anchor_weight)
+    st.divider()
+    profile_mode = st.selectbox(
+        "⏱️ Профилирование расчёта",
+        ["off"] + list(PROFILE_MODES),
+        help="cprofile — каждый вызов (.pstats + .collapsed), sample — семплирование стека (.collapsed); файлы в reports/",
+    )
 
 def parse_lines(s: str, fallback: list[float]) -> list[float]:
     try:
@@ -205,32 +199,64 @@ def parse_lines(s: str, fallback: list[float]) -> list[float]:
     except Exception:
         return fallback
 
-CONFIG["TOTAL_LINES"] = parse_lines(total_lines_str, [8.5, 9.5, 10.5, 11.5])
-CONFIG["IT_LINES"] = parse_lines(it_lines_str, [3.5, 4.5, 5.5, 6.5])
+# настройки этой сессии — свой неизменяемый снимок (глобальный CONFIG не трогаем,
+# чтобы параллельные сессии не портили друг другу расчёт)
+pricing_config = PricingConfig(
+    CONFIG,
+    MARGIN=float(margin),
+    N_SIMULATIONS=int(n_sim),
+    PRICING_ENGINE=engine,
+    COUNT_DISTRIBUTION=distribution,
+    PROFILE_HALF_LIFE=float(half_life) if half_life else None,
+    FORM_N_GAMES=int(form_n),
+    FORM_BETA=float(form_beta),
+    FORM_CLIP_LOW=float(form_clip_low),
+    FORM_CLIP_HIGH=float(form_clip_high),
+    ANCHOR_WEIGHT=float(anchor_weight),
+    TOTAL_LINES=parse_lines(total_lines_str, [8.5, 9.5, 10.5, 11.5]),
+    IT_LINES=parse_lines(it_lines_str, [3.5, 4.5, 5.5, 6.5]),
+    FORM_DEBUG=bool(debug_form),
+)
 
 # загружаем данные
 load_error = None
 historical_df = future_df = None
 team_strength = {}
+registry = TeamRegistry(load_team_aliases("data/team_aliases.csv"))
 form_df = None
 
+store = HistoryStore(registry=registry) if use_store else None
+
 try:
-    historical_df = load_historical_data(historical_path)
-    future_df = load_future_matches(future_path)
+    if store is not None:
+        store.sync_history(historical_path)
+        historical_df = store.history_frame(registry=registry)
+    else:
+        historical_df = load_historical_data(historical_path, registry=registry)
+    future_df = load_future_matches(future_path, registry=registry)
 except Exception as e:
     load_error = f"❌ Ошибка загрузки historical/future: {e}"
 
 try:
     if strength_path and os.path.exists(strength_path):
-        team_strength = load_team_strength(strength_path)
+        team_strength = load_team_strength(strength_path, registry=registry)
 except Exception:
     team_strength = {}
 
 try:
-    form_df = load_form_history_any(form_path)
+    form_df = None
+    if form_path and os.path.exists(form_path):
+        if store is not None:
+            store.sync_form(form_path)
+            form_df = store.form_frame(registry=registry)
+        else:
+            form_df = load_form_history(form_path, registry=registry)
 except Exception:
     form_df = None
 
+if store is not None:
+    store.close()
+
 if load_error:
     st.error(load_error)
     st.stop()
@@ -275,33 +301,45 @@ with colB:
     st.write(f"team_strength команд: **{len(team_strength)}**")
     st.write(f"form_df матчей: **{0 if form_df is None else len(form_df)}**")
 
+    unmatched = registry.unmatched_report()
+    if len(unmatched):
+        st.warning(f"Команды не найдены в historical.csv: {len(unmatched)} (алиасы: data/team_aliases.csv)")
+        st.dataframe(unmatched, use_container_width=True)
+
 if run_btn:
     if not home_team or not away_team:
         st.error("Не указаны команды.")
         st.stop()
 
     # калькулятор
-    calculator = CornerOddsCalculator(margin=float(margin), n_simulations=int(n_sim))
-    validator = OddsValidator()
-
-    # если хочешь form debug в UI — включим его прямо в калькулятор
-    # (работает только если в твоем calculator.py debug_print берется из CONFIG или аргумента;
-    #  если нет — просто игнорируется)
-    try:
-        CONFIG["FORM_DEBUG_PRINT"] = bool(debug_form)
-    except Exception:
-        pass
-
-    text, match_odds, warnings = run_and_capture_output(
-        home_team, away_team,
-        calculator, validator,
-        historical_df, team_strength, form_df
-    )
+    calculator = CornerOddsCalculator(config=pricing_config, registry=registry)
+    validator = OddsValidator(config=pricing_config)
+
+    profile = None
+    if profile_mode == "off":
+        text, match_odds, warnings = run_and_capture_output(
+            home_team, away_team,
+            calculator, validator,
+            historical_df, team_strength, form_df
+        )
+    else:
+        (text, match_odds, warnings), profile = profile_call(
+            run_and_capture_output,
+            home_team, away_team,
+            calculator, validator,
+            historical_df, team_strength, form_df,
+            mode=profile_mode, name="app", log=lambda *a, **kw: None,
+        )
 
     st.divider()
     st.subheader("🖨️ Вывод (как в консоли)")
     st.code(text, language="text")
 
+    if profile is not None:
+        st.subheader(f"⏱️ Профиль ({profile['mode']}, {profile['wall_s']:.2f} с)")
+        st.dataframe(pd.DataFrame(profile["top"]), use_container_width=True)
+        st.caption("Файлы: " + ", ".join(profile["files"]))
+
     st.subheader("📊 Таблица рынков")
     tbl = markets_to_table(match_odds)
     st.dataframe(tbl, use_container_width=True)
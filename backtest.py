@@ -0,0 +1,70 @@
+# backtest.py
+
+import argparse
+import os
+
+from src.data_loader import load_historical_data, load_team_strength
+from src.backtest import run_backtest
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Walk-forward backtest модели угловых")
+    parser.add_argument(
+        "--history",
+        default="data/historical.csv",
+        help="история матчей (HomeTeam, AwayTeam, HC, AC; Date — если есть, сортируем по ней)",
+    )
+    parser.add_argument(
+        "--min-history",
+        type=int,
+        default=20,
+        help="сколько первых матчей только копят статистику (без оценки)",
+    )
+    parser.add_argument(
+        "--out",
+        default="reports/backtest.csv",
+        help="предсказания по матчам (рядом пишется *_calibration.csv)",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    print("=" * 80)
+    print("         WALK-FORWARD BACKTEST (угловые)")
+    print("=" * 80)
+
+    print("\n📂 Загрузка данных...")
+    historical_df = load_historical_data(args.history)
+    print(f"✅ Загружено {len(historical_df)} исторических матчей")
+
+    try:
+        team_strength = load_team_strength("data/team_strength.csv")
+        print(f"✅ team_strength: {len(team_strength)} команд")
+    except Exception as e:
+        team_strength = {}
+        print(f"⚠️ team_strength отключен: {e}")
+
+    pred, summary, calibration = run_backtest(historical_df, team_strength, min_history=args.min_history)
+
+    if summary["n"] == 0:
+        print("\n⚠️  Нет матчей для оценки (мало истории?)")
+        return
+
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    pred.to_csv(args.out, index=False)
+    calibration_path = os.path.splitext(args.out)[0] + "_calibration.csv"
+    calibration.to_csv(calibration_path, index=False)
+
+    print(f"\n📊 Оценено матчей: {summary['n']}")
+    for key, value in summary.items():
+        if key != "n":
+            print(f"  {key:<22} {value:.4f}")
+
+    print(f"\n💾 CSV: {args.out}")
+    print(f"💾 Калибровка: {calibration_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+# benchmarks/engine_accuracy.py
+"""
+Точность против стоимости движков расчёта: сколько симуляций реально нужно.
+
+Для выборки матчей из истории (λ через fixture_lambdas) и сетки λ каждый путь
+расчёта сравнивается с эталоном — точными pmf Poisson с запасом усечения:
+  exact                      — движок exact
+  table                      — движок table (предрасчитанные таблицы)
+  mc n=...                   — движок mc (RandomState(42), n_simulations)
+  mc_chunked n=... chunk=... — MC кусками фиксированного размера (память O(chunk))
+  mc_antithetic n=...        — MC со снижением дисперсии: антитетические пары
+                               (u, 1-u) через обратную CDF Poisson
+
+Коэффициенты сравниваются после маржи и сетки букмекера (как в выводе):
+max/mean |Δ коэффициента|, доля совпавших цен, мс на матч и пиковая память
+(tracemalloc, один матч). Итог — самый дешёвый путь, где все цены совпали.
+
+Запуск из корня проекта:
+  python benchmarks/engine_accuracy.py [--sims 10000,100000,1000000] [--fixtures 12] [--grid 3]
+"""
+
+import argparse
+import csv
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src.calculator import CornerOddsCalculator
+from src.data_loader import TeamRegistry, load_historical_data, load_team_aliases
+from src.pmf_tables import poisson_k_max, poisson_pmf
+
+# запас усечения эталона сверх poisson_k_max
+_REFERENCE_EXTRA_K = 30
+# цена "совпала": разница — шум плавающей точки (усечение pmf, порядок сумм)
+_SAME_TOL = 1e-9
+
+
+def reference_cdf_sf(lh, la):
+    joint = np.outer(
+        poisson_pmf(lh, poisson_k_max(lh) + _REFERENCE_EXTRA_K),
+        poisson_pmf(la, poisson_k_max(la) + _REFERENCE_EXTRA_K),
+    )
+    return CornerOddsCalculator._cdf_sf_from_joint(joint, 1.0)
+
+
+def _add_counts(counts, home, away):
+    """
+    Счётчики исходов counts[home, away] += выборка (матрица растёт по мере надобности).
+    """
+    kh = max(counts.shape[0], int(home.max()) + 1)
+    ka = max(counts.shape[1], int(away.max()) + 1)
+    if (kh, ka) != counts.shape:
+        counts = np.pad(counts, ((0, kh - counts.shape[0]), (0, ka - counts.shape[1])))
+    counts += np.bincount(home * ka + away, minlength=kh * ka).reshape(kh, ka)
+    return counts
+
+
+def mc_chunked_cdf_sf(lh, la, n, chunk, seed=42):
+    rng = np.random.default_rng(seed)
+    counts = np.zeros((1, 1))
+    done = 0
+    while done < n:
+        size = min(chunk, n - done)
+        counts = _add_counts(counts, rng.poisson(lh, size), rng.poisson(la, size))
+        done += size
+    return CornerOddsCalculator._cdf_sf_from_joint(counts, n)
+
+
+def mc_antithetic_cdf_sf(lh, la, n, seed=42):
+    rng = np.random.default_rng(seed)
+    half = max(1, n // 2)
+    u = rng.random(half)
+    v = rng.random(half)
+
+    def ppf(lam, q):
+        cdf = np.cumsum(poisson_pmf(lam, poisson_k_max(lam)))
+        return np.minimum(np.searchsorted(cdf, q, side="right"), len(cdf) - 1)
+
+    home = ppf(lh, np.concatenate([u, 1.0 - u]))
+    away = ppf(la, np.concatenate([v, 1.0 - v]))
+    return CornerOddsCalculator._cdf_sf_from_joint(_add_counts(np.zeros((1, 1)), home, away), 2 * half)
+
+
+def sample_lambdas(n_fixtures, grid, seed):
+    """
+    λ матчей: случайные пары команд из истории + сетка grid x grid по диапазону λ.
+    """
+    registry = TeamRegistry(load_team_aliases(os.path.join(ROOT, "data/team_aliases.csv")))
+    historical = load_historical_data(os.path.join(ROOT, "data/historical.csv"), registry=registry)
+    teams = sorted(set(historical["HomeTeam"].dropna()) & set(historical["AwayTeam"].dropna()))
+
+    rng = np.random.default_rng(seed)
+    pairs = [tuple(rng.choice(teams, 2, replace=False)) for _ in range(n_fixtures)] if len(teams) > 1 else []
+    calc = CornerOddsCalculator(engine="exact", registry=registry)
+    lh, la = calc.fixture_lambdas(historical, [h for h, _ in pairs], [a for _, a in pairs])
+
+    points = list(zip(np.asarray(lh, dtype=float), np.asarray(la, dtype=float)))
+    axis = np.linspace(calc.config["MIN_LAMBDA"] + 1.0, min(calc.config["MAX_LAMBDA"], 10.0), grid) if grid else []
+    points += [(float(h), float(a)) for h in axis for a in axis]
+    return points
+
+
+def odds_matrix(calc, cdf_sf):
+    """
+    cdf_sf -> коэффициенты всех рынков (маржа + сетка) в порядке ключей.
+    """
+    probs = calc._market_probabilities(cdf_sf, calc.config)
+    odds = calc._odds_arrays_from_probabilities(probs)
+    return np.array([float(odds[k]) for k in sorted(odds)])
+
+
+def candidates(sims, chunk):
+    """
+    (путь, параметры, функция (lh, la) -> cdf_sf).
+    """
+    exact = CornerOddsCalculator(engine="exact")
+    table = CornerOddsCalculator(engine="table")
+    out = [("exact", "", exact._cdf_sf), ("table", "", table._cdf_sf)]
+    for n in sims:
+        mc = CornerOddsCalculator(engine="mc", n_simulations=n)
+        out.append(("mc", f"n={n}", mc._cdf_sf))
+        out.append(("mc_chunked", f"n={n} chunk={min(chunk, n)}",
+                    lambda lh, la, n=n: mc_chunked_cdf_sf(lh, la, n, chunk)))
+        out.append(("mc_antithetic", f"n={n}", lambda lh, la, n=n: mc_antithetic_cdf_sf(lh, la, n)))
+    return out
+
+
+def measure(name, params, cdf_sf, points, reference, calc):
+    cdf_sf(*points[0])  # прогрев (таблицы, кэши)
+
+    t0 = time.perf_counter()
+    odds = [odds_matrix(calc, cdf_sf(lh, la)) for lh, la in points]
+    ms = (time.perf_counter() - t0) / len(points) * 1000
+
+    # пиковая память — на матче с самыми большими λ
+    lh, la = max(points, key=lambda p: p[0] + p[1])
+    tracemalloc.start()
+    cdf_sf(lh, la)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    got = np.stack(odds)
+    both_nan = np.isnan(got) & np.isnan(reference)
+    same = (np.abs(got - reference) <= _SAME_TOL) | both_nan
+    finite = ~np.isnan(got) & ~np.isnan(reference)
+    err = np.abs(got - reference)[finite]
+    return {
+        "path": name,
+        "params": params,
+        "max_err": float(err.max()) if err.size else 0.0,
+        "mean_err": float(err.mean()) if err.size else 0.0,
+        "identical": float(same.mean()),
+        "ms_per_fixture": ms,
+        "peak_mb": peak / 2**20,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Точность коэффициентов против времени/памяти по движкам")
+    parser.add_argument("--sims", default="10000,100000,1000000", help="n_simulations для MC через запятую")
+    parser.add_argument("--chunk", type=int, default=250_000, help="размер куска для mc_chunked")
+    parser.add_argument("--fixtures", type=int, default=12, help="случайных пар команд из истории")
+    parser.add_argument("--grid", type=int, default=3, help="сетка λ grid x grid (0 — без сетки)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=os.path.join(ROOT, "reports", "engine_accuracy.csv"))
+    args = parser.parse_args(argv)
+
+    sims = [int(float(s)) for s in args.sims.split(",") if s.strip()]
+    points = sample_lambdas(args.fixtures, args.grid, args.seed)
+    calc = CornerOddsCalculator()
+    reference = np.stack([odds_matrix(calc, reference_cdf_sf(lh, la)) for lh, la in points])
+
+    print("=" * 80)
+    print(f"         ТОЧНОСТЬ vs СТОИМОСТЬ: {len(points)} матч(ей), {reference.shape[1]} рынков, маржа {calc.margin}")
+    print("=" * 80)
+    print(f"  {'путь':<14} {'параметры':<24} {'max Δ':>8} {'mean Δ':>9} {'совпало':>8} {'мс/матч':>9} {'пик МБ':>8}")
+
+    rows = []
+    for name, params, cdf_sf in candidates(sims, args.chunk):
+        r = measure(name, params, cdf_sf, points, reference, calc)
+        rows.append(r)
+        print(
+            f"  {r['path']:<14} {r['params']:<24} {r['max_err']:8.3f} {r['mean_err']:9.5f} "
+            f"{r['identical']:8.1%} {r['ms_per_fixture']:9.2f} {r['peak_mb']:8.1f}"
+        )
+
+    exact_rows = [r for r in rows if r["identical"] == 1.0]
+    if exact_rows:
+        best = min(exact_rows, key=lambda r: r["ms_per_fixture"])
+        print(f"\n✅ Самый дешёвый путь с ценами как у эталона: {best['path']} {best['params']} "
+              f"({best['ms_per_fixture']:.2f} мс/матч)")
+    else:
+        print("\n⚠️  Ни один путь не дал все цены как у эталона")
+
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"💾 {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# benchmarks/import_time.py
+"""
+Время старта predict.py:
+  1) python -X importtime: суммарное время импорта и самые тяжёлые модули
+  2) время до первого посчитанного матча (первая jsonl-строка в stdout)
+     для --loader numpy и --loader pandas
+
+Запуск из корня проекта:
+  python benchmarks/import_time.py [--repeats 5] [--top 10]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_importtime(stderr):
+    """
+    Строки 'import time: self [us] | cumulative | imported package' ->
+    список (self_us, cumulative_us, depth, name).
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip(" "))) // 2
+        rows.append((int(self_us), int(cumulative_us), depth, name.strip()))
+    return rows
+
+
+def measure_import(module, repeats):
+    totals = []
+    last = []
+    for _ in range(repeats):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=ROOT, capture_output=True, text=True, check=True,
+        )
+        last = parse_importtime(proc.stderr)
+        # верхний уровень (depth 0) — это всё, что реально импортировано
+        totals.append(sum(cum for _, cum, depth, _ in last if depth == 0))
+    return statistics.median(totals), last
+
+
+def time_to_first_fixture(loader, repeats):
+    """
+    Секунды от запуска процесса до первой jsonl-строки (движок exact, без Excel).
+    """
+    times = []
+    with tempfile.TemporaryDirectory() as tmp:
+        cmd = [
+            sys.executable, "predict.py",
+            "--output", "jsonl", "--engine", "exact", "--excel", "off",
+            "--loader", loader, "--out", os.path.join(tmp, "predictions.csv"),
+        ]
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            proc = subprocess.Popen(cmd, cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+            first = proc.stdout.readline()
+            elapsed = time.perf_counter() - t0
+            proc.stdout.read()
+            proc.wait()
+            if first:
+                times.append(elapsed)
+    return statistics.median(times) if times else float("nan")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Время импорта и старта predict.py")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    print("=" * 80)
+    print("         ИМПОРТ (python -X importtime, медиана)")
+    print("=" * 80)
+    last = []
+    for module in ("numpy", "pandas", "src.calculator", "predict"):
+        total_us, rows = measure_import(module, args.repeats)
+        if module == "predict":
+            last = rows
+        print(f"  {module:<16} {total_us / 1000:8.1f} ms")
+
+    print(f"\n🐢 Самые тяжёлые модули при import predict (cumulative, top {args.top}):")
+    top = sorted((r for r in last if r[2] <= 1), key=lambda r: -r[1])[:args.top]
+    for self_us, cum_us, depth, name in top:
+        print(f"  {'  ' * depth}{name:<30} {cum_us / 1000:8.1f} ms  (self {self_us / 1000:.1f})")
+    print(f"  pandas импортирован: {'да' if any(r[3] == 'pandas' for r in last) else 'нет'}")
+
+    print("\n⏱️  До первого матча (predict.py --engine exact, медиана):")
+    for loader in ("numpy", "pandas"):
+        print(f"  --loader {loader:<7} {time_to_first_fixture(loader, args.repeats) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# calibrate.py
+
+import argparse
+import json
+import os
+
+from src.data_loader import load_historical_data, load_team_strength
+from src.calibration import best_config, calibration_inputs, parameter_sets, run_calibration
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Подбор параметров модели угловых по backtest log-loss")
+    parser.add_argument("--history", default="data/historical.csv", help="история матчей")
+    parser.add_argument(
+        "--search",
+        choices=["grid", "random"],
+        default="grid",
+        help="grid — полный перебор CONFIG['CALIBRATION_GRID'], random — случайные точки в его границах",
+    )
+    parser.add_argument("--n-random", type=int, default=200, help="сколько наборов для --search random")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None, help="процессов (по умолчанию число ядер, 1 = без пула)")
+    parser.add_argument("--chunk-size", type=int, default=64, help="наборов параметров в одной векторной пачке")
+    parser.add_argument("--min-history", type=int, default=20)
+    parser.add_argument("--top", type=int, default=10, help="сколько лучших наборов показать")
+    parser.add_argument(
+        "--out",
+        default="reports/calibration.csv",
+        help="ранжированная таблица (рядом пишется *_best.json)",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    print("=" * 80)
+    print("         КАЛИБРОВКА ПАРАМЕТРОВ (backtest log-loss)")
+    print("=" * 80)
+
+    print("\n📂 Загрузка данных...")
+    historical_df = load_historical_data(args.history)
+    print(f"✅ Загружено {len(historical_df)} исторических матчей")
+
+    try:
+        team_strength = load_team_strength("data/team_strength.csv")
+    except Exception as e:
+        team_strength = {}
+        print(f"⚠️ team_strength отключен: {e}")
+
+    inputs = calibration_inputs(historical_df, team_strength, min_history=args.min_history)
+    sets = parameter_sets(search=args.search, n_random=args.n_random, seed=args.seed)
+    print(f"\n🔄 {len(sets)} наборов параметров x {len(inputs['HC'])} матчей...")
+
+    ranked = run_calibration(inputs, sets, workers=args.workers, chunk_size=args.chunk_size)
+
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    ranked.to_csv(args.out, index=False)
+    best = best_config(ranked)
+    best_path = os.path.splitext(args.out)[0] + "_best.json"
+    with open(best_path, "w", encoding="utf-8") as f:
+        json.dump(best, f, ensure_ascii=False, indent=2)
+
+    print(f"\n🏆 Топ-{args.top}:")
+    print(ranked.head(args.top).to_string(index=False))
+
+    print("\n✅ Лучший набор:")
+    for k, v in best.items():
+        print(f'    "{k}": {v},')
+
+    print(f"\n💾 CSV: {args.out}")
+    print(f"💾 JSON: {best_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,122 +1,40 @@
 # predict.py
 
+import argparse
 import os
-import pandas as pd
-
-from src.data_loader import load_historical_data, load_future_matches, load_team_strength
-from src.calculator import CornerOddsCalculator
+import sys
+
+# pandas не импортируем на старте: быстрый путь (--loader numpy) обходится без него
+from src.data_loader import (
+    HistoryStore,
+    TeamRegistry,
+    iter_future_matches,
+    load_form_history,
+    load_future_matches,
+    load_historical_data,
+    load_team_aliases,
+    load_team_strength,
+)
+from src.calculator import CornerOddsCalculator, ENGINES
+from src.config import CONFIG, PricingConfig
+from src.distributions import DISTRIBUTIONS
+from src.leagues import LeagueShards, iter_league_prices
+from src.manifest import RunManifest, fixture_key
 from src.validator import OddsValidator
-from src.formatter import format_match_output
+from src.formatter import format_match_output, format_match_jsonl
+from src.profiling import PROFILE_MODES, profile_call
+from src.writer import ResultWriter
 
 
-def load_form_history(path="data/history_5matches.csv"):
+def save_results(results, csv_path="reports/predictions.csv", excel_path="reports/predictions.xlsx", log=print):
     """
-    Твой формат:
-      Date,HomeTeam,AwayTeam,FTHG,FTAG,HC,AC
-
-    Мы приводим к внутреннему виду:
-      Date,p1,p2,score_p1,score_p2
-    где score_* = угловые.
+    Сохранение уже посчитанного списка результатов (обёртка над ResultWriter).
+    В основном прогоне строки пишутся по мере расчёта, см. main().
     """
-    df = pd.read_csv(path)
-    df["Date"] = pd.to_datetime(df["Date"], dayfirst=True, errors="coerce")
-
-    # нормализуем названия
-    df["HomeTeam"] = df["HomeTeam"].astype(str).str.strip()
-    df["AwayTeam"] = df["AwayTeam"].astype(str).str.strip()
-
-    df["HC"] = pd.to_numeric(df["HC"], errors="coerce")
-    df["AC"] = pd.to_numeric(df["AC"], errors="coerce")
-
-    df = df.dropna(subset=["Date", "HomeTeam", "AwayTeam", "HC", "AC"])
-
-    out = pd.DataFrame({
-        "Date": df["Date"],
-        "p1": df["HomeTeam"],
-        "p2": df["AwayTeam"],
-        "score_p1": df["HC"],
-        "score_p2": df["AC"],
-    })
-    return out
-
-
-def save_results(results, csv_path="reports/predictions.csv", excel_path="reports/predictions.xlsx"):
-    os.makedirs(os.path.dirname(csv_path), exist_ok=True)
-
-    rows = []
-    for r in results:
-        odds = r["odds"]
-        row = {
-            "HomeTeam": r["home"],
-            "AwayTeam": r["away"],
-            "lambda_home": odds.get("lambda_home"),
-            "lambda_away": odds.get("lambda_away"),
-            "expected_total": odds.get("expected_total"),
-            "favorite": odds.get("favorite", ""),
-
-            "base_lambda_home": odds.get("base_lambda_home"),
-            "base_lambda_away": odds.get("base_lambda_away"),
-            "strength_home": odds.get("strength_home"),
-            "strength_away": odds.get("strength_away"),
-            "strength_ratio": odds.get("strength_ratio"),
-
-            "form_home": odds.get("form_home"),
-            "form_away": odds.get("form_away"),
-
-            "anchor_line": odds.get("anchor_line"),
-            "anchor_scale": odds.get("anchor_scale"),
-        }
-
-        # 1X2 corners
-        o1x2 = odds.get("odds_1x2")
-        if o1x2:
-            row["Corners_P1"] = o1x2["P1"]
-            row["Corners_X"] = o1x2["X"]
-            row["Corners_P2"] = o1x2["P2"]
-
-        # handicaps
-        for team_key, team_data in odds.get("handicaps", {}).items():
-            for subkey, subval in team_data.items():
-                if subkey == "name":
-                    row[f"Handicap_{team_key}_Group"] = subval
-                else:
-                    try:
-                        row[f"Handicap_{team_key}_{subkey}"] = float(subval) if subval is not None else None
-                    except (ValueError, TypeError):
-                        row[f"Handicap_{team_key}_{subkey}"] = None
-
-        # --- Тоталы ---
-        for k, v in odds.get("totals", {}).items():
-            try:
-                row[f"Total_{k}"] = float(v) if v is not None else None
-            except (ValueError, TypeError):
-                row[f"Total_{k}"] = None
-
-        # --- Индивидуальные тоталы дома ---
-        for k, v in odds.get("individual_home", {}).items():
-            try:
-                row[f"Home_{k}"] = float(v) if v is not None else None
-            except (ValueError, TypeError):
-                row[f"Home_{k}"] = None
-
-        # --- Индивидуальные тоталы гостей ---
-        for k, v in odds.get("individual_away", {}).items():
-            try:
-                row[f"Away_{k}"] = float(v) if v is not None else None
-            except (ValueError, TypeError):
-                row[f"Away_{k}"] = None
-
-        rows.append(row)
-
-    df = pd.DataFrame(rows)
-    df.to_csv(csv_path, index=False)
-    print(f"\n💾 CSV: {csv_path}")
-
-    try:
-        df.to_excel(excel_path, index=False)
-        print(f"💾 Excel: {excel_path}")
-    except Exception as e:
-        print(f"❌ Excel не сохранился: {e}")
+    writer = ResultWriter(csv_path, excel_path=excel_path, excel_mode="sync", log=log)
+    with writer:
+        for r in results:
+            writer.write(r["home"], r["away"], r["odds"])
 
 
 def _safe_team(val) -> str:
@@ -128,90 +46,398 @@ def _safe_team(val) -> str:
     return s
 
 
-def main():
-    print("=" * 80)
-    print("         КАЛЬКУЛЯТОР КОЭФФИЦИЕНТОВ НА УГЛОВЫЕ")
-    print("=" * 80)
+def _team_columns(future_df):
+    """
+    Колонки команд в фикстурах: (HomeTeam, AwayTeam) / (p1, p2) или None.
+    """
+    if "HomeTeam" in future_df.columns and "AwayTeam" in future_df.columns:
+        return "HomeTeam", "AwayTeam"
+    if "p1" in future_df.columns and "p2" in future_df.columns:
+        return "p1", "p2"
+    return None
+
+
+def _open_jsonl(args):
+    if args.output != "jsonl":
+        return None
+    if args.jsonl_path == "-":
+        return sys.stdout
+    os.makedirs(os.path.dirname(args.jsonl_path) or ".", exist_ok=True)
+    return open(args.jsonl_path, "w", encoding="utf-8")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Калькулятор коэффициентов на угловые")
+    parser.add_argument(
+        "--output",
+        choices=["pretty", "jsonl", "quiet"],
+        default="pretty",
+        help="pretty — текст как раньше (один write на матч), "
+             "jsonl — одна JSON-строка на матч, quiet — без вывода матчей",
+    )
+    parser.add_argument(
+        "--jsonl-path",
+        default="-",
+        help="куда писать jsonl ('-' = stdout)",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=list(ENGINES),
+        default=None,
+        help="mc — Monte Carlo, exact — точные pmf, table — предрасчитанные таблицы "
+             "(по умолчанию CONFIG['PRICING_ENGINE'])",
+    )
+    parser.add_argument(
+        "--distribution",
+        choices=list(DISTRIBUTIONS),
+        default=None,
+        help="распределение угловых: poisson — движок --engine, negbin/bivariate — точные pmf "
+             "(по умолчанию CONFIG['COUNT_DISTRIBUTION'])",
+    )
+    parser.add_argument(
+        "--half-life",
+        type=float,
+        default=None,
+        help="EWMA-профили команд с полупериодом N игр (по умолчанию CONFIG['PROFILE_HALF_LIFE'], "
+             "None — плоские средние)",
+    )
+    parser.add_argument(
+        "--out",
+        default="reports/predictions.csv",
+        help="файл результатов: .csv / .parquet / .arrow (строки пишутся по мере расчёта)",
+    )
+    parser.add_argument(
+        "--excel",
+        choices=["off", "sync", "background"],
+        default="sync",
+        help="копия результатов в .xlsx рядом с --out",
+    )
+    parser.add_argument(
+        "--loader",
+        choices=["numpy", "pandas"],
+        default="numpy",
+        help="numpy — быстрый старт без pandas (история кэшируется в .npz), "
+             "pandas — загрузчики src/data_loader.py",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="процессов для расчёта: матчи группируются по лигам (шарды Div), "
+             "1 — в текущем процессе с выводом по мере расчёта",
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="пересчитать все матчи (по умолчанию матчи с неизменными входами "
+             "берутся из манифеста прошлого прогона рядом с --out)",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="потоковый режим для больших файлов фикстур: чтение кусками, пакетный расчёт "
+             "куска по шардам, запись сразу (память не растёт; без манифеста, Excel и --workers)",
+    )
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        default=None,
+        help="строк фикстур в куске для --stream (по умолчанию CONFIG['STREAM_CHUNK_SIZE'])",
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="cprofile",
+        choices=list(PROFILE_MODES),
+        default=None,
+        help="профилировать прогон: cprofile (по умолчанию) или sample; "
+             ".pstats/.collapsed (flamegraph) — в reports/, топ функций — в лог",
+    )
+    parser.add_argument(
+        "--store",
+        nargs="?",
+        const=CONFIG["HISTORY_STORE_PATH"],
+        default=None,
+        help="история и форма через локальное SQLite-хранилище (обновляется, если CSV изменились); "
+             "без значения — CONFIG['HISTORY_STORE_PATH']",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.profile:
+        profile_call(run, args, mode=args.profile, name="predict", log=_logger(args))
+    else:
+        run(args)
+
+
+def _logger(args):
+    # в jsonl-режиме stdout занят данными -> служебные сообщения в stderr
+    log_file = sys.stderr if (args.output == "jsonl" and args.jsonl_path == "-") else sys.stdout
+
+    def log(*a, **kw):
+        print(*a, file=log_file, **kw)
+    return log
+
+
+def run(args):
+    log = _logger(args)
+
+    log("=" * 80)
+    log("         КАЛЬКУЛЯТОР КОЭФФИЦИЕНТОВ НА УГЛОВЫЕ")
+    log("=" * 80)
 
-    print("\n📂 Загрузка данных...")
-    historical_df = load_historical_data("data/historical.csv")
-    future_df = load_future_matches("data/future_matches.csv")
-    print(f"✅ Загружено {len(historical_df)} исторических матчей")
-    print(f"✅ Загружено {len(future_df)} будущих матчей")
+    log("\n📂 Загрузка данных...")
+    # команды -> int id; алиасы сводят разные написания между файлами
+    registry = TeamRegistry(load_team_aliases("data/team_aliases.csv"))
+    if args.loader == "numpy":
+        from src.fast_loader import (
+            load_form_arrays as load_form,
+            load_future_arrays as load_future,
+            load_historical_arrays as load_historical,
+            load_team_strength_fast as load_strength,
+        )
+    else:
+        load_historical, load_future = load_historical_data, load_future_matches
+        load_strength, load_form = load_team_strength, load_form_history
+
+    if args.store:
+        # одно хранилище на диске для CLI/app/сервисов: CSV перечитываются только после изменения
+        store = HistoryStore(args.store, registry=registry)
+
+        def load_historical(path, registry):
+            store.sync_history(path)
+            return store.history_frame(registry=registry)
+
+        def load_form(path, registry):
+            store.sync_form(path)
+            return store.form_frame(registry=registry)
+
+    historical_df = load_historical("data/historical.csv", registry=registry)
+    log(f"✅ Загружено {len(historical_df)} исторических матчей")
+    if args.stream:
+        future_df = None
+        log("✅ Будущие матчи: потоком из data/future_matches.csv")
+    else:
+        future_df = load_future("data/future_matches.csv", registry=registry)
+        log(f"✅ Загружено {len(future_df)} будущих матчей")
 
-    print("\n📌 Загрузка team_strength...")
+    log("\n📌 Загрузка team_strength...")
     try:
-        team_strength = load_team_strength("data/team_strength.csv")
-        print(f"✅ team_strength: {len(team_strength)} команд")
+        team_strength = load_strength("data/team_strength.csv", registry=registry)
+        log(f"✅ team_strength: {len(team_strength)} команд")
     except Exception as e:
         team_strength = {}
-        print(f"⚠️ team_strength отключен: {e}")
+        log(f"⚠️ team_strength отключен: {e}")
 
-    print("\n📌 Загрузка формы (history_5matches)...")
+    log("\n📌 Загрузка формы (history_5matches)...")
     try:
-        form_df = load_form_history("data/history_5matches.csv")
-        print(f"✅ form_df: {len(form_df)} матчей")
+        form_df = load_form("data/history_5matches.csv", registry=registry)
+        log(f"✅ form_df: {len(form_df)} матчей")
     except Exception as e:
         form_df = None
-        print(f"⚠️ форма отключена: {e}")
-
-    calculator = CornerOddsCalculator()
+        log(f"⚠️ форма отключена: {e}")
+
+    unmatched = registry.unmatched
+    if unmatched:
+        total = sum(len(names) for names in unmatched.values())
+        log(f"\n⚠️  Команды не найдены в historical.csv (будут значения по умолчанию): {total}")
+        for source, names in unmatched.items():
+            names = sorted(names)
+            more = f" ... (+{len(names) - 5})" if len(names) > 5 else ""
+            log(f"   {source}: {', '.join(names[:5])}{more}")
+        log("   алиасы: data/team_aliases.csv (alias,team)")
+
+    config = PricingConfig() if args.half_life is None else PricingConfig(PROFILE_HALF_LIFE=args.half_life)
+    calculator = CornerOddsCalculator(
+        engine=args.engine, config=config, registry=registry, distribution=args.distribution
+    )
     validator = OddsValidator()
+    # история по лигам (Div): свои средние лиги и индексы команд на шард
+    shards = LeagueShards(historical_df, calculator)
+
+    if args.stream:
+        run_stream(args, registry, shards, validator, team_strength, form_df, log)
+        return
 
     if len(future_df) == 0:
-        print("⚠️ future_matches.csv пуст")
+        log("⚠️ future_matches.csv пуст")
         return
 
     # определяем колонки
-    if "HomeTeam" in future_df.columns and "AwayTeam" in future_df.columns:
-        home_col, away_col = "HomeTeam", "AwayTeam"
-    elif "p1" in future_df.columns and "p2" in future_df.columns:
-        home_col, away_col = "p1", "p2"
-    else:
-        print(f"❌ В future_matches.csv нет колонок команд. Есть: {list(future_df.columns)}")
+    columns = _team_columns(future_df)
+    if columns is None:
+        log(f"❌ В future_matches.csv нет колонок команд. Есть: {list(future_df.columns)}")
         return
+    home_col, away_col = columns
+
+    jsonl_out = _open_jsonl(args)
+
+    excel_path = os.path.splitext(args.out)[0] + ".xlsx"
+    writer = ResultWriter(args.out, excel_path=excel_path, excel_mode=args.excel, log=log)
 
-    results = []
     total_matches = len(future_df)
-    print(f"\n🔄 Обработка {total_matches} матч(ей)...\n")
+    log(f"\n🔄 Обработка {total_matches} матч(ей)...\n")
 
+    fixtures = []
     for idx, match in future_df.iterrows():
         home_team = _safe_team(match.get(home_col))
         away_team = _safe_team(match.get(away_col))
 
         if not home_team or not away_team:
-            print(f"⚠️  Пропуск матча {idx+1}: пустые команды")
+            log(f"⚠️  Пропуск матча {idx+1}: пустые команды")
             continue
+        fixtures.append((idx, match.get("league"), home_team, away_team))
 
-        print(f"[{idx+1}/{total_matches}] Расчёт: {home_team} vs {away_team}")
+    # манифест прошлого прогона: матчи с неизменными входами не пересчитываем
+    manifest = RunManifest.for_output(args.out)
+    if not args.full:
+        manifest.load()
+
+    cached = []
+    for _, league, home_team, away_team in fixtures:
+        try:
+            calc, frame = shards.route(league)
+            fingerprint = calc.input_fingerprint(frame, home_team, away_team, team_strength, form_df)
+        except Exception:
+            fingerprint = None
+        key = fixture_key(league, home_team, away_team)
+        cached.append((key, fingerprint, manifest.lookup(key, fingerprint)))
+
+    stale = [f for f, (_, _, odds) in zip(fixtures, cached) if odds is None]
+    if len(stale) < len(fixtures):
+        log(f"♻️  Без изменений с прошлого прогона: {len(fixtures) - len(stale)} матч(ей), "
+            f"пересчёт: {len(stale)} ({manifest.path})\n")
+
+    prices = iter_league_prices(
+        shards,
+        [(league, home_team, away_team) for _, league, home_team, away_team in stale],
+        team_strength=team_strength,
+        form_df=form_df,
+        workers=args.workers,
+    )
+    for (idx, _, home_team, away_team), (key, fingerprint, match_odds) in zip(fixtures, cached):
+        if match_odds is None:
+            match_odds = next(prices)
+            log(f"[{idx+1}/{total_matches}] Расчёт: {home_team} vs {away_team}")
+        else:
+            log(f"[{idx+1}/{total_matches}] Без изменений: {home_team} vs {away_team}")
 
         try:
-            match_odds = calculator.calculate_match_odds(
-                historical_df,
-                home_team,
-                away_team,
-                team_strength=team_strength,
-                form_df=form_df,
-            )
+            if isinstance(match_odds, Exception):
+                raise match_odds
             warnings = validator.validate(match_odds)
-            format_match_output(home_team, away_team, match_odds, warnings)
-
-            results.append({
-                "home": home_team,
-                "away": away_team,
-                "odds": match_odds,
-                "warnings": warnings
-            })
+            if args.output == "pretty":
+                format_match_output(home_team, away_team, match_odds, warnings)
+            elif args.output == "jsonl":
+                jsonl_out.write(format_match_jsonl(home_team, away_team, match_odds, warnings) + "\n")
+
+            writer.write(home_team, away_team, match_odds)
+            manifest.record(key, fingerprint, match_odds)
         except Exception as e:
-            print(f"❌ ошибка матча {idx+1}: {e}")
+            log(f"❌ ошибка матча {idx+1}: {e}")
+
+    manifest.save()
+
+    if shards.unmatched:
+        log(f"\n⚠️  Лиги без шарда в historical.csv (считаны по всей истории): {', '.join(sorted(shards.unmatched))}")
+        log("   коды лиг: CONFIG['LEAGUE_ALIASES'] (league -> Div)")
 
-    if results:
-        print("\n" + "=" * 80)
-        print(f"✅ Успешно обработано матчей: {len(results)}/{total_matches}")
-        save_results(results, "reports/predictions.csv", "reports/predictions.xlsx")
-        print("=" * 80)
+    if jsonl_out is not None and jsonl_out is not sys.stdout:
+        jsonl_out.close()
+
+    writer.close()
+
+    if writer.n_rows:
+        log("\n" + "=" * 80)
+        log(f"✅ Успешно обработано матчей: {writer.n_rows}/{total_matches}")
+        log("=" * 80)
     else:
-        print("\n⚠️  Не удалось обработать ни одного матча")
+        log("\n⚠️  Не удалось обработать ни одного матча")
+
+
+def run_stream(args, registry, shards, validator, team_strength, form_df, log=print):
+    """
+    --stream: фикстуры кусками (iter_future_matches) -> пакетный расчёт куска
+    (price_fixtures по шардам) -> проверка пакета (validate_batch) -> запись строк сразу.
+    В памяти — только текущий кусок.
+    """
+    chunksize = CONFIG["STREAM_CHUNK_SIZE"] if args.chunksize is None else args.chunksize
+    if args.excel != "off":
+        log("ℹ️  --stream: Excel не пишется (перечитал бы весь результат в память)")
+
+    jsonl_out = _open_jsonl(args)
+    writer = ResultWriter(args.out, excel_mode="off", log=log)
+    n_rows = 0
+
+    log(f"\n🔄 Потоковая обработка (по {chunksize} строк)...\n")
+    for chunk in iter_future_matches("data/future_matches.csv", chunksize, registry=registry):
+        columns = _team_columns(chunk)
+        if columns is None:
+            log(f"❌ В future_matches.csv нет колонок команд. Есть: {list(chunk.columns)}")
+            break
+        home_col, away_col = columns
+        leagues = chunk["league"] if "league" in chunk.columns else [None] * len(chunk)
+        n_rows += len(chunk)
+
+        fixtures = []
+        for idx, league, home_team, away_team in zip(chunk.index, leagues, chunk[home_col], chunk[away_col]):
+            home_team, away_team = _safe_team(home_team), _safe_team(away_team)
+            if not home_team or not away_team:
+                log(f"⚠️  Пропуск матча {idx+1}: пустые команды")
+                continue
+            fixtures.append((idx, league, home_team, away_team))
+
+        # один пакетный расчёт на шард куска
+        groups = {}
+        for pos, (_, league, _, _) in enumerate(fixtures):
+            groups.setdefault(shards.resolve(league), []).append(pos)
+        prices = [None] * len(fixtures)
+        warnings = [[] for _ in fixtures]
+        for key, positions in groups.items():
+            try:
+                batch = shards.calculator(key).price_fixtures(
+                    shards.frame(key),
+                    [fixtures[p][2] for p in positions],
+                    [fixtures[p][3] for p in positions],
+                    team_strength=team_strength,
+                    form_df=form_df,
+                )
+            except Exception as e:
+                log(f"❌ ошибка пакета ({len(positions)} матч(ей), лига {key or '—'}): {e}")
+                continue
+            # проверка всего пакета одним вызовом (те же правила, что validate())
+            report = validator.validate_batch(batch.to_frame())
+            for row, message in zip(report["row"], report["message"]):
+                warnings[positions[row]].append(message)
+            for p, price in zip(positions, batch):
+                prices[p] = price
+
+        for (idx, _, home_team, away_team), match_odds, match_warnings in zip(fixtures, prices, warnings):
+            if match_odds is None:
+                continue
+            try:
+                if args.output == "pretty":
+                    format_match_output(home_team, away_team, match_odds, match_warnings)
+                elif args.output == "jsonl":
+                    jsonl_out.write(format_match_jsonl(home_team, away_team, match_odds, match_warnings) + "\n")
+                writer.write(home_team, away_team, match_odds)
+            except Exception as e:
+                log(f"❌ ошибка матча {idx+1}: {e}")
+
+        log(f"✅ Обработано строк: {n_rows}, записано матчей: {writer.n_rows}")
+
+    if shards.unmatched:
+        log(f"\n⚠️  Лиги без шарда в historical.csv (считаны по всей истории): {', '.join(sorted(shards.unmatched))}")
+
+    if jsonl_out is not None and jsonl_out is not sys.stdout:
+        jsonl_out.close()
+    writer.close()
+
+    log("\n" + "=" * 80)
+    log(f"✅ Успешно обработано матчей: {writer.n_rows}/{n_rows}")
+    log("=" * 80)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,53 @@
+# rate_teams.py
+
+import argparse
+import time
+
+from src.data_loader import TeamRegistry, load_historical_data, load_team_aliases
+from src.ratings import fit_team_ratings, load_ratings, write_team_strength
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Рейтинги команд по угловым из истории -> team_strength.csv")
+    parser.add_argument("--history", default="data/historical.csv")
+    parser.add_argument("--out", default="data/team_strength.csv")
+    parser.add_argument(
+        "--warm-start",
+        action="store_true",
+        help="стартовать с Attack/Defence из --out (после дописанных матчей сходится за пару итераций)",
+    )
+    parser.add_argument("--prior-games", type=float, default=None, help="по умолчанию CONFIG['RATING_PRIOR_GAMES']")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    print("=" * 80)
+    print("         РЕЙТИНГИ КОМАНД (угловые)")
+    print("=" * 80)
+
+    registry = TeamRegistry(load_team_aliases("data/team_aliases.csv"))
+    df = load_historical_data(args.history, registry=registry)
+    print(f"\n✅ Загружено {len(df)} исторических матчей, команд: {len(registry)}")
+
+    init = load_ratings(args.out, registry) if args.warm_start else None
+    if args.warm_start and init is None:
+        print(f"⚠️ тёплый старт: в {args.out} нет Attack/Defence — старт с 1.0")
+
+    t0 = time.perf_counter()
+    ratings = fit_team_ratings(
+        df["HomeTeam_id"], df["AwayTeam_id"], df["HC"], df["AC"], len(registry),
+        init=init, prior_games=args.prior_games,
+    )
+    print(
+        f"✅ {ratings['n_iter']} итераций за {time.perf_counter() - t0:.3f} с "
+        f"(base home {ratings['base_home']:.2f}, away {ratings['base_away']:.2f})"
+    )
+
+    write_team_strength(args.out, registry, ratings)
+    print(f"\n💾 CSV: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
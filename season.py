@@ -0,0 +1,100 @@
+# season.py
+
+import argparse
+import os
+import time
+
+from src.config import CONFIG
+from src.data_loader import (
+    TeamRegistry,
+    load_future_matches,
+    load_historical_data,
+    load_team_aliases,
+    load_team_strength,
+)
+from src.calculator import CornerOddsCalculator
+from src.season import season_table, simulate_season
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Симуляция оставшегося сезона по угловым (outright-рынки)")
+    parser.add_argument("--history", default="data/historical.csv", help="история для λ")
+    parser.add_argument(
+        "--schedule",
+        default="data/future_matches.csv",
+        help="оставшиеся матчи (HomeTeam,AwayTeam или home,away)",
+    )
+    parser.add_argument(
+        "--to-date",
+        default=None,
+        help="матчи сезона на сегодня (HomeTeam,AwayTeam,HC,AC): их угловые прибавляются к итогу",
+    )
+    parser.add_argument("--sims", type=int, default=None, help="число сезонов (по умолчанию CONFIG['SEASON_SIMULATIONS'])")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--lines",
+        default="",
+        help="линии итогового тотала команды через запятую (колонки over_<линия>)",
+    )
+    parser.add_argument("--out", default="reports/season.csv")
+    return parser.parse_args(argv)
+
+
+def _season_to_date(path, registry):
+    """
+    Угловые команд на сегодня: HC дома + AC в гостях.
+    """
+    df = load_historical_data(path, registry=registry)
+    totals = {}
+    for home, away, hc, ac in zip(df["HomeTeam"], df["AwayTeam"], df["HC"], df["AC"]):
+        if hc == hc:
+            totals[home] = totals.get(home, 0.0) + float(hc)
+        if ac == ac:
+            totals[away] = totals.get(away, 0.0) + float(ac)
+    return totals
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    lines = [float(x) for x in args.lines.split(",") if x.strip()]
+
+    print("=" * 80)
+    print("         СИМУЛЯЦИЯ СЕЗОНА (угловые)")
+    print("=" * 80)
+
+    registry = TeamRegistry(load_team_aliases("data/team_aliases.csv"))
+    historical_df = load_historical_data(args.history, registry=registry)
+    schedule = load_future_matches(args.schedule, registry=registry)
+    schedule = schedule.dropna(subset=["HomeTeam", "AwayTeam"])
+    try:
+        team_strength = load_team_strength("data/team_strength.csv", registry=registry)
+    except Exception as e:
+        team_strength = {}
+        print(f"⚠️ team_strength отключен: {e}")
+    base_totals = _season_to_date(args.to_date, registry) if args.to_date else {}
+
+    calculator = CornerOddsCalculator(registry=registry)
+    lambdas_home, lambdas_away = calculator.fixture_lambdas(
+        historical_df, schedule["HomeTeam"], schedule["AwayTeam"], team_strength
+    )
+
+    n_sims = CONFIG["SEASON_SIMULATIONS"] if args.sims is None else args.sims
+    print(f"\n🔄 {len(schedule)} матч(ей) x {n_sims} сезонов...")
+    t0 = time.perf_counter()
+    result = simulate_season(
+        schedule["HomeTeam"], schedule["AwayTeam"], lambdas_home, lambdas_away,
+        n_simulations=n_sims, base_totals=base_totals, seed=args.seed,
+    )
+    print(f"✅ {time.perf_counter() - t0:.2f} с")
+
+    table = season_table(result, lines)
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    table.to_csv(args.out, index=False)
+
+    print("\n🏆 Больше всех угловых:")
+    print(table.to_string(index=False, float_format=lambda x: f"{x:.3f}"))
+    print(f"\n💾 CSV: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
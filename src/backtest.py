@@ -0,0 +1,252 @@
+# src/backtest.py
+"""
+Walk-forward backtest: каждый матч истории оцениваем только по данным ДО него.
+
+Вместо calculate_match_odds на каждой строке (профили/форма/λ по всему df -> O(N²))
+идём по истории один раз и обновляем состояние инкрементально:
+  - суммы HC дома / AC в гостях по командам и по лиге   -> base λ
+  - суммы for/against по командам                      -> профили соперников
+  - deque последних FORM_N_GAMES игр команды             -> форма
+Дальше λ (strength/форма/anchor) и вероятности рынков считаются векторно
+для всех матчей сразу.
+"""
+
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from src.calculator import CornerOddsCalculator
+from src.config import CONFIG
+from src.pmf_tables import poisson_cdf_sf_batch
+
+
+class _RunningState:
+    """
+    Всё, что нужно для λ и формы, по данным "до текущего матча".
+    """
+
+    def __init__(self, n_games):
+        self.n_games = int(n_games)
+
+        self.league_hc = 0.0
+        self.league_ac = 0.0
+        self.league_n = 0
+
+        # base λ: HC в домашних играх, AC в гостевых
+        self.home_hc = {}
+        self.home_n = {}
+        self.away_ac = {}
+        self.away_n = {}
+
+        # профили: for/against по всем играм команды
+        self.for_sum = {}
+        self.against_sum = {}
+        self.games = {}
+
+        # последние игры: (соперник, угловые за, угловые против)
+        self.recent = {}
+
+    def base_lambdas(self, home_team, away_team):
+        # до первого матча средних лиги нет
+        league_home = self.league_hc / self.league_n if self.league_n else np.nan
+        league_away = self.league_ac / self.league_n if self.league_n else np.nan
+
+        n_h = self.home_n.get(home_team, 0)
+        n_a = self.away_n.get(away_team, 0)
+        base_home = self.home_hc[home_team] / n_h if n_h else league_home
+        base_away = self.away_ac[away_team] / n_a if n_a else league_away
+        return base_home, base_away
+
+    def form_score(self, team):
+        """
+        Средний residual по последним играм (как _compute_form_factor_from_file),
+        профили соперников — на текущий момент. NaN = нет данных.
+        """
+        residuals = []
+        for opp, corners_for, corners_against in self.recent.get(team, ()):
+            n = self.games.get(opp, 0)
+            if not n:
+                continue
+            opp_for = self.for_sum[opp] / n
+            opp_allow = self.against_sum[opp] / n
+            residuals.append((corners_for - opp_allow) + (opp_for - corners_against))
+
+        if not residuals:
+            return np.nan
+        return float(np.mean(residuals))
+
+    def update(self, home_team, away_team, hc, ac):
+        self.league_hc += hc
+        self.league_ac += ac
+        self.league_n += 1
+
+        self.home_hc[home_team] = self.home_hc.get(home_team, 0.0) + hc
+        self.home_n[home_team] = self.home_n.get(home_team, 0) + 1
+        self.away_ac[away_team] = self.away_ac.get(away_team, 0.0) + ac
+        self.away_n[away_team] = self.away_n.get(away_team, 0) + 1
+
+        for team, opp, cf, ca in ((home_team, away_team, hc, ac), (away_team, home_team, ac, hc)):
+            self.for_sum[team] = self.for_sum.get(team, 0.0) + cf
+            self.against_sum[team] = self.against_sum.get(team, 0.0) + ca
+            self.games[team] = self.games.get(team, 0) + 1
+
+            if team not in self.recent:
+                self.recent[team] = deque(maxlen=self.n_games)
+            self.recent[team].append((opp, cf, ca))
+
+
+def _ordered_history(historical_df):
+    """
+    История в порядке времени: по Date, если колонка есть (стабильно), иначе порядок файла.
+    """
+    df = historical_df
+    if "Date" in df.columns:
+        dates = pd.to_datetime(df["Date"], dayfirst=True, errors="coerce")
+        df = df.assign(_date=dates).sort_values("_date", kind="stable").drop(columns="_date")
+    return df
+
+
+def walk_forward_features(historical_df, n_games=None, min_history=20):
+    """
+    Один проход по истории. Для каждого матча (после min_history матчей разогрева)
+    — признаки, не зависящие от параметров модели:
+      base_lambda_home/away, form_score_home/away (NaN = нет формы)
+    и фактические HC/AC.
+    """
+    n_games = CONFIG["FORM_N_GAMES"] if n_games is None else int(n_games)
+    # хотя бы один матч разогрева: без него у первого матча нет base λ
+    min_history = max(1, int(min_history))
+
+    df = _ordered_history(historical_df)
+    homes = df["HomeTeam"].astype(str).str.strip().to_numpy()
+    aways = df["AwayTeam"].astype(str).str.strip().to_numpy()
+    hcs = pd.to_numeric(df["HC"], errors="coerce").to_numpy(dtype=float)
+    acs = pd.to_numeric(df["AC"], errors="coerce").to_numpy(dtype=float)
+    index = df.index.to_numpy()
+
+    state = _RunningState(n_games)
+    rows = []
+    for i in range(len(df)):
+        home, away, hc, ac = homes[i], aways[i], hcs[i], acs[i]
+        if np.isnan(hc) or np.isnan(ac):
+            continue
+
+        if state.league_n >= min_history:
+            base_home, base_away = state.base_lambdas(home, away)
+            rows.append((
+                index[i], home, away, hc, ac,
+                base_home, base_away,
+                state.form_score(home), state.form_score(away),
+            ))
+
+        state.update(home, away, hc, ac)
+
+    return pd.DataFrame(rows, columns=[
+        "row", "HomeTeam", "AwayTeam", "HC", "AC",
+        "base_lambda_home", "base_lambda_away",
+        "form_score_home", "form_score_away",
+    ])
+
+
+def predict_features(features, team_strength=None, params=None, calculator=None):
+    """
+    Признаки walk_forward_features -> λ и вероятности рынков (векторно по всем матчам).
+    params — dict с ключами как в CONFIG (по умолчанию CONFIG).
+    """
+    params = CONFIG if params is None else params
+    team_strength = {} if team_strength is None else team_strength
+    calculator = CornerOddsCalculator(engine="exact") if calculator is None else calculator
+
+    s_home = features["HomeTeam"].map(lambda t: float(team_strength.get(t, 1.0))).to_numpy(dtype=float)
+    s_away = features["AwayTeam"].map(lambda t: float(team_strength.get(t, 1.0))).to_numpy(dtype=float)
+
+    form = {}
+    for side in ("home", "away"):
+        form[side] = calculator._form_factor_from_score(
+            features[f"form_score_{side}"].to_numpy(dtype=float),
+            params["FORM_BETA"], params["FORM_CLIP_LOW"], params["FORM_CLIP_HIGH"],
+        )
+
+    lambda_home, lambda_away, _, _ = calculator._combine_lambdas(
+        features["base_lambda_home"].to_numpy(dtype=float),
+        features["base_lambda_away"].to_numpy(dtype=float),
+        s_home, s_away, form["home"], form["away"], params,
+    )
+
+    out = features.copy()
+    out["lambda_home"] = lambda_home
+    out["lambda_away"] = lambda_away
+
+    probs = calculator._market_probabilities(poisson_cdf_sf_batch(lambda_home, lambda_away), params)
+    out["p_home"] = probs["P1"]
+    out["p_draw"] = probs["X"]
+    out["p_away"] = probs["P2"]
+    for line in params["TOTAL_LINES"]:
+        out[f"p_over_{line}"] = probs[f"Over_{line}"]
+    return out
+
+
+def _poisson_log_pmf(k, lam):
+    k = np.asarray(k, dtype=np.int64)
+    log_fact = np.concatenate(([0.0], np.cumsum(np.log(np.arange(1, int(k.max(initial=0)) + 1)))))
+    return k * np.log(lam) - lam - log_fact[k]
+
+
+def score_predictions(pred, total_lines=None, n_bins=10, eps=1e-15):
+    """
+    Метрики по предсказаниям predict_features:
+      logloss          — -log P(HC, AC) под моделью (главная метрика для калибровки)
+      logloss_1x2/brier_1x2
+      logloss_over_<l>/brier_over_<l>
+    и таблица калибровки Over-вероятностей (n_bins равных корзин).
+    """
+    total_lines = CONFIG["TOTAL_LINES"] if total_lines is None else total_lines
+
+    hc = pred["HC"].to_numpy(dtype=float)
+    ac = pred["AC"].to_numpy(dtype=float)
+    summary = {"n": int(len(pred))}
+    if len(pred) == 0:
+        return summary, pd.DataFrame(columns=["line", "bin", "n", "mean_pred", "observed"])
+
+    nll = -(_poisson_log_pmf(hc, pred["lambda_home"].to_numpy()) + _poisson_log_pmf(ac, pred["lambda_away"].to_numpy()))
+    summary["logloss"] = float(np.mean(nll))
+
+    p = np.clip(pred[["p_home", "p_draw", "p_away"]].to_numpy(dtype=float), eps, 1.0)
+    y = np.stack([hc > ac, hc == ac, hc < ac], axis=1).astype(float)
+    summary["logloss_1x2"] = float(-np.mean(np.sum(y * np.log(p), axis=1)))
+    summary["brier_1x2"] = float(np.mean(np.sum((p - y) ** 2, axis=1)))
+
+    calibration = []
+    edges = np.linspace(0.0, 1.0, n_bins + 1)
+    for line in total_lines:
+        p_over = np.clip(pred[f"p_over_{line}"].to_numpy(dtype=float), eps, 1.0 - eps)
+        over = (hc + ac > line).astype(float)
+        summary[f"logloss_over_{line}"] = float(-np.mean(over * np.log(p_over) + (1 - over) * np.log(1 - p_over)))
+        summary[f"brier_over_{line}"] = float(np.mean((p_over - over) ** 2))
+
+        b = np.clip(np.digitize(p_over, edges) - 1, 0, n_bins - 1)
+        counts = np.bincount(b, minlength=n_bins)
+        sum_pred = np.bincount(b, weights=p_over, minlength=n_bins)
+        sum_obs = np.bincount(b, weights=over, minlength=n_bins)
+        for k in np.nonzero(counts)[0]:
+            calibration.append({
+                "line": line,
+                "bin": f"{edges[k]:.1f}-{edges[k + 1]:.1f}",
+                "n": int(counts[k]),
+                "mean_pred": float(sum_pred[k] / counts[k]),
+                "observed": float(sum_obs[k] / counts[k]),
+            })
+
+    return summary, pd.DataFrame(calibration, columns=["line", "bin", "n", "mean_pred", "observed"])
+
+
+def run_backtest(historical_df, team_strength=None, params=None, min_history=20):
+    """
+    Полный backtest: (предсказания по матчам, summary-метрики, калибровка).
+    """
+    params = CONFIG if params is None else params
+    features = walk_forward_features(historical_df, n_games=params["FORM_N_GAMES"], min_history=min_history)
+    pred = predict_features(features, team_strength, params)
+    summary, calibration = score_predictions(pred, params["TOTAL_LINES"])
+    return pred, summary, calibration
@@ -5,6 +5,10 @@
 
 from __future__ import annotations
 
+from bisect import bisect_left
+
+import numpy as np
+
 # Букмекерская сетка: каждому коэффициенту соответствует обратный
 BOOKMAKER_GRID = [
     (1.01, 11.56),
@@ -95,6 +99,14 @@ BOOKMAKER_GRID = [
 ]
 
 
+# все значения сетки (отсортированы) и обратные пары — считаем один раз
+_ALL_ODDS = sorted(set([a for a, _ in BOOKMAKER_GRID] + [b for _, b in BOOKMAKER_GRID]))
+_OPPOSITE = {}
+for _o1, _o2 in BOOKMAKER_GRID:
+    _OPPOSITE.setdefault(_o1, _o2)
+    _OPPOSITE.setdefault(_o2, _o1)
+
+
 def normalize_to_grid(odds_value: float | None) -> float | None:
     """Нормализует коэффициент к ближайшему значению из букмекерской сетки."""
     if odds_value is None:
@@ -103,13 +115,14 @@ def normalize_to_grid(odds_value: float | None) -> float | None:
     if odds_value <= 1.0:
         return None
 
-    all_odds = []
-    for a, b in BOOKMAKER_GRID:
-        all_odds.append(a)
-        all_odds.append(b)
-
-    all_odds = sorted(set(all_odds))
-    return min(all_odds, key=lambda x: abs(x - odds_value))
+    # бинарный поиск; при равном расстоянии — меньший коэффициент (как min по списку)
+    i = bisect_left(_ALL_ODDS, odds_value)
+    if i == 0:
+        return _ALL_ODDS[0]
+    if i == len(_ALL_ODDS):
+        return _ALL_ODDS[-1]
+    lo, hi = _ALL_ODDS[i - 1], _ALL_ODDS[i]
+    return hi if abs(hi - odds_value) < abs(lo - odds_value) else lo
 
 
 def get_opposite_odds(odds_value: float | None) -> float | None:
@@ -117,13 +130,7 @@ def get_opposite_odds(odds_value: float | None) -> float | None:
     norm = normalize_to_grid(odds_value)
     if norm is None:
         return None
-
-    for o1, o2 in BOOKMAKER_GRID:
-        if abs(o1 - norm) < 1e-6:
-            return o2
-        if abs(o2 - norm) < 1e-6:
-            return o1
-    return None
+    return _OPPOSITE.get(norm)
 
 
 def _safe_prob(p) -> float:
@@ -191,3 +198,69 @@ def normalize_odds_triplet(p1, px, p2, margin: float = 0.085):
     ox = 1.0 / max(pxn, eps)
     o2 = 1.0 / max(p2n, eps)
     return o1, ox, o2
+
+
+# ==================================================
+# ВЕКТОРНЫЕ ВЕРСИИ (массивы матчей; None -> NaN)
+# ==================================================
+_ALL_ODDS_ARR = np.array(_ALL_ODDS)
+_OPPOSITE_ARR = np.array([_OPPOSITE[o] for o in _ALL_ODDS])
+
+
+def _safe_prob_array(p):
+    p = np.asarray(p, dtype=float)
+    return np.clip(np.nan_to_num(p, nan=0.0), 0.0, 1.0)
+
+
+def normalize_to_grid_array(odds_values):
+    """Векторная normalize_to_grid: индекс ближайшего значения сетки (-1 если <= 1.0)."""
+    odds_values = np.asarray(odds_values, dtype=float)
+    i = np.searchsorted(_ALL_ODDS_ARR, odds_values, side="left")
+    lo = np.clip(i - 1, 0, len(_ALL_ODDS_ARR) - 1)
+    hi = np.clip(i, 0, len(_ALL_ODDS_ARR) - 1)
+    take_hi = np.abs(_ALL_ODDS_ARR[hi] - odds_values) < np.abs(_ALL_ODDS_ARR[lo] - odds_values)
+    idx = np.where(take_hi, hi, lo)
+    return np.where(odds_values > 1.0, idx, -1)
+
+
+def normalize_odds_pair_array(p1, p2, margin: float = 0.085, snap_to_grid: bool = True):
+    """
+    Векторная normalize_odds_pair: массивы вероятностей -> массивы коэффициентов,
+    NaN там, где скалярная версия вернула бы None. snap_to_grid=False — без сетки
+    (и без прижатия к её краям), NaN для коэффициентов <= 1.
+    """
+    p1 = _safe_prob_array(p1)
+    p2 = _safe_prob_array(p2)
+    p1, p2 = np.broadcast_arrays(p1, p2)
+
+    s = p1 + p2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        k = (1.0 + float(margin)) / s
+        o1 = 1.0 / np.maximum(p1 * k, 1e-12)
+        o2 = 1.0 / np.maximum(p2 * k, 1e-12)
+
+    if not snap_to_grid:
+        return np.where((s > 0) & (o1 > 1.0), o1, np.nan), np.where((s > 0) & (o2 > 1.0), o2, np.nan)
+
+    idx = normalize_to_grid_array(np.where(s > 0, o1, 0.0))
+    ok = (s > 0) & (idx >= 0)
+    safe_idx = np.where(ok, idx, 0)
+    o1g = np.where(ok, _ALL_ODDS_ARR[safe_idx], np.nan)
+    o2g = np.where(ok, _OPPOSITE_ARR[safe_idx], np.nan)
+    return o1g, o2g
+
+
+def normalize_odds_triplet_array(p1, px, p2, margin: float = 0.085):
+    """Векторная normalize_odds_triplet (без сетки)."""
+    p1 = _safe_prob_array(p1)
+    px = _safe_prob_array(px)
+    p2 = _safe_prob_array(p2)
+
+    s = p1 + px + p2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        k = np.where(s > 0, (1.0 + float(margin)) / s, np.nan)
+        eps = 1e-12
+        o1 = 1.0 / np.maximum(p1 * k, eps)
+        ox = 1.0 / np.maximum(px * k, eps)
+        o2 = 1.0 / np.maximum(p2 * k, eps)
+    return o1, ox, o2
@@ -1,16 +1,92 @@
 # src/calculator.py
 
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+from typing import TYPE_CHECKING
+
 import numpy as np
-import pandas as pd
 
-from src.bookmaker_grid import normalize_odds_pair, normalize_odds_triplet
-from src.config import CONFIG
+from src.bookmaker_grid import (
+    normalize_odds_pair,
+    normalize_odds_pair_array,
+    normalize_odds_triplet,
+    normalize_odds_triplet_array,
+)
+from src.config import CONFIG, PricingConfig
+from src.data_loader import TeamRegistry
+from src.distributions import DISTRIBUTIONS, count_model
+from src.profiles import EwmaProfiles
+from src.pmf_tables import load_tables, poisson_cdf_sf_batch, poisson_pmf, poisson_pmf_derivatives
+# handicap_keys живёт в src/results.py (раскладка рынков), здесь — реэкспорт
+from src.results import (
+    HANDICAP_NAMES,
+    MatchPrice,
+    PriceBatch,
+    _handicap_values,
+    handicap_keys,
+    market_layout,
+)
+
+# pandas — только для аннотаций (импорт внутри функций, где он нужен)
+if TYPE_CHECKING:
+    import pandas as pd
+
+ENGINES = ("mc", "exact", "table")
+
+# версия семантики расчёта: входит в input_fingerprint, поэтому строки манифеста
+# (predict.py, инкрементальный прогон) от старой версии пересчитываются.
+# Поднимать при любом изменении того, как из тех же входов получаются цены.
+PRICING_VERSION = 3
+
+# суммы по командам в stats (_accumulate_history)
+_TEAM_SUM_KEYS = (
+    "home_hc_sum", "home_n", "away_ac_sum", "away_n",
+    "home_ac_sum", "home_ac_n", "away_hc_sum", "away_hc_n",
+)
 
 
 class CornerOddsCalculator:
-    def __init__(self, margin=None, n_simulations=None):
-        self.margin = CONFIG["MARGIN"] if margin is None else float(margin)
-        self.n_simulations = CONFIG["N_SIMULATIONS"] if n_simulations is None else int(n_simulations)
+    def __init__(
+        self,
+        margin=None,
+        n_simulations=None,
+        engine=None,
+        config=None,
+        registry=None,
+        distribution=None,
+        ewma_state=None,
+    ):
+        # неизменяемый снимок настроек (по умолчанию — текущий CONFIG);
+        # margin/n_simulations/engine/distribution — явные переопределения поверх него
+        self.config = PricingConfig.coerce(config)
+        self.margin = self.config["MARGIN"] if margin is None else float(margin)
+        self.n_simulations = self.config["N_SIMULATIONS"] if n_simulations is None else int(n_simulations)
+
+        # mc    — Monte Carlo (n_simulations выборок)
+        # exact — точные усечённые pmf Poisson
+        # table — интерполяция по предрасчитанным таблицам (src/pmf_tables.py)
+        self.engine = self.config["PRICING_ENGINE"] if engine is None else str(engine)
+        if self.engine not in ENGINES:
+            raise ValueError(f"Неизвестный движок: {self.engine!r} (есть: {ENGINES})")
+
+        # распределение угловых (src/distributions.py): poisson — движок выше,
+        # negbin/bivariate — всегда точные pmf (параметр из config или по истории)
+        self.distribution = self.config["COUNT_DISTRIBUTION"] if distribution is None else str(distribution)
+        if self.distribution not in DISTRIBUTIONS:
+            raise ValueError(
+                f"Неизвестное распределение: {self.distribution!r} (есть: {tuple(DISTRIBUTIONS)})"
+            )
+
+        # реестр команд (data_loader.TeamRegistry): алиасы + id из загрузчиков;
+        # None — свой реестр по именам historical_df
+        self.registry = registry
+
+        # EWMA-профили (PROFILE_HALF_LIFE): сохранённое состояние (EwmaProfiles.to_dict)
+        # той же истории — при сборке профилей учитываются только строки после него
+        self.ewma_state = ewma_state
 
         # cache профилей соперников из historical_df
         self._profiles_cache_df_id = None
@@ -19,7 +95,21 @@ class CornerOddsCalculator:
     # ==================================================
     # PUBLIC
     # ==================================================
-    def calculate_match_odds(self, historical_df, home_team, away_team, team_strength=None, form_df=None):
+    def calculate_match_odds(
+        self,
+        historical_df,
+        home_team,
+        away_team,
+        team_strength=None,
+        form_df=None,
+        with_sensitivities=False,
+    ):
+        """
+        Возвращает MatchPrice (src/results.py) — читается как прежний вложенный dict.
+
+        with_sensitivities=True — дополнительно вернуть сырые вероятности рынков
+        ("probabilities") и их производные по λ ("sensitivities"), см. reprice_delta().
+        """
         if team_strength is None:
             team_strength = {}
 
@@ -40,88 +130,490 @@ class CornerOddsCalculator:
         )
 
         favorite = self._determine_favorite(lambda_home, lambda_away)
+        model = self._count_model(self._get_corner_profiles_cached(historical_df))
 
-        home_corners, away_corners, diff, total = self._monte_carlo_simulation(lambda_home, lambda_away)
+        # вероятности рынков -> коэффициенты (1X2, форы, тоталы, ИТ) сразу в раскладку MatchPrice
+        probs = self._market_probabilities(self._cdf_sf(lambda_home, lambda_away, model), self.config)
+        layout = market_layout(self.config)
+        odds = self._odds_arrays_from_probabilities(probs)
 
-        # 1X2 (на угловые)
-        odds_1x2 = self._calculate_1x2(diff)
+        fields = (
+            lambda_home, lambda_away, lambda_home + lambda_away,
+            # debug strength
+            base_lambda_home, base_lambda_away, s_home, s_away, ratio,
+            # debug form
+            form_home, form_away,
+            # debug anchor
+            anchor_scale,
+            probs["P1"], probs["X"], probs["P2"],
+        )
 
-        # форы/тоталы/ит
-        handicaps = self._calculate_handicaps_fixed_sides(diff)
-        totals = self._calculate_totals(total)
-        ind_home = self._calculate_individual_totals(home_corners)
-        ind_away = self._calculate_individual_totals(away_corners)
+        extra = None
+        if with_sensitivities:
+            extra = {
+                "probabilities": {k: float(v) for k, v in probs.items()},
+                "sensitivities": self._sensitivities(lambda_home, lambda_away, probs, model),
+            }
 
-        return {
-            "lambda_home": float(lambda_home),
-            "lambda_away": float(lambda_away),
-            "expected_total": float(lambda_home + lambda_away),
-            "favorite": favorite,
+        return MatchPrice.from_arrays(
+            layout, fields, [odds[k] for k in layout.keys], favorite, anchor_line, extra
+        )
 
-            # debug strength
-            "base_lambda_home": float(base_lambda_home),
-            "base_lambda_away": float(base_lambda_away),
-            "strength_home": float(s_home),
-            "strength_away": float(s_away),
-            "strength_ratio": float(ratio),
+    def reprice_delta(self, previous_result, new_lambda_home, new_lambda_away, tolerance=None):
+        """
+        Быстрая переоценка при небольшом сдвиге λ без повторной симуляции:
+          p(λ + Δ) ≈ p + ∇p·Δ + ½ Δᵀ H Δ
+        по производным из previous_result["sensitivities"] (calculate_match_odds(..., with_sensitivities=True)).
 
-            # debug form
-            "form_home": float(form_home),
-            "form_away": float(form_away),
+        Сдвиг считается от точки, где брались производные, поэтому цепочка
+        reprice_delta(reprice_delta(r, ...), ...) не накапливает ошибку.
+        Если |Δλ| > tolerance (REPRICE_TOLERANCE) или производных нет —
+        полная оценка рынков текущим движком в новых λ (распределение — с параметром
+        по последней истории калькулятора).
 
-            # debug anchor
-            "anchor_line": anchor_line,
-            "anchor_scale": float(anchor_scale),
-
-            "odds_1x2": odds_1x2,
-            "handicaps": handicaps,
-            "totals": totals,
-            "individual_home": ind_home,
-            "individual_away": ind_away,
-        }
+        Возвращает новый dict результата; поле "reprice" = "delta" или "full".
+        """
+        tolerance = self.config["REPRICE_TOLERANCE"] if tolerance is None else float(tolerance)
+        new_lambda_home = float(new_lambda_home)
+        new_lambda_away = float(new_lambda_away)
+
+        sens = previous_result.get("sensitivities")
+        if sens is not None:
+            dh = new_lambda_home - float(sens["lambda_home"])
+            da = new_lambda_away - float(sens["lambda_away"])
+
+        if sens is None or max(abs(dh), abs(da)) > tolerance:
+            model = self._count_model()
+            probs = self._market_probabilities(self._cdf_sf(new_lambda_home, new_lambda_away, model), self.config)
+            probs = {k: float(v) for k, v in probs.items()}
+            sens = self._sensitivities(new_lambda_home, new_lambda_away, probs, model)
+            mode = "full"
+        else:
+            probs = {}
+            for k, p in sens["p"].items():
+                p = (
+                    p
+                    + sens["d_home"][k] * dh
+                    + sens["d_away"][k] * da
+                    + 0.5 * sens["d2_home"][k] * dh * dh
+                    + 0.5 * sens["d2_away"][k] * da * da
+                    + sens["d2_home_away"][k] * dh * da
+                )
+                probs[k] = min(max(p, 0.0), 1.0)
+            mode = "delta"
+
+        result = dict(previous_result)
+        result.update(self._odds_from_probabilities(probs))
+        result.update({
+            "lambda_home": new_lambda_home,
+            "lambda_away": new_lambda_away,
+            "expected_total": new_lambda_home + new_lambda_away,
+            "favorite": self._determine_favorite(new_lambda_home, new_lambda_away),
+            "probabilities": probs,
+            "sensitivities": sens,
+            "reprice": mode,
+        })
+        return result
+
+    def price_lambdas(self, lambdas_home, lambdas_away):
+        """
+        Пакетная оценка рынков по готовым λ (без профилей/формы).
+        Для движков "table" и "exact" вероятности считаются сразу для всех матчей
+        (векторные выборки из таблиц / точные pmf + FFT), маржа/сетка — тоже пакетом.
 
-    # ==================================================
-    # PROFILES (из historical_df)
-    # ==================================================
-    def _build_corner_profiles(self, historical_df: pd.DataFrame):
+        Распределения negbin/bivariate — точные pmf пакетом (параметр — по последней
+        истории калькулятора, без неё — из config).
+
+        Возвращает PriceBatch (src/results.py): матчи — MatchPrice c odds_1x2/handicaps/
+        totals/individual_* (strength/form = 1, base λ = λ), to_frame() — таблица пакета.
+        """
+        lambdas_home = np.asarray(lambdas_home, dtype=float).reshape(-1)
+        lambdas_away = np.asarray(lambdas_away, dtype=float).reshape(-1)
+        ones = np.ones(len(lambdas_home))
+        return self._price_batch({
+            "lambda_home": lambdas_home,
+            "lambda_away": lambdas_away,
+            "base_lambda_home": lambdas_home,
+            "base_lambda_away": lambdas_away,
+            "strength_home": ones,
+            "strength_away": ones,
+            "strength_ratio": ones,
+            "form_home": ones,
+            "form_away": ones,
+            "anchor_scale": ones,
+        }, model=self._count_model())
+
+    def price_fixtures(self, historical_df, home_teams, away_teams, team_strength=None, form_df=None):
+        """
+        Пакетный расчёт матчей целиком: λ — fixture_lambdas, рынки — как в price_lambdas.
+        Поля MatchPrice те же, что у calculate_match_odds (для mc — совпадают точно,
+        exact/table — в пределах округления пакетных pmf).
+
+        Возвращает PriceBatch с HomeTeam/AwayTeam.
+        """
+        fields = self._fixture_components(historical_df, home_teams, away_teams, team_strength, form_df)
+        return self._price_batch(
+            fields,
+            anchor_line=self.config["ANCHOR_TOTAL_LINE"],
+            home_teams=home_teams,
+            away_teams=away_teams,
+            model=self._count_model(self._get_corner_profiles_cached(historical_df)),
+        )
+
+    def _price_batch(self, fields, anchor_line=None, home_teams=None, away_teams=None, model=None):
+        """
+        fields — массивы FLOAT_FIELDS без p_* (по матчам) -> PriceBatch.
+        model — распределение (_count_model), None — независимые Poisson движка.
+        """
+        lambdas_home = np.asarray(fields["lambda_home"], dtype=float)
+        lambdas_away = np.asarray(fields["lambda_away"], dtype=float)
+        layout = market_layout(self.config)
+        n = len(lambdas_home)
+        if n == 0:
+            return PriceBatch(layout)
+
+        if model is not None:
+            probs = self._market_probabilities(model.cdf_sf_batch(lambdas_home, lambdas_away), self.config)
+        elif self.engine in ("table", "exact"):
+            if self.engine == "table":
+                cdf_sf = load_tables(self.config).cdf_sf(lambdas_home, lambdas_away)
+            else:
+                cdf_sf = poisson_cdf_sf_batch(lambdas_home, lambdas_away)
+            probs = self._market_probabilities(cdf_sf, self.config)
+        else:
+            rows = [
+                self._market_probabilities(self._cdf_sf(lh, la), self.config)
+                for lh, la in zip(lambdas_home, lambdas_away)
+            ]
+            probs = {k: np.array([r[k] for r in rows], dtype=float) for k in rows[0]}
+
+        odds = self._odds_arrays_from_probabilities(probs)
+        values = np.column_stack([
+            lambdas_home, lambdas_away, lambdas_home + lambdas_away,
+            fields["base_lambda_home"], fields["base_lambda_away"],
+            fields["strength_home"], fields["strength_away"], fields["strength_ratio"],
+            fields["form_home"], fields["form_away"],
+            fields["anchor_scale"],
+            probs["P1"], probs["X"], probs["P2"],
+        ])
+        return PriceBatch.from_arrays(
+            layout,
+            values,
+            np.column_stack([odds[k] for k in layout.keys]),
+            [self._determine_favorite(lh, la) for lh, la in zip(lambdas_home, lambdas_away)],
+            anchor_line=[anchor_line] * n,
+            home=home_teams,
+            away=away_teams,
+        )
+
+    def fixture_lambdas(self, historical_df, home_teams, away_teams, team_strength=None, form_df=None):
         """
-        profiles[team] = {
-          for_avg:     сколько команда обычно подает угловых
-          against_avg: сколько команда обычно допускает угловых
+        Пакетный путь λ для многих матчей (сезонная симуляция, src/season.py):
+        тот же расчёт, что _calculate_lambdas, но base λ и strength — индексами
+        по массивам команд, форма — один раз на команду, strength/форма/anchor —
+        одним _combine_lambdas по всем матчам.
+
+        Возвращает (lambda_home, lambda_away) — массивы в порядке матчей.
+        """
+        fields = self._fixture_components(historical_df, home_teams, away_teams, team_strength, form_df)
+        return fields["lambda_home"], fields["lambda_away"]
+
+    def _fixture_components(self, historical_df, home_teams, away_teams, team_strength=None, form_df=None):
+        """
+        fixture_lambdas по частям: dict массивов lambda_*, base_lambda_*, strength_*,
+        strength_ratio, form_*, anchor_scale (как поля calculate_match_odds).
+        """
+        if team_strength is None:
+            team_strength = {}
+        home_teams = [str(t) for t in home_teams]
+        away_teams = [str(t) for t in away_teams]
+
+        stats = self._get_corner_profiles_cached(historical_df)
+        registry = stats["registry"]
+        home_ids = registry.lookup_many(home_teams)
+        away_ids = registry.lookup_many(away_teams)
+
+        def base(ids, base_key, n_key, league_avg):
+            known = ids >= 0
+            mean = np.zeros(len(ids))
+            n = np.zeros(len(ids))
+            mean[known] = stats[base_key][ids[known]]
+            n[known] = stats[n_key][ids[known]]
+            return np.where(n > 0, mean, league_avg)
+
+        strength = self._strength_array(stats, team_strength)
+
+        def strengths(ids, teams):
+            return np.array([
+                float(strength[i]) if i >= 0 else float(team_strength.get(t, 1.0))
+                for i, t in zip(ids, teams)
+            ])
+
+        form = {}
+        if form_df is not None:
+            for team in dict.fromkeys(home_teams + away_teams):
+                form[team] = self._compute_form_factor_from_file(
+                    form_df=form_df,
+                    team=team,
+                    team_stats=stats,
+                    n_games=self.config["FORM_N_GAMES"],
+                    beta=self.config["FORM_BETA"],
+                    clip_low=self.config["FORM_CLIP_LOW"],
+                    clip_high=self.config["FORM_CLIP_HIGH"],
+                )
+
+        fields = {
+            "base_lambda_home": base(home_ids, "base_home", "home_n", stats["league_avg_home"]),
+            "base_lambda_away": base(away_ids, "base_away", "away_n", stats["league_avg_away"]),
+            "strength_home": strengths(home_ids, home_teams),
+            "strength_away": strengths(away_ids, away_teams),
+            "form_home": np.array([form.get(t, 1.0) for t in home_teams]),
+            "form_away": np.array([form.get(t, 1.0) for t in away_teams]),
         }
+        (
+            fields["lambda_home"], fields["lambda_away"], fields["strength_ratio"], fields["anchor_scale"]
+        ) = self._combine_lambdas(
+            fields["base_lambda_home"], fields["base_lambda_away"],
+            fields["strength_home"], fields["strength_away"],
+            fields["form_home"], fields["form_away"],
+        )
+        return fields
+
+    def price_combos(self, lambda_home, lambda_away, combos):
         """
-        df = historical_df
-        teams = pd.unique(df[["HomeTeam", "AwayTeam"]].values.ravel("K"))
+        Комбинации рынков одного матча ("хозяева выигрывают по угловым И тотал больше 9.5").
 
-        profiles = {}
-        for t in teams:
-            t = str(t).strip()
-            if not t or t.lower() == "nan":
-                continue
+        combos — список комбинаций, комбинация — список ключей рынков как в
+        _market_probabilities ("P1", "Over_9.5", "Home_IT_4.5_over", "AwayTeam_F(+1.5)", ...).
+        Все комбинации считаются одной свёрткой по совместной матрице joint_matrix():
+        исход (i, j) проходит, если выигрывают все ноги.
 
-            home_rows = df[df["HomeTeam"] == t]
-            away_rows = df[df["AwayTeam"] == t]
+        Возвращает список dict: legs, prob, odds (маржа как у пары "комбо / не комбо", без
+        сетки: комбо обычно длиннее её максимума 11.56).
+        """
+        combos = [list(c) for c in combos]
+        if not combos:
+            return []
+
+        joint = self.joint_matrix(lambda_home, lambda_away)
+        legs = list(dict.fromkeys(k for c in combos for k in c))
+        masks = np.stack([market_mask(k, *joint.shape) for k in legs]).astype(np.int32)  # [L, i, j]
+
+        # [C, L]: какие ноги в комбинации; исход проходит, если выиграли все её ноги
+        leg_index = {k: n for n, k in enumerate(legs)}
+        select = np.zeros((len(combos), len(legs)), dtype=np.int32)
+        for c, combo in enumerate(combos):
+            select[c, [leg_index[k] for k in combo]] = 1
+        hits = np.tensordot(select, masks, axes=1) == select.sum(axis=1)[:, None, None]
+        probs = np.clip(np.tensordot(hits, joint, axes=2), 0.0, 1.0)
+
+        odds, _ = normalize_odds_pair_array(probs, 1.0 - probs, self.margin, snap_to_grid=False)
+        return [
+            {"legs": combo, "prob": float(p), "odds": None if p <= 0 or np.isnan(o) else float(o)}
+            for combo, p, o in zip(combos, probs, odds)
+        ]
+
+    def input_fingerprint(self, historical_df, home_team, away_team, team_strength=None, form_df=None):
+        """
+        Отпечаток всего, от чего зависит calculate_match_odds для пары:
+        версия расчёта (PRICING_VERSION), настройки (config/движок/маржа/симуляции), срезы истории обеих команд
+        (суммы HC/AC и число игр, средние лиги при fallback), strength,
+        последние FORM_N_GAMES игр формы и нормы их соперников.
 
-            for_vals = []
-            against_vals = []
+        Совпал отпечаток — совпадёт и результат (predict.py: инкрементальный прогон).
+        """
+        if team_strength is None:
+            team_strength = {}
+        stats = self._get_corner_profiles_cached(historical_df)
+        registry = stats["registry"]
+        strength = self._strength_array(stats, team_strength)
+
+        parts = [PRICING_VERSION, self.config.digest(), self.engine, self.margin, self.n_simulations]
+        model = self._count_model(stats)
+        if model is not None:
+            # параметр распределения зависит от всей истории, а не только от срезов команд
+            parts.append([model.name, model.params()])
+        for team, side, sum_key, n_key, base_key, league_key in (
+            (home_team, "home", "home_hc_sum", "home_n", "base_home", "league_avg_home"),
+            (away_team, "away", "away_ac_sum", "away_n", "base_away", "league_avg_away"),
+        ):
+            team_id = registry.lookup(team)
+            if team_id >= 0 and stats[n_key][team_id]:
+                parts.append([side, float(stats[sum_key][team_id]), int(stats[n_key][team_id])])
+                if stats.get("ewma") is not None:
+                    parts.append(float(stats[base_key][team_id]))
+            else:
+                parts.append([side, "league", stats[league_key]])
+            parts.append(float(strength[team_id]) if team_id >= 0 else float(team_strength.get(team, 1.0)))
 
-            # for (угловые команды)
-            for_vals.extend(home_rows["HC"].dropna().astype(float).tolist())
-            for_vals.extend(away_rows["AC"].dropna().astype(float).tolist())
+            games = self._form_games(form_df, team, stats, self.config["FORM_N_GAMES"])
+            if games is not None:
+                parts.append([np.asarray(g).tolist() for g in games])
 
-            # against (угловые соперника против команды)
-            against_vals.extend(home_rows["AC"].dropna().astype(float).tolist())
-            against_vals.extend(away_rows["HC"].dropna().astype(float).tolist())
+        raw = json.dumps(parts, ensure_ascii=False, default=str)
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
 
-            if len(for_vals) == 0 or len(against_vals) == 0:
-                continue
+    # ==================================================
+    # PROFILES (из historical_df) — массивы по id команды
+    # ==================================================
+    def _build_corner_profiles(self, historical_df: pd.DataFrame):
+        """
+        Статистика команд, индексированная id из TeamRegistry (один проход bincount
+        вместо df[df["HomeTeam"] == t] на каждую команду и каждый матч):
+
+          registry                  — имя/алиас -> id
+          home_hc_sum / home_n      — HC в домашних играх (base λ хозяев)
+          away_ac_sum / away_n      — AC в гостевых играх (base λ гостей)
+          home_ac_sum / away_hc_sum — угловые соперников (для against_avg)
+          base_home / base_away     — base λ: HC дома / AC в гостях (NaN = нет игр)
+          for_avg / against_avg     — сколько команда обычно подает / допускает
+                                      угловых (NaN = нет данных)
+          league_sums               — суммы/счётчики лиги для league_avg_home/away
+          ewma                      — EWMA-состояние (src/profiles.py), если задан
+                                      PROFILE_HALF_LIFE: base_* и for/against — из него
+
+        Хранятся суммы, а не средние: дописанные строки добавляются без пересборки
+        (_accumulate_history).
+        """
+        df = historical_df
 
-            profiles[t] = {
-                "for_avg": float(np.mean(for_vals)),
-                "against_avg": float(np.mean(against_vals)),
-            }
+        # id из загрузчика (load_historical_data(..., registry)) или свой реестр по именам
+        if self.registry is not None and "HomeTeam_id" in df.columns and "AwayTeam_id" in df.columns:
+            registry = self.registry
+            home_ids = np.asarray(df["HomeTeam_id"], dtype=np.int64)
+            away_ids = np.asarray(df["AwayTeam_id"], dtype=np.int64)
+        else:
+            registry = TeamRegistry() if self.registry is None else self.registry
+            if registry is self.registry:
+                # общий реестр не меняем (его могут читать другие потоки)
+                home_ids = registry.lookup_many(df["HomeTeam"])
+                away_ids = registry.lookup_many(df["AwayTeam"])
+            else:
+                home_ids = registry.intern_many(df["HomeTeam"])
+                away_ids = registry.intern_many(df["AwayTeam"])
+
+        hc = _float_column(df, "HC")
+        ac = _float_column(df, "AC")
+        stats = {
+            "registry": registry,
+            "league_sums": np.zeros(4),  # HC sum, HC n, AC sum, AC n
+            "strength_id": None,
+            "strength": None,
+            "form_id": None,
+            "form": None,
+            "rows": 0,
+            "ewma": self._initial_ewma(registry, home_ids, away_ids, hc, ac),
+        }
+        self._accumulate_history(stats, home_ids, away_ids, hc, ac)
+        return stats
 
-        return profiles
+    def _accumulate_history(self, stats, home_ids, away_ids, hc, ac):
+        """
+        Добавляет матчи (id хозяев/гостей, HC, AC) к суммам в stats и пересчитывает
+        профили затронутых команд. Тот же путь для полной сборки и для дописанных
+        строк (src/watcher.py): суммы целых угловых не зависят от порядка добавления.
+
+        Возвращает id затронутых команд.
+        """
+        registry = stats["registry"]
+        n_teams = len(registry)
+        old_n = len(stats.get("home_n", ()))
+        if n_teams > old_n or "home_n" not in stats:
+            # новые команды -> массивы растут (NaN профиль = нет данных)
+            grow = n_teams - old_n
+            for key in _TEAM_SUM_KEYS:
+                dtype = np.int64 if key.endswith("_n") else float
+                stats[key] = np.concatenate([stats.get(key, np.zeros(0, dtype=dtype)), np.zeros(grow, dtype=dtype)])
+            for key in ("base_home", "base_away", "for_avg", "against_avg"):
+                stats[key] = np.concatenate([stats.get(key, np.zeros(0)), np.full(grow, np.nan)])
+            # кэши, завязанные на число команд
+            stats["strength_id"] = None
+            if stats.get("form") is not None:
+                form = stats["form"]
+                form["stats_id"] = np.array([registry.lookup(k) for k in form["code"]], dtype=np.int64)
+
+        hc = np.asarray(hc, dtype=float)
+        ac = np.asarray(ac, dtype=float)
+        home_ids = np.asarray(home_ids, dtype=np.int64)
+        away_ids = np.asarray(away_ids, dtype=np.int64)
+
+        def team_sum(ids, values, sum_key, n_key):
+            ok = (ids >= 0) & ~np.isnan(values)
+            stats[sum_key] += np.bincount(ids[ok], weights=values[ok], minlength=n_teams)
+            stats[n_key] += np.bincount(ids[ok], minlength=n_teams)
+
+        team_sum(home_ids, hc, "home_hc_sum", "home_n")
+        team_sum(away_ids, ac, "away_ac_sum", "away_n")
+        team_sum(away_ids, hc, "away_hc_sum", "away_hc_n")
+        team_sum(home_ids, ac, "home_ac_sum", "home_ac_n")
+
+        if self.distribution != "poisson":
+            # строки истории для подбора параметра распределения (_count_model)
+            stats.setdefault("history_rows", []).append((home_ids, away_ids, hc, ac))
+            stats["count_model"] = None
+
+        league = stats["league_sums"]
+        league += [np.nansum(hc), np.count_nonzero(~np.isnan(hc)), np.nansum(ac), np.count_nonzero(~np.isnan(ac))]
+        stats["league_avg_home"] = float(league[0] / league[1]) if league[1] else np.nan
+        stats["league_avg_away"] = float(league[2] / league[3]) if league[3] else np.nan
+
+        touched = np.unique(np.concatenate([home_ids, away_ids]))
+        touched = touched[touched >= 0]
+
+        ewma = stats.get("ewma")
+        if ewma is not None:
+            # строки, уже учтённые восстановленным состоянием, пропускаем
+            start = max(0, ewma.rows - stats["rows"])
+            ewma.update_many(home_ids[start:], away_ids[start:], hc[start:], ac[start:])
+            means = ewma.means(touched)
+            stats["base_home"][touched] = means["home_for"]
+            stats["base_away"][touched] = means["away_for"]
+            stats["for_avg"][touched] = means["for_avg"]
+            stats["against_avg"][touched] = means["against_avg"]
+            stats["rows"] += len(hc)
+            return touched
+        stats["rows"] += len(hc)
+
+        # for = свои угловые (HC дома + AC в гостях), against = угловые соперника
+        home_n = stats["home_n"][touched]
+        away_n = stats["away_n"][touched]
+        for_n = home_n + away_n
+        against_n = stats["home_ac_n"][touched] + stats["away_hc_n"][touched]
+        has_profile = (for_n > 0) & (against_n > 0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            stats["base_home"][touched] = np.where(home_n > 0, stats["home_hc_sum"][touched] / home_n, np.nan)
+            stats["base_away"][touched] = np.where(away_n > 0, stats["away_ac_sum"][touched] / away_n, np.nan)
+            stats["for_avg"][touched] = np.where(
+                has_profile, (stats["home_hc_sum"][touched] + stats["away_ac_sum"][touched]) / for_n, np.nan
+            )
+            stats["against_avg"][touched] = np.where(
+                has_profile, (stats["home_ac_sum"][touched] + stats["away_hc_sum"][touched]) / against_n, np.nan
+            )
+        return touched
+
+    def _initial_ewma(self, registry, home_ids, away_ids, hc, ac):
+        """
+        EWMA-состояние для новой сборки профилей: None (PROFILE_HALF_LIFE не задан),
+        восстановленное из self.ewma_state (тот же half_life и построено по началу
+        этой истории — EwmaProfiles.covers) или пустое. Состояние всей истории
+        у шарда лиги (src/leagues.py) не подходит и пересчитывается с нуля.
+        """
+        half_life = self.config["PROFILE_HALF_LIFE"]
+        if half_life is None:
+            return None
+        state = self.ewma_state
+        if state is not None and float(state["half_life"]) == float(half_life):
+            profiles = EwmaProfiles.from_dict(state, registry)
+            if profiles.covers(home_ids, away_ids, hc, ac):
+                return profiles
+        return EwmaProfiles(half_life, len(registry))
+
+    def ewma_profiles(self, historical_df):
+        """
+        EWMA-состояние профилей historical_df (src/profiles.py) или None;
+        to_dict(registry.names) / save(...) — для следующего запуска (ewma_state).
+        """
+        return self._get_corner_profiles_cached(historical_df).get("ewma")
 
     def _get_corner_profiles_cached(self, historical_df: pd.DataFrame):
         df_id = id(historical_df)
@@ -133,14 +625,150 @@ class CornerOddsCalculator:
         self._profiles_cache = profiles
         return profiles
 
+    def _count_model(self, stats=None):
+        """
+        Распределение угловых для рынков (src/distributions.py) или None для poisson
+        (рынки считает движок). Параметр не задан в config -> подбор по строкам
+        истории stats (по умолчанию — последняя история калькулятора), кэш в stats
+        до следующего _accumulate_history.
+        """
+        if self.distribution == "poisson":
+            return None
+        stats = self._profiles_cache if stats is None else stats
+        if stats is None:
+            return count_model(self.distribution, self.config)
+        if stats.get("count_model") is None:
+            stats["count_model"] = count_model(self.distribution, self.config, self._model_history(stats))
+        return stats["count_model"]
+
+    @staticmethod
+    def _model_history(stats):
+        """
+        (HC, AC, μ хозяев, μ гостей) по строкам истории: μ — base λ команд
+        (HC дома / AC в гостях), NaN — команды без id или без игр.
+        """
+        rows = stats.get("history_rows") or []
+        if not rows:
+            return None
+        home_ids, away_ids, hc, ac = (np.concatenate(parts) for parts in zip(*rows))
+
+        def team_mean(ids, base_key):
+            mean = np.full(len(ids), np.nan)
+            known = ids >= 0
+            mean[known] = stats[base_key][ids[known]]
+            return mean
+
+        return hc, ac, team_mean(home_ids, "base_home"), team_mean(away_ids, "base_away")
+
+    def _strength_array(self, stats, team_strength):
+        """
+        team_strength {имя: сила} -> массив по id (1.0 = нет данных), кэш по объекту dict.
+        """
+        if stats["strength_id"] != id(team_strength):
+            stats["strength"] = stats["registry"].to_array(team_strength, default=1.0)
+            stats["strength_id"] = id(team_strength)
+        return stats["strength"]
+
+    def _form_index(self, stats, form_df):
+        """
+        form_df -> int-коды команд (свои для формы: в ней могут быть команды без истории)
+        и id соперника в stats для профиля. Кэш по объекту form_df.
+        """
+        if stats["form_id"] == id(form_df):
+            return stats["form"]
+
+        stats["form"] = {
+            "code": {},
+            "p1": np.zeros(0, dtype=np.int64),
+            "p2": np.zeros(0, dtype=np.int64),
+            "p1_names": np.zeros(0, dtype=object),
+            "p2_names": np.zeros(0, dtype=object),
+            "stats_id": np.zeros(0, dtype=np.int64),
+            "dates": np.asarray(form_df["Date"])[:0],
+            "score_p1": np.zeros(0),
+            "score_p2": np.zeros(0),
+        }
+        stats["form_id"] = id(form_df)
+        self._extend_form_index(stats, form_df, 0)
+        return stats["form"]
+
+    def _extend_form_index(self, stats, form_df, start):
+        """
+        Дописывает в индекс формы строки form_df[start:] (новые строки файла формы).
+        Возвращает коды команд из этих строк.
+        """
+        form = stats["form"]
+        registry = stats["registry"]
+        code = form["code"]
+        n_codes = len(code)
+
+        cols = {col: np.asarray(form_df[col])[start:] for col in ("Date", "p1", "p2", "score_p1", "score_p2")}
+        new = {
+            col: np.array([code.setdefault(registry.key(name), len(code)) for name in cols[col]], dtype=np.int64)
+            for col in ("p1", "p2")
+        }
+        for col in ("p1", "p2"):
+            form[col] = np.concatenate([form[col], new[col]])
+            names = np.asarray([str(t).strip() for t in cols[col]], dtype=object)
+            form[f"{col}_names"] = np.concatenate([form[f"{col}_names"], names])
+        form["stats_id"] = np.concatenate([
+            form["stats_id"], np.array([registry.lookup(k) for k in list(code)[n_codes:]], dtype=np.int64)
+        ])
+        form["dates"] = np.concatenate([form["dates"], cols["Date"]])
+        form["score_p1"] = np.concatenate([form["score_p1"], cols["score_p1"].astype(float)])
+        form["score_p2"] = np.concatenate([form["score_p2"], cols["score_p2"].astype(float)])
+
+        # игры команды подряд, по дате (внутри дня — порядок строк):
+        # игры команды c = team_rows[offsets[c]:offsets[c + 1]]
+        n = len(form["p1"])
+        team_codes = np.concatenate([form["p1"], form["p2"]])
+        rows = np.concatenate([np.arange(n), np.arange(n)])
+        order = np.lexsort((rows, form["dates"][rows], team_codes))
+        form["team_rows"] = rows[order]
+        form["offsets"] = np.searchsorted(team_codes[order], np.arange(len(code) + 1))
+        return np.unique(np.concatenate([new["p1"], new["p2"]]))
+
     # ==================================================
     # FORM (последние N игр) — residual vs нормы соперника
     # ==================================================
+    def _form_games(self, form_df, team, team_stats, n_games):
+        """
+        Последние n_games игр команды в форме и нормы соперников по истории:
+        (is_home, corners_for, corners_against, opp_allow, opp_for, opp_names)
+        или None (нет формы / игр). opp_allow/opp_for = NaN — у соперника нет профиля.
+        """
+        if form_df is None or len(form_df) == 0:
+            return None
+
+        form = self._form_index(team_stats, form_df)
+        code = form["code"].get(team_stats["registry"].key(team))
+        if code is None:
+            return None
+
+        # последние n_games по дате — срез по индексу команды
+        rows = form["team_rows"][form["offsets"][code]:form["offsets"][code + 1]][-int(n_games):]
+        if len(rows) == 0:
+            return None
+
+        is_home = form["p1"][rows] == code
+        corners_for = np.where(is_home, form["score_p1"][rows], form["score_p2"][rows])
+        corners_against = np.where(is_home, form["score_p2"][rows], form["score_p1"][rows])
+        opp_code = np.where(is_home, form["p2"][rows], form["p1"][rows])
+
+        opp_id = form["stats_id"][opp_code]
+        opp_ok = opp_id >= 0
+        opp_allow = np.full(len(rows), np.nan)
+        opp_for = np.full(len(rows), np.nan)
+        opp_allow[opp_ok] = team_stats["against_avg"][opp_id[opp_ok]]
+        opp_for[opp_ok] = team_stats["for_avg"][opp_id[opp_ok]]
+        opp_names = np.where(is_home, form["p2_names"][rows], form["p1_names"][rows])
+        return is_home, corners_for, corners_against, opp_allow, opp_for, opp_names
+
     def _compute_form_factor_from_file(
         self,
         form_df: pd.DataFrame,
         team: str,
-        opponent_profiles: dict,
+        team_stats: dict,
         n_games: int,
         beta: float,
         clip_low: float,
@@ -159,65 +787,49 @@ class CornerOddsCalculator:
 
         form_factor = exp(beta * mean(residuals)) и потом clip.
         """
-        if form_df is None or len(form_df) == 0:
+        games = self._form_games(form_df, team, team_stats, n_games)
+        if games is None:
             return 1.0
+        is_home, corners_for, corners_against, opp_allow, opp_for, opp_names = games
+        valid = ~np.isnan(opp_allow)
 
-        games = form_df[(form_df["p1"] == team) | (form_df["p2"] == team)].copy()
-        if len(games) == 0:
-            return 1.0
-
-        games = games.sort_values("Date").tail(int(n_games))
-
-        residuals = []
-        debug_rows = []
-
-        for _, r in games.iterrows():
-            if r["p1"] == team:
-                corners_for = float(r["score_p1"])
-                corners_against = float(r["score_p2"])
-                opp = str(r["p2"]).strip()
-                side = "home"
-            else:
-                corners_for = float(r["score_p2"])
-                corners_against = float(r["score_p1"])
-                opp = str(r["p1"]).strip()
-                side = "away"
-
-            opp_prof = opponent_profiles.get(opp)
-            if not opp_prof:
-                continue
-
-            opp_allow = float(opp_prof["against_avg"])
-            opp_for = float(opp_prof["for_avg"])
-
-            atk = corners_for - opp_allow
-            dfn = opp_for - corners_against
-            resid = atk + dfn
-
-            residuals.append(resid)
-            if debug_print:
-                debug_rows.append((opp, side, corners_for, opp_allow, atk, corners_against, opp_for, dfn, resid))
+        atk = corners_for - opp_allow
+        dfn = opp_for - corners_against
+        residuals = (atk + dfn)[valid]
 
         if len(residuals) == 0:
             return 1.0
 
         form_score = float(np.mean(residuals))
         raw = float(np.exp(float(beta) * form_score))
-        form_factor = max(min(raw, float(clip_high)), float(clip_low))
+        form_factor = float(self._form_factor_from_score(form_score, beta, clip_low, clip_high))
 
         if debug_print:
             print(f"\n🧩 Form debug for {team} (last {len(residuals)} games):")
-            for (opp, side, cf, oa, atk, ca, of, dfn, resid) in debug_rows:
+            for i in np.nonzero(valid)[0]:
+                side = "home" if is_home[i] else "away"
                 print(
-                    f"  vs {opp:<18} ({side}) "
-                    f"for={cf:.0f}(opp_allow={oa:.2f}) atk {atk:+.2f} | "
-                    f"against={ca:.0f}(opp_for={of:.2f}) def {dfn:+.2f} | sum {resid:+.2f}"
+                    f"  vs {opp_names[i]:<18} ({side}) "
+                    f"for={corners_for[i]:.0f}(opp_allow={opp_allow[i]:.2f}) atk {atk[i]:+.2f} | "
+                    f"against={corners_against[i]:.0f}(opp_for={opp_for[i]:.2f}) def {dfn[i]:+.2f} | "
+                    f"sum {atk[i] + dfn[i]:+.2f}"
                 )
             print(f"  form_score(avg)={form_score:+.2f}")
             print(f"  exp(beta*score)={raw:.3f} -> clipped={form_factor:.3f} (clip {clip_low}-{clip_high}, beta={beta})")
 
         return float(form_factor)
 
+    @staticmethod
+    def _form_factor_from_score(form_score, beta, clip_low, clip_high):
+        """
+        exp(beta * form_score) + clip. Работает и с массивами
+        (NaN в form_score = нет данных -> 1.0).
+        """
+        form_score = np.asarray(form_score, dtype=float)
+        raw = np.exp(np.asarray(beta, dtype=float) * np.nan_to_num(form_score, nan=0.0))
+        factor = np.maximum(np.minimum(raw, clip_high), clip_low)
+        return np.where(np.isnan(form_score), 1.0, factor)
+
     # ==================================================
     # TOTAL ANCHOR (мягкая привязка к линии)
     # ==================================================
@@ -227,37 +839,88 @@ class CornerOddsCalculator:
         Для суммы Poisson: Total ~ Poisson(mean).
         P(Total > line) = 1 - CDF(floor(line))
         """
+        return float(CornerOddsCalculator._poisson_over_prob_array(mean, line))
+
+    def _find_scale_for_target_over(self, mean: float, line: float, target_over: float) -> float:
+        """
+        Подбираем scale, чтобы P(Poisson(mean*scale) > line) ~= target_over
+        """
+        return float(self._find_scale_for_target_over_array(mean, line, target_over))
+
+    @staticmethod
+    def _poisson_over_prob_array(mean, line):
+        """
+        P(Poisson(mean) > line), mean — число или массив.
+        CDF считаем итеративно без scipy: P(0)=exp(-m); P(i)=P(i-1)*m/i
+        """
+        mean = np.asarray(mean, dtype=float)
         k = int(np.floor(line))
-        if mean <= 0:
-            return 0.0
-
-        # считаем CDF итеративно без scipy
-        # P(0)=exp(-m); P(i)=P(i-1)*m/i
-        p0 = np.exp(-mean)
-        cdf = p0
-        p = p0
+
+        p = np.exp(-mean)
+        cdf = p.copy()
         for i in range(1, k + 1):
             p = p * mean / i
-            cdf += p
+            cdf = cdf + p
 
-        over = 1.0 - cdf
-        return float(max(0.0, min(1.0, over)))
+        over = np.clip(1.0 - cdf, 0.0, 1.0)
+        return np.where(mean <= 0, 0.0, over)
 
-    def _find_scale_for_target_over(self, mean: float, line: float, target_over: float) -> float:
+    def _find_scale_for_target_over_array(self, mean, line, target_over):
         """
-        Подбираем scale, чтобы P(Poisson(mean*scale) > line) ~= target_over
+        Подбираем scale, чтобы P(Poisson(mean*scale) > line) ~= target_over.
+        Бисекция сразу по всем mean (target_over тоже может быть массивом).
         """
-        target_over = float(max(0.001, min(0.999, target_over)))
+        mean = np.asarray(mean, dtype=float)
+        target_over = np.clip(np.asarray(target_over, dtype=float), 0.001, 0.999)
 
-        lo, hi = 0.3, 3.0
+        lo = np.full(np.broadcast(mean, target_over).shape, 0.3)
+        hi = np.full_like(lo, 3.0)
         for _ in range(35):
             mid = (lo + hi) / 2.0
-            p_over = self._poisson_over_prob(mean * mid, line)
-            if p_over < target_over:
-                lo = mid
-            else:
-                hi = mid
-        return float((lo + hi) / 2.0)
+            below = self._poisson_over_prob_array(mean * mid, line) < target_over
+            lo = np.where(below, mid, lo)
+            hi = np.where(below, hi, mid)
+        return (lo + hi) / 2.0
+
+    def _combine_lambdas(self, base_lambda_home, base_lambda_away, s_home, s_away, form_home, form_away, params=None):
+        """
+        base λ -> итоговые λ: strength ratio, форма, мягкий anchor, защита.
+        Работает со скалярами и с массивами (backtest/калибровка).
+
+        params — mapping с ключами как в CONFIG (STRENGTH_POWER, ANCHOR_*, MIN/MAX_LAMBDA),
+        по умолчанию self.config; значения тоже могут быть массивами (ось параметров).
+
+        Возвращает (lambda_home, lambda_away, ratio, anchor_scale).
+        """
+        params = self.config if params is None else params
+
+        s_home = np.asarray(s_home, dtype=float)
+        s_away = np.asarray(s_away, dtype=float)
+        ratio = (s_home / np.maximum(1e-9, s_away)) ** np.asarray(params["STRENGTH_POWER"], dtype=float)
+
+        lambda_home = base_lambda_home * ratio
+        lambda_away = base_lambda_away / ratio
+
+        lambda_home = lambda_home * form_home
+        lambda_away = lambda_away * form_away
+
+        # мягкая привязка к тоталу (не прибивает, если weight < 1)
+        anchor_line = params["ANCHOR_TOTAL_LINE"]
+        anchor_scale = np.ones_like(lambda_home)
+        if anchor_line is not None:
+            best_scale = self._find_scale_for_target_over_array(
+                lambda_home + lambda_away, float(anchor_line), params["ANCHOR_TARGET_OVER_PROB"]
+            )
+            w = np.asarray(params["ANCHOR_WEIGHT"], dtype=float)
+            anchor_scale = (1.0 - w) * 1.0 + w * best_scale
+
+            lambda_home = lambda_home * anchor_scale
+            lambda_away = lambda_away * anchor_scale
+
+        # защита
+        lambda_home = np.clip(lambda_home, params["MIN_LAMBDA"], params["MAX_LAMBDA"])
+        lambda_away = np.clip(lambda_away, params["MIN_LAMBDA"], params["MAX_LAMBDA"])
+        return lambda_home, lambda_away, ratio, anchor_scale
 
     # ==================================================
     # LAMBDAS (strength + form + мягкий anchor)
@@ -273,75 +936,65 @@ class CornerOddsCalculator:
         max_lambda=None,
         form_df: pd.DataFrame = None,
     ):
-        strength_power = CONFIG["STRENGTH_POWER"] if strength_power is None else float(strength_power)
-        min_lambda = CONFIG["MIN_LAMBDA"] if min_lambda is None else float(min_lambda)
-        max_lambda = CONFIG["MAX_LAMBDA"] if max_lambda is None else float(max_lambda)
+        strength_power = self.config["STRENGTH_POWER"] if strength_power is None else float(strength_power)
+        min_lambda = self.config["MIN_LAMBDA"] if min_lambda is None else float(min_lambda)
+        max_lambda = self.config["MAX_LAMBDA"] if max_lambda is None else float(max_lambda)
 
-        # базовые
-        home_games = df[df["HomeTeam"] == home_team]["HC"]
-        away_games = df[df["AwayTeam"] == away_team]["AC"]
+        # статистика команд по id (кэш на historical_df)
+        stats = self._get_corner_profiles_cached(df)
+        registry = stats["registry"]
+        home_id = registry.lookup(home_team)
+        away_id = registry.lookup(away_team)
 
-        league_avg_home = float(df["HC"].mean())
-        league_avg_away = float(df["AC"].mean())
-
-        base_lambda_home = float(home_games.mean()) if len(home_games) else league_avg_home
-        base_lambda_away = float(away_games.mean()) if len(away_games) else league_avg_away
-
-        # strength
-        s_home = float(team_strength.get(home_team, 1.0))
-        s_away = float(team_strength.get(away_team, 1.0))
-        ratio = (s_home / max(1e-9, s_away)) ** strength_power
-
-        lambda_home = base_lambda_home * ratio
-        lambda_away = base_lambda_away / ratio
+        # базовые
+        league_avg_home = stats["league_avg_home"]
+        league_avg_away = stats["league_avg_away"]
+
+        if home_id >= 0 and stats["home_n"][home_id]:
+            base_lambda_home = float(stats["base_home"][home_id])
+        else:
+            base_lambda_home = league_avg_home
+        if away_id >= 0 and stats["away_n"][away_id]:
+            base_lambda_away = float(stats["base_away"][away_id])
+        else:
+            base_lambda_away = league_avg_away
+
+        # strength (по id; команды без истории — по имени)
+        strength = self._strength_array(stats, team_strength)
+        s_home = float(strength[home_id]) if home_id >= 0 else float(team_strength.get(home_team, 1.0))
+        s_away = float(strength[away_id]) if away_id >= 0 else float(team_strength.get(away_team, 1.0))
 
         # form
-        opponent_profiles = self._get_corner_profiles_cached(df)
-
         form_home = 1.0
         form_away = 1.0
         if form_df is not None:
             form_home = self._compute_form_factor_from_file(
                 form_df=form_df,
                 team=home_team,
-                opponent_profiles=opponent_profiles,
-                n_games=CONFIG["FORM_N_GAMES"],
-                beta=CONFIG["FORM_BETA"],
-                clip_low=CONFIG["FORM_CLIP_LOW"],
-                clip_high=CONFIG["FORM_CLIP_HIGH"],
-                debug_print=CONFIG["FORM_DEBUG"],
+                team_stats=stats,
+                n_games=self.config["FORM_N_GAMES"],
+                beta=self.config["FORM_BETA"],
+                clip_low=self.config["FORM_CLIP_LOW"],
+                clip_high=self.config["FORM_CLIP_HIGH"],
+                debug_print=self.config["FORM_DEBUG"],
             )
             form_away = self._compute_form_factor_from_file(
                 form_df=form_df,
                 team=away_team,
-                opponent_profiles=opponent_profiles,
-                n_games=CONFIG["FORM_N_GAMES"],
-                beta=CONFIG["FORM_BETA"],
-                clip_low=CONFIG["FORM_CLIP_LOW"],
-                clip_high=CONFIG["FORM_CLIP_HIGH"],
-                debug_print=CONFIG["FORM_DEBUG"],
+                team_stats=stats,
+                n_games=self.config["FORM_N_GAMES"],
+                beta=self.config["FORM_BETA"],
+                clip_low=self.config["FORM_CLIP_LOW"],
+                clip_high=self.config["FORM_CLIP_HIGH"],
+                debug_print=self.config["FORM_DEBUG"],
             )
 
-        lambda_home *= form_home
-        lambda_away *= form_away
-
-        # мягкая привязка к тоталу (не прибивает, если weight < 1)
-        anchor_line = CONFIG["ANCHOR_TOTAL_LINE"]
-        anchor_scale = 1.0
-        if anchor_line is not None:
-            mean_total = float(lambda_home + lambda_away)
-            target_over = float(CONFIG["ANCHOR_TARGET_OVER_PROB"])
-            best_scale = self._find_scale_for_target_over(mean_total, float(anchor_line), target_over)
-
-            w = float(CONFIG["ANCHOR_WEIGHT"])
-            anchor_scale = (1.0 - w) * 1.0 + w * best_scale
-
-            lambda_home *= anchor_scale
-            lambda_away *= anchor_scale
-
-        # защита
-        lambda_home = max(min(float(lambda_home), max_lambda), min_lambda)
-        lambda_away = max(min(float(lambda_away), max_lambda), min_lambda)
+        # strength + form + anchor + защита
+        params = dict(self.config, STRENGTH_POWER=strength_power, MIN_LAMBDA=min_lambda, MAX_LAMBDA=max_lambda)
+        lambda_home, lambda_away, ratio, anchor_scale = self._combine_lambdas(
+            base_lambda_home, base_lambda_away, s_home, s_away, form_home, form_away, params
+        )
+        anchor_line = self.config["ANCHOR_TOTAL_LINE"]
 
         return (
             float(lambda_home),
@@ -367,19 +1020,215 @@ class CornerOddsCalculator:
         return "home" if diff > 0 else "away"
 
     def _monte_carlo_simulation(self, lambda_home, lambda_away):
-        np.random.seed(42)
-        home = np.random.poisson(float(lambda_home), self.n_simulations)
-        away = np.random.poisson(float(lambda_away), self.n_simulations)
+        # свой RandomState(42) вместо np.random.seed(42): тот же поток чисел,
+        # но без общего глобального состояния между потоками
+        rng = np.random.RandomState(42)
+        home = rng.poisson(float(lambda_home), self.n_simulations)
+        away = rng.poisson(float(lambda_away), self.n_simulations)
         return home, away, home - away, home + away
 
     # ==================================================
-    # 1X2 corners
+    # ENGINES: λ -> оценщик f(var, k) = (P(var <= k), P(var > k))
+    # ==================================================
+    def _cdf_sf(self, lambda_home, lambda_away, model=None):
+        # распределение не Poisson -> точная совместная pmf модели при любом движке
+        if model is not None:
+            return self._cdf_sf_from_joint(model.joint_pmf(lambda_home, lambda_away), 1.0)
+
+        if self.engine == "mc":
+            return self._cdf_sf_from_joint(self._mc_joint_counts(lambda_home, lambda_away), self.n_simulations)
+
+        if self.engine == "exact":
+            joint = np.outer(poisson_pmf(lambda_home), poisson_pmf(lambda_away))
+            return self._cdf_sf_from_joint(joint, 1.0)
+
+        if self.engine == "table":
+            return load_tables(self.config).cdf_sf(float(lambda_home), float(lambda_away))
+
+        raise ValueError(f"Неизвестный движок: {self.engine!r} (есть: {ENGINES})")
+
+    def _mc_joint_counts(self, lambda_home, lambda_away):
+        """
+        Выборки MC -> счётчики исходов counts[home, away].
+        """
+        home, away, _, _ = self._monte_carlo_simulation(lambda_home, lambda_away)
+        k_away = int(away.max()) + 1
+        counts = np.bincount(home * k_away + away)
+        counts = np.pad(counts, (0, (int(home.max()) + 1) * k_away - len(counts)))
+        return counts.reshape(-1, k_away)
+
+    def joint_matrix(self, lambda_home, lambda_away):
+        """
+        Усечённая совместная вероятность P(home=i, away=j):
+          mc           — гистограмма выборок (доли n_simulations),
+          exact/table  — произведение точных pmf (в таблицах только CDF),
+          negbin/bivariate — точная pmf распределения (_count_model).
+        """
+        model = self._count_model()
+        if model is not None:
+            return model.joint_pmf(lambda_home, lambda_away)
+        if self.engine == "mc":
+            return self._mc_joint_counts(lambda_home, lambda_away) / float(self.n_simulations)
+        return np.outer(poisson_pmf(lambda_home), poisson_pmf(lambda_away))
+
+    @staticmethod
+    def _cdf_sf_from_joint(joint, n):
+        """
+        joint[i, j] — вес исхода (home=i, away=j): счётчики MC (n = число симуляций)
+        или точная pmf (n = 1).
+
+        P(X > k) считаем как (сумма - накопленное) / n: для целых счётчиков
+        это ровно np.sum(x > k) / n, как и в прямом подсчёте по выборке.
+        """
+        joint = np.asarray(joint, dtype=float)
+        ni, nj = joint.shape
+        i = np.arange(ni)[:, None]
+        j = np.arange(nj)[None, :]
+
+        marginals = {
+            "home": (joint.sum(axis=1), 0),
+            "away": (joint.sum(axis=0), 0),
+            "total": (np.bincount((i + j).ravel(), weights=joint.ravel(), minlength=ni + nj - 1), 0),
+            "diff": (np.bincount((i - j + nj - 1).ravel(), weights=joint.ravel(), minlength=ni + nj - 1), -(nj - 1)),
+        }
+        cumulative = {}
+        for var, (w, offset) in marginals.items():
+            cumulative[var] = (np.cumsum(w), offset, float(w.sum()))
+
+        def f(var, k):
+            cum, offset, mass = cumulative[var]
+            idx = int(k) - offset
+            if idx < 0:
+                c = 0.0
+            elif idx >= len(cum):
+                c = mass
+            else:
+                c = float(cum[idx])
+            return c / n, (mass - c) / n
+
+        return f
+
+    def _sensitivities(self, lambda_home, lambda_away, probs, model=None):
+        """
+        Производные вероятностей всех рынков по λ_home/λ_away.
+        Вероятности рынков линейны по совместной pmf, поэтому производная = тот же
+        расчёт рынков на производной pmf: для независимых Poisson — (dph ⊗ pa),
+        (ph ⊗ dpa) и т.д., для распределения model — model.joint_derivatives.
+        """
+        if model is None:
+            ph, dph, d2ph = poisson_pmf_derivatives(lambda_home)
+            pa, dpa, d2pa = poisson_pmf_derivatives(lambda_away)
+            joints = {
+                "d_home": np.outer(dph, pa),
+                "d_away": np.outer(ph, dpa),
+                "d2_home": np.outer(d2ph, pa),
+                "d2_away": np.outer(ph, d2pa),
+                "d2_home_away": np.outer(dph, dpa),
+            }
+        else:
+            joints = model.joint_derivatives(lambda_home, lambda_away)
+
+        def market_derivative(joint):
+            cdf_sf = self._cdf_sf_from_joint(joint, 1.0)
+            return {k: float(v) for k, v in self._market_probabilities(cdf_sf, self.config).items()}
+
+        sens = {
+            "lambda_home": float(lambda_home),
+            "lambda_away": float(lambda_away),
+            "p": {k: float(v) for k, v in probs.items()},
+        }
+        for key in ("d_home", "d_away", "d2_home", "d2_away", "d2_home_away"):
+            sens[key] = market_derivative(joints[key])
+        return sens
+
+    # ==================================================
+    # MARKET PROBABILITIES (одни и те же для всех движков)
+    # ==================================================
+    @staticmethod
+    def _market_probabilities(cdf_sf, config=None):
+        """
+        Сырые вероятности всех рынков (до маржи/сетки), плоский dict:
+          P1/X/P2, HomeTeam_F(h)/AwayTeam_F(h), Over_l/Under_l,
+          Home_IT_l_over/..., Away_IT_l_under
+
+        P(X > l) = P(X > floor(l)),  P(X < l) = P(X <= ceil(l) - 1)
+        """
+        config = CONFIG if config is None else config
+
+        def gt(var, line):
+            return cdf_sf(var, int(np.floor(line)))[1]
+
+        def lt(var, line):
+            return cdf_sf(var, int(np.ceil(line)) - 1)[0]
+
+        probs = {
+            "P1": gt("diff", 0),
+            "X": cdf_sf("diff", 0)[0] - cdf_sf("diff", -1)[0],
+            "P2": lt("diff", 0),
+        }
+
+        # форы: diff = home - away; F(-h) у хозяев выигрывает при diff > h
+        for h in _handicap_values(config["HANDICAP_LINES"]):
+            if h == 0:
+                probs["HomeTeam_F(0)"] = gt("diff", 0)
+                probs["AwayTeam_F(0)"] = lt("diff", 0)
+                continue
+            # пара — взаимоисключающие исходы: Away +h выигрывает при diff < h
+            probs[f"HomeTeam_F(-{h:g})"] = gt("diff", h)
+            probs[f"AwayTeam_F(+{h:g})"] = lt("diff", h)
+            probs[f"AwayTeam_F(-{h:g})"] = lt("diff", -h)
+            probs[f"HomeTeam_F(+{h:g})"] = gt("diff", -h)
+
+        for line in config["TOTAL_LINES"]:
+            probs[f"Over_{line}"] = gt("total", line)
+            probs[f"Under_{line}"] = lt("total", line)
+
+        for prefix, var in (("Home", "home"), ("Away", "away")):
+            for line in config["IT_LINES"]:
+                probs[f"{prefix}_IT_{line}_over"] = gt(var, line)
+                probs[f"{prefix}_IT_{line}_under"] = lt(var, line)
+
+        return probs
+
+    # ==================================================
+    # ODDS (маржа + сетка)
     # ==================================================
-    def _calculate_1x2(self, diff):
-        n = len(diff)
-        p_home = float(np.sum(diff > 0) / n)
-        p_draw = float(np.sum(diff == 0) / n)
-        p_away = float(np.sum(diff < 0) / n)
+    def _odds_from_probabilities(self, probs, config=None):
+        config = self.config if config is None else config
+        return {
+            "odds_1x2": self._calculate_1x2(probs),
+            "handicaps": self._calculate_handicaps_fixed_sides(probs, config),
+            "totals": self._calculate_totals(probs, config),
+            "individual_home": self._calculate_individual_totals(probs, "Home", config),
+            "individual_away": self._calculate_individual_totals(probs, "Away", config),
+        }
+
+    def _odds_arrays_from_probabilities(self, probs, config=None):
+        """
+        Векторный вариант для пакетов матчей: probs — dict массивов (ключи как
+        в _market_probabilities), результат — плоский dict массивов коэффициентов
+        с теми же ключами (NaN там, где скалярный расчёт даёт None).
+        """
+        config = self.config if config is None else config
+        odds = {}
+        odds["P1"], odds["X"], odds["P2"] = normalize_odds_triplet_array(
+            probs["P1"], probs["X"], probs["P2"], self.margin
+        )
+        # все пары одним вызовом: (n_pairs, n_matches)
+        pairs = market_pairs(config)
+        o1, o2 = normalize_odds_pair_array(
+            np.stack([np.asarray(probs[k1], dtype=float) for k1, _ in pairs]),
+            np.stack([np.asarray(probs[k2], dtype=float) for _, k2 in pairs]),
+            self.margin,
+        )
+        for n, (k1, k2) in enumerate(pairs):
+            odds[k1], odds[k2] = o1[n], o2[n]
+        return odds
+
+    def _calculate_1x2(self, probs):
+        p_home = float(probs["P1"])
+        p_draw = float(probs["X"])
+        p_away = float(probs["P2"])
         o1, ox, o2 = normalize_odds_triplet(p_home, p_draw, p_away, self.margin)
         return {
             "P1": o1,
@@ -393,79 +1242,128 @@ class CornerOddsCalculator:
     # ==================================================
     # HANDICAPS (фиксированные стороны: HomeTeam / AwayTeam)
     # ==================================================
-    def _calculate_handicaps_fixed_sides(self, diff):
-        n = len(diff)
-        handicaps = {}
-
-        def _ah0_effective_probs(diff_arr):
-            # AH(0): ничья = возврат -> считаем "эффективные" вероятности без push
-            p_win = np.sum(diff_arr > 0) / n
-            p_lose = np.sum(diff_arr < 0) / n
-            p_push = 1.0 - (p_win + p_lose)
-
-            denom = max(1e-12, 1.0 - p_push)
-            return (p_win / denom), (p_lose / denom)
-
-        # AH(0)
-        p_home0, p_away0 = _ah0_effective_probs(diff)
-        odd_home0, odd_away0 = normalize_odds_pair(p_home0, p_away0, self.margin)
-
-        # Home -1.5 vs Away +1.5
-        p_home_m15 = np.sum(diff >= 2) / n
-        p_away_p15 = np.sum(diff >= -1) / n
-        odd_home_m15, odd_away_p15 = normalize_odds_pair(p_home_m15, p_away_p15, self.margin)
-
-        # Home -2.5 vs Away +2.5
-        p_home_m25 = np.sum(diff >= 3) / n
-        p_away_p25 = np.sum(diff >= -2) / n
-        odd_home_m25, odd_away_p25 = normalize_odds_pair(p_home_m25, p_away_p25, self.margin)
-
-        # Away -1.5 vs Home +1.5
-        p_away_m15 = np.sum(diff <= -2) / n
-        p_home_p15 = np.sum(diff <= 1) / n
-        odd_away_m15, odd_home_p15 = normalize_odds_pair(p_away_m15, p_home_p15, self.margin)
-
-        # Away -2.5 vs Home +2.5
-        p_away_m25 = np.sum(diff <= -3) / n
-        p_home_p25 = np.sum(diff <= 2) / n
-        odd_away_m25, odd_home_p25 = normalize_odds_pair(p_away_m25, p_home_p25, self.margin)
-
-        handicaps["HomeTeam"] = {
-            "name": "1-я команда (Дома)",
-            "F(0)": odd_home0,
-            "F(-1.5)": odd_home_m15,
-            "F(-2.5)": odd_home_m25,
-            "F(+1.5)": odd_home_p15,
-            "F(+2.5)": odd_home_p25,
-        }
-        handicaps["AwayTeam"] = {
-            "name": "2-я команда (Гости)",
-            "F(0)": odd_away0,
-            "F(-1.5)": odd_away_m15,
-            "F(-2.5)": odd_away_m25,
-            "F(+1.5)": odd_away_p15,
-            "F(+2.5)": odd_away_p25,
-        }
+    def _calculate_handicaps_fixed_sides(self, probs, config=None):
+        """
+        Пары — взаимоисключающие исходы:
+          AH(0):        Home F(0)  vs Away F(0)   (ничья = возврат, нормализация пары его убирает)
+          Home -h / Away +h,  Away -h / Home +h
+        """
+        config = self.config if config is None else config
+        home = {"name": HANDICAP_NAMES["HomeTeam"]}
+        away = {"name": HANDICAP_NAMES["AwayTeam"]}
+
+        for key in handicap_keys(config["HANDICAP_LINES"]):
+            if key == "F(0)":
+                home[key], away[key] = normalize_odds_pair(
+                    probs["HomeTeam_F(0)"], probs["AwayTeam_F(0)"], self.margin
+                )
+            elif key.startswith("F(-"):
+                plus = "F(+" + key[3:]
+                home[key], away[plus] = normalize_odds_pair(
+                    probs[f"HomeTeam_{key}"], probs[f"AwayTeam_{plus}"], self.margin
+                )
+                away[key], home[plus] = normalize_odds_pair(
+                    probs[f"AwayTeam_{key}"], probs[f"HomeTeam_{plus}"], self.margin
+                )
 
-        return handicaps
+        # порядок ключей как в handicap_keys (F(0), F(-h)..., F(+h)...)
+        order = ["name"] + handicap_keys(config["HANDICAP_LINES"])
+        return {
+            "HomeTeam": {k: home[k] for k in order},
+            "AwayTeam": {k: away[k] for k in order},
+        }
 
     # ==================================================
     # TOTALS + IT
     # ==================================================
-    def _calculate_totals(self, total):
-        n = len(total)
+    def _calculate_totals(self, probs, config=None):
+        config = self.config if config is None else config
         out = {}
-        for line in CONFIG["TOTAL_LINES"]:
-            p_over = np.sum(total > line) / n
-            p_under = np.sum(total < line) / n
-            out[f"Over_{line}"], out[f"Under_{line}"] = normalize_odds_pair(p_over, p_under, self.margin)
+        for line in config["TOTAL_LINES"]:
+            out[f"Over_{line}"], out[f"Under_{line}"] = normalize_odds_pair(
+                probs[f"Over_{line}"], probs[f"Under_{line}"], self.margin
+            )
         return out
 
-    def _calculate_individual_totals(self, corners):
-        n = len(corners)
+    def _calculate_individual_totals(self, probs, prefix, config=None):
+        config = self.config if config is None else config
         out = {}
-        for line in CONFIG["IT_LINES"]:
-            p_over = np.sum(corners > line) / n
-            p_under = np.sum(corners < line) / n
-            out[f"IT_{line}_over"], out[f"IT_{line}_under"] = normalize_odds_pair(p_over, p_under, self.margin)
+        for line in config["IT_LINES"]:
+            out[f"IT_{line}_over"], out[f"IT_{line}_under"] = normalize_odds_pair(
+                probs[f"{prefix}_IT_{line}_over"], probs[f"{prefix}_IT_{line}_under"], self.margin
+            )
         return out
+
+
+def _float_column(df, col):
+    """
+    Колонка -> float массив (DataFrame или ArrayFrame из src/fast_loader.py);
+    нечисловые значения -> NaN (как pd.to_numeric(errors="coerce")).
+    """
+    values = np.asarray(df[col])
+    if values.dtype.kind in "biuf":
+        return values.astype(float)
+
+    import pandas as pd
+
+    return pd.to_numeric(pd.Series(values), errors="coerce").to_numpy(dtype=float)
+
+
+_MARKET_KEY_RE = re.compile(
+    r"^(?:(?P<result>P1|X|P2)"
+    r"|(?P<team>HomeTeam|AwayTeam)_F\((?P<handicap>[+-]?[\d.]+)\)"
+    r"|(?P<total>Over|Under)_(?P<total_line>[\d.]+)"
+    r"|(?P<side>Home|Away)_IT_(?P<it_line>[\d.]+)_(?P<it_dir>over|under))$"
+)
+
+
+def market_mask(key, n_home, n_away):
+    """
+    Ключ рынка (как в _market_probabilities) -> bool-матрица [n_home, n_away]:
+    выигрывает ли ставка при счёте угловых (home=i, away=j).
+    Целые линии — как в расчёте рынков (без возврата: F(-1) = разница > 1).
+    """
+    m = _MARKET_KEY_RE.match(str(key))
+    if m is None:
+        raise ValueError(f"Неизвестный рынок: {key!r}")
+
+    i = np.arange(n_home)[:, None]
+    j = np.arange(n_away)[None, :]
+    diff = i - j
+
+    if m["result"]:
+        return {"P1": diff > 0, "X": diff == 0, "P2": diff < 0}[m["result"]]
+    if m["team"]:
+        # фора x: хозяева проходят при diff + x > 0, гости — при x - diff > 0
+        x = float(m["handicap"])
+        return diff > -x if m["team"] == "HomeTeam" else diff < x
+    if m["total"]:
+        line = float(m["total_line"])
+        total = i + j
+        return total > line if m["total"] == "Over" else total < line
+
+    line = float(m["it_line"])
+    goals = np.broadcast_to(i if m["side"] == "Home" else j, diff.shape)
+    return goals > line if m["it_dir"] == "over" else goals < line
+
+
+def market_pairs(config=None):
+    """
+    Пары взаимоисключающих исходов (ключи _market_probabilities), которые
+    нормализуются вместе: форы, тоталы, ИТ. 1X2 — отдельно (тройка).
+    """
+    config = CONFIG if config is None else config
+    pairs = []
+    for key in handicap_keys(config["HANDICAP_LINES"]):
+        if key == "F(0)":
+            pairs.append(("HomeTeam_F(0)", "AwayTeam_F(0)"))
+        elif key.startswith("F(-"):
+            plus = "F(+" + key[3:]
+            pairs.append((f"HomeTeam_{key}", f"AwayTeam_{plus}"))
+            pairs.append((f"AwayTeam_{key}", f"HomeTeam_{plus}"))
+    for line in config["TOTAL_LINES"]:
+        pairs.append((f"Over_{line}", f"Under_{line}"))
+    for prefix in ("Home", "Away"):
+        for line in config["IT_LINES"]:
+            pairs.append((f"{prefix}_IT_{line}_over", f"{prefix}_IT_{line}_under"))
+    return pairs
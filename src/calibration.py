@@ -0,0 +1,140 @@
+# src/calibration.py
+"""
+Подбор STRENGTH_POWER / FORM_BETA / FORM_CLIP_* / ANCHOR_WEIGHT по backtest log-loss.
+
+Всё, что не зависит от параметров (base λ, form_score, strength), считается один раз
+через walk_forward_features. Дальше наборы параметров оцениваются пачками:
+внутри пачки — векторно по оси параметров (массивы [n_params, n_matches]),
+пачки — параллельно в ProcessPoolExecutor.
+"""
+
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from src.backtest import _poisson_log_pmf, walk_forward_features
+from src.calculator import CornerOddsCalculator
+from src.config import CONFIG
+
+PARAM_NAMES = ("STRENGTH_POWER", "FORM_BETA", "FORM_CLIP_LOW", "FORM_CLIP_HIGH", "ANCHOR_WEIGHT")
+
+
+def parameter_sets(grid=None, search="grid", n_random=200, seed=0):
+    """
+    Наборы параметров: DataFrame, одна строка = один набор (колонки PARAM_NAMES).
+
+    search:
+      grid   — полный перебор значений grid
+      random — n_random равномерных точек в [min, max] каждого списка grid
+    Наборы с FORM_CLIP_LOW > FORM_CLIP_HIGH отбрасываются.
+    """
+    grid = CONFIG["CALIBRATION_GRID"] if grid is None else grid
+    missing = [k for k in PARAM_NAMES if k not in grid]
+    if missing:
+        raise ValueError(f"В сетке калибровки нет параметров: {missing}")
+
+    if search == "grid":
+        rows = list(itertools.product(*(grid[k] for k in PARAM_NAMES)))
+        sets = pd.DataFrame(rows, columns=list(PARAM_NAMES), dtype=float)
+    elif search == "random":
+        rng = np.random.default_rng(seed)
+        sets = pd.DataFrame({
+            k: rng.uniform(min(grid[k]), max(grid[k]), size=int(n_random))
+            for k in PARAM_NAMES
+        })
+    else:
+        raise ValueError(f"search: grid/random, а не {search!r}")
+
+    sets = sets[sets["FORM_CLIP_LOW"] <= sets["FORM_CLIP_HIGH"]]
+    return sets.reset_index(drop=True)
+
+
+def calibration_inputs(historical_df, team_strength=None, min_history=20):
+    """
+    Кэш, не зависящий от параметров: плоские массивы по матчам (пиклится в воркеры).
+    """
+    team_strength = {} if team_strength is None else team_strength
+    features = walk_forward_features(historical_df, n_games=CONFIG["FORM_N_GAMES"], min_history=min_history)
+
+    def strength(col):
+        return features[col].map(lambda t: float(team_strength.get(t, 1.0))).to_numpy(dtype=float)
+
+    return {
+        "base_lambda_home": features["base_lambda_home"].to_numpy(dtype=float),
+        "base_lambda_away": features["base_lambda_away"].to_numpy(dtype=float),
+        "form_score_home": features["form_score_home"].to_numpy(dtype=float),
+        "form_score_away": features["form_score_away"].to_numpy(dtype=float),
+        "strength_home": strength("HomeTeam"),
+        "strength_away": strength("AwayTeam"),
+        "HC": features["HC"].to_numpy(dtype=float),
+        "AC": features["AC"].to_numpy(dtype=float),
+    }
+
+
+def _score_chunk(inputs, chunk):
+    """
+    log-loss (-log P(HC, AC), среднее по матчам) для пачки наборов.
+    chunk — dict: параметр -> массив [n_params]. Возвращает массив [n_params].
+    """
+    calculator = CornerOddsCalculator(engine="exact")
+
+    # ось параметров -> [n_params, 1], ось матчей -> [n_matches]
+    params = dict(CONFIG)
+    params.update({k: np.asarray(v, dtype=float)[:, None] for k, v in chunk.items()})
+
+    form = {}
+    for side in ("home", "away"):
+        form[side] = calculator._form_factor_from_score(
+            inputs[f"form_score_{side}"],
+            params["FORM_BETA"], params["FORM_CLIP_LOW"], params["FORM_CLIP_HIGH"],
+        )
+
+    lambda_home, lambda_away, _, _ = calculator._combine_lambdas(
+        inputs["base_lambda_home"], inputs["base_lambda_away"],
+        inputs["strength_home"], inputs["strength_away"],
+        form["home"], form["away"], params,
+    )
+
+    nll = -(_poisson_log_pmf(inputs["HC"], lambda_home) + _poisson_log_pmf(inputs["AC"], lambda_away))
+    return nll.mean(axis=1)
+
+
+def run_calibration(inputs, sets, workers=None, chunk_size=64):
+    """
+    Оценивает все наборы sets (DataFrame из parameter_sets).
+    workers=1 — в текущем процессе, иначе ProcessPoolExecutor (None = число ядер).
+
+    Возвращает sets + колонка logloss, отсортированный по возрастанию (rank с 1).
+    """
+    if len(inputs["HC"]) == 0:
+        raise ValueError("Нет матчей для калибровки (мало истории?)")
+
+    chunk_size = max(1, int(chunk_size))
+    chunks = [
+        {k: sets[k].to_numpy()[i:i + chunk_size] for k in PARAM_NAMES}
+        for i in range(0, len(sets), chunk_size)
+    ]
+
+    workers = (os.cpu_count() or 1) if workers is None else int(workers)
+    if workers <= 1 or len(chunks) <= 1:
+        scores = [_score_chunk(inputs, c) for c in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+            scores = list(pool.map(_score_chunk, itertools.repeat(inputs), chunks))
+
+    ranked = sets.copy()
+    ranked["logloss"] = np.concatenate(scores) if scores else np.array([])
+    ranked = ranked.sort_values("logloss", kind="stable").reset_index(drop=True)
+    ranked.insert(0, "rank", np.arange(1, len(ranked) + 1))
+    return ranked
+
+
+def best_config(ranked):
+    """
+    Лучший набор -> dict с ключами CONFIG (можно подставить в config.py).
+    """
+    best = ranked.iloc[0]
+    return {k: round(float(best[k]), 4) for k in PARAM_NAMES}
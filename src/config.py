@@ -1,19 +1,34 @@
 # src/config.py
 
+import hashlib
+from collections.abc import Mapping
+
 CONFIG = {
     # общие
     "MARGIN": 0.085,
     "N_SIMULATIONS": 10000000,
+    "PRICING_ENGINE": "mc",   # mc | exact | table
+
+    # распределение угловых для рынков (src/distributions.py): poisson | negbin | bivariate
+    # negbin/bivariate считаются точными pmf при любом движке (движок — только для poisson)
+    "COUNT_DISTRIBUTION": "poisson",
+    "NEGBIN_DISPERSION": None,      # α: Var = λ + α λ²; None — подобрать по истории
+    "BIVARIATE_CORRELATION": None,  # ρ >= 0 между угловыми хозяев и гостей; None — по истории
 
     # strength
     "STRENGTH_POWER": 0.55,   # меньше = слабее влияние фаворита
 
+    # профили команд: EWMA с полупериодом в играх команды (src/profiles.py);
+    # None — плоские средние по всей истории
+    "PROFILE_HALF_LIFE": None,
+
     # form (последние N игр)
     "FORM_N_GAMES": 7,
     "FORM_BETA": 0.10,        # чувствительность формы
     "FORM_CLIP_LOW": 0.92,    # минимум фактора формы
     "FORM_CLIP_HIGH": 1.12,   # максимум фактора формы
     "FORM_DEBUG": False,
+    "FORM_DATE_FORMAT": "%d/%m/%Y",  # формат дат файла формы (остальное — dayfirst)
 
     # привязка к тоталу (мягкая)
     # если включишь ANCHOR_TOTAL_LINE, то модель слегка "подтягивает" общий λ к линии
@@ -29,4 +44,155 @@ CONFIG = {
     # защита λ
     "MIN_LAMBDA": 0.5,
     "MAX_LAMBDA": 20.0,
+
+    # таблицы Poisson/Skellam CDF для движка "table" (src/pmf_tables.py)
+    "PMF_TABLE_STEP": 0.01,        # шаг сетки λ для Poisson CDF
+    "SKELLAM_TABLE_STEP": 0.05,    # шаг 2D-сетки (λ_home, λ_away) для Skellam CDF
+    "SKELLAM_TABLE_MAX_DIFF": 10,  # разница home-away в таблице: ±N
+    "PMF_TABLE_DIR": "data/cache",
+
+    # быстрый старт (src/fast_loader.py): бинарный кэш истории (.npz)
+    "DATA_CACHE_DIR": "data/cache",
+
+    # predict.py --stream: строк фикстур в одном куске (чтение -> пакетный расчёт -> запись)
+    "STREAM_CHUNK_SIZE": 50_000,
+
+    # watch.py --ewma-state: сохранённое EWMA-состояние профилей (src/profiles.py)
+    "PROFILE_STATE_PATH": "data/cache/profiles_ewma.json",
+
+    # локальное SQLite-хранилище истории и формы (data_loader.HistoryStore, predict.py --store)
+    "HISTORY_STORE_PATH": "data/cache/history.sqlite",
+
+    # шарды истории по Div (src/leagues.py): код лиги в future_matches.csv -> Div,
+    # например {"epl": "E0"}; коды, совпадающие с Div, работают без записи
+    "LEAGUE_ALIASES": {},
+
+    # рейтинги команд (src/ratings.py): псевдо-матчи с рейтингом 1.0 на команду
+    "RATING_PRIOR_GAMES": 3.0,
+
+    # сезонная симуляция (src/season.py): число сезонов и выборок в одном куске
+    # (кусок = симуляции x матчи x 2, ограничивает память)
+    "SEASON_SIMULATIONS": 100000,
+    "SEASON_CHUNK_DRAWS": 5_000_000,
+
+    # профилирование (src/profiling.py): период семплов (сек) и число строк топа
+    "PROFILE_INTERVAL": 0.001,
+    "PROFILE_TOP": 25,
+
+    # src/watcher.py: период опроса файлов (сек) для дописанных строк
+    "WATCH_INTERVAL": 5.0,
+
+    # in-play: длительность матча (минуты) для масштабирования оставшегося λ
+    "MATCH_MINUTES": 90,
+
+    # reprice_delta: максимальный сдвиг λ для переоценки по производным
+    "REPRICE_TOLERANCE": 0.25,
+
+    # валидатор: допустимая сумма обратных коэффициентов (1 + маржа)
+    "OVERROUND_MIN": 1.05,
+    "OVERROUND_MAX": 1.15,
+
+    # калибровка (calibrate.py): сетка значений; random-поиск берёт [min, max] каждого списка
+    "CALIBRATION_GRID": {
+        "STRENGTH_POWER": [0.35, 0.45, 0.55, 0.65, 0.75],
+        "FORM_BETA": [0.0, 0.05, 0.10, 0.15, 0.20],
+        "FORM_CLIP_LOW": [0.85, 0.92, 0.97],
+        "FORM_CLIP_HIGH": [1.05, 1.12, 1.20],
+        "ANCHOR_WEIGHT": [0.0, 0.2, 0.35, 0.5],
+    },
 }
+
+
+def _freeze(value):
+    """
+    list -> tuple, dict -> PricingConfig (рекурсивно), чтобы снимок был хэшируемым.
+    """
+    if isinstance(value, PricingConfig):
+        return value
+    if isinstance(value, Mapping):
+        return PricingConfig(value)
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+class PricingConfig(Mapping):
+    """
+    Неизменяемый (frozen) и хэшируемый снимок настроек расчёта.
+
+    Читается как dict (config["MARGIN"], config.get(...)), поэтому подходит
+    везде, где раньше читался CONFIG. Калькулятор/валидатор/форматтер получают
+    его явно — глобальный CONFIG только значения по умолчанию, и расчёты
+    с разными настройками можно вести параллельно (потоки, сессии Streamlit).
+
+      PricingConfig()                      — снимок CONFIG
+      PricingConfig(values, MARGIN=0.07)   — из dict + переопределения
+      config.replace(FORM_BETA=0.2)        — новая копия с изменениями
+      hash(config) / config.digest()       — ключ для кэшей
+    """
+
+    __slots__ = ("_values", "_hash")
+
+    def __init__(self, values=None, **overrides):
+        data = dict(CONFIG if values is None else values)
+        data.update(overrides)
+        object.__setattr__(self, "_values", {k: _freeze(v) for k, v in data.items()})
+        object.__setattr__(self, "_hash", None)
+
+    @classmethod
+    def coerce(cls, config=None):
+        """
+        None -> снимок CONFIG, PricingConfig -> как есть, dict -> PricingConfig.
+        """
+        if isinstance(config, cls):
+            return config
+        return cls(config)
+
+    def replace(self, **overrides):
+        return PricingConfig(self._values, **overrides)
+
+    def to_dict(self):
+        """
+        Обычный изменяемый dict (tuple -> list), например для json.
+        """
+        def thaw(v):
+            if isinstance(v, PricingConfig):
+                return v.to_dict()
+            if isinstance(v, tuple):
+                return [thaw(x) for x in v]
+            return v
+
+        return {k: thaw(v) for k, v in self._values.items()}
+
+    def digest(self):
+        """
+        Стабильный между процессами хэш (hash() строк в Python рандомизирован).
+        """
+        return hashlib.sha1(repr(sorted(self._values.items())).encode("utf-8")).hexdigest()
+
+    # --------------------------------------------------
+    def __getitem__(self, key):
+        return self._values[key]
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __hash__(self):
+        if self._hash is None:
+            object.__setattr__(self, "_hash", hash(tuple(sorted(self._values.items()))))
+        return self._hash
+
+    def __setattr__(self, name, value):
+        raise AttributeError("PricingConfig неизменяем, используйте replace(...)")
+
+    def __delattr__(self, name):
+        raise AttributeError("PricingConfig неизменяем, используйте replace(...)")
+
+    def __repr__(self):
+        return f"PricingConfig({self._values!r})"
+
+    def __reduce__(self):
+        return (PricingConfig, (self.to_dict(),))
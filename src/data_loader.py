@@ -1,47 +1,291 @@
-import pandas as pd
+import csv
+import os
+import re
+import sqlite3
+import threading
+
+import numpy as np
+
+# pandas импортируется внутри загрузчиков: реестр команд и быстрый путь
+# (src/fast_loader.py) работают без него
+
+_SPACES_RE = re.compile(r"\s+")
+
+
+def _clean_name(name):
+    """
+    strip + схлопнутые пробелы; None/NaN/'nan' -> "".
+    """
+    if name is None or (isinstance(name, float) and np.isnan(name)):
+        return ""
+    s = _SPACES_RE.sub(" ", str(name).strip())
+    return "" if s.lower() == "nan" else s
+
+
+class TeamRegistry:
+    """
+    Реестр команд: название/алиас -> плотный int id (0..n-1).
+
+    Имена сравниваются после нормализации (strip, схлопнутые пробелы, без регистра),
+    алиасы (data/team_aliases.csv: alias,team) сводят разные написания к одной команде.
+    Команды заводит historical (intern), остальные источники только ищут (lookup) —
+    не найденные имена копятся в unmatched[source] вместо тихого fallback.
+    """
+
+    def __init__(self, aliases=None):
+        self.names = []      # id -> каноническое имя
+        self._ids = {}       # нормализованный ключ -> id
+        self._aliases = {}   # нормализованный алиас -> нормализованный ключ команды
+        self._display = {}   # нормализованный ключ -> имя из файла алиасов
+        self.unmatched = {}  # source -> set(имён)
+
+        for alias, team in (aliases or {}).items():
+            self.add_alias(alias, team)
+
+    @staticmethod
+    def normalize(name):
+        return _clean_name(name).casefold()
+
+    def add_alias(self, alias, team):
+        key = self.normalize(team)
+        if not key:
+            return
+        self._aliases[self.normalize(alias)] = key
+        self._display.setdefault(key, _clean_name(team))
+
+    def key(self, name):
+        """
+        Нормализованный ключ команды (с учётом алиасов).
+        """
+        key = self.normalize(name)
+        return self._aliases.get(key, key)
+
+    # --------------------------------------------------
+    def intern(self, name):
+        """
+        id команды (новая команда получает следующий id). Пустое имя -> -1.
+        """
+        key = self.key(name)
+        if not key:
+            return -1
+        team_id = self._ids.get(key)
+        if team_id is None:
+            team_id = len(self.names)
+            self._ids[key] = team_id
+            self.names.append(self._display.get(key, _clean_name(name)))
+        return team_id
+
+    def lookup(self, name, source=None):
+        """
+        id команды или -1 (не найдена -> запоминаем в unmatched[source]).
+        """
+        key = self.key(name)
+        team_id = self._ids.get(key, -1) if key else -1
+        if team_id < 0 and key and source is not None:
+            self.unmatched.setdefault(source, set()).add(_clean_name(name))
+        return team_id
+
+    def intern_many(self, names):
+        return self._resolve_many(names, self.intern)
+
+    def lookup_many(self, names, source=None):
+        return self._resolve_many(names, lambda n: self.lookup(n, source))
+
+    @staticmethod
+    def _resolve_many(names, resolve):
+        # каждое уникальное имя разрешаем один раз
+        seen = {}
+        ids = np.empty(len(names), dtype=np.int64)
+        for i, name in enumerate(names):
+            team_id = seen.get(name)
+            if team_id is None:
+                team_id = seen[name] = resolve(name)
+            ids[i] = team_id
+        return ids
+
+    def name(self, team_id):
+        return self.names[team_id] if team_id >= 0 else ""
+
+    def canonical_names(self, ids, original):
+        """
+        Канонические имена по id; для -1 — исходное (очищенное) имя.
+        """
+        original = [_clean_name(n) for n in original]
+        return [self.names[i] if i >= 0 else o for i, o in zip(ids, original)]
+
+    def to_array(self, values, default=np.nan):
+        """
+        dict {имя: значение} -> массив по id (len = число команд).
+        """
+        out = np.full(len(self.names), default, dtype=float)
+        for team, value in values.items():
+            team_id = self.lookup(team)
+            if team_id >= 0:
+                out[team_id] = float(value)
+        return out
+
+    def unmatched_report(self):
+        """
+        Не найденные имена: DataFrame(source, team).
+        """
+        import pandas as pd
+
+        rows = [(source, team) for source, teams in self.unmatched.items() for team in sorted(teams)]
+        return pd.DataFrame(rows, columns=["source", "team"])
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return self.key(name) in self._ids
+
+
+def attach_team_ids(df, registry, columns, source=None):
+    """
+    Колонки команд -> канонические имена + <col>_id (int, -1 = не найдена).
+    source=None — новые команды заводятся (intern), иначе только поиск (lookup).
+    """
+    for col, id_col in columns:
+        if source is None:
+            ids = registry.intern_many(df[col])
+        else:
+            ids = registry.lookup_many(df[col], source)
+        df[col] = registry.canonical_names(ids, df[col])
+        df[id_col] = ids
+    return df
+
+
+def load_team_aliases(path="data/team_aliases.csv"):
+    """
+    alias,team -> dict. Нет файла — пустой dict.
+    """
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        return {row["alias"]: row["team"] for row in csv.DictReader(f)}
+
+
+def load_team_strength(path="data/team_strength.csv", registry=None):
+    import pandas as pd
 
-def load_team_strength(path="data/team_strength.csv"):
     df = pd.read_csv(path)
+    if registry is not None:
+        ids = registry.lookup_many(df["Team"], "team_strength")
+        df["Team"] = registry.canonical_names(ids, df["Team"])
     return dict(zip(df["Team"], df["Strength"]))
 
-def load_form_history(path="data/history_5matches.csv"):
+# нормализованная форма по сигнатуре файла (путь, mtime, размер)
+_FORM_CACHE = {}
+# форма с p1_id/p2_id: сигнатура -> (registry, состояние реестра, DataFrame)
+_FORM_IDS_CACHE = {}
+_FORM_CACHE_LOCK = threading.Lock()
+
+# схемы файла формы -> колонки Date,p1,p2,score_p1,score_p2
+_FORM_SCHEMAS = (
+    {"p1": "p1", "p2": "p2", "score_p1": "score_p1", "score_p2": "score_p2"},
+    {"p1": "HomeTeam", "p2": "AwayTeam", "score_p1": "HC", "score_p2": "AC"},
+)
+
+
+def form_schema(columns):
+    """
+    Колонки файла формы -> {колонка формы: колонка файла} или None.
+      Date,HomeTeam,AwayTeam,...,HC,AC   (угловые HC/AC)
+      Date,p1,p2,score_p1,score_p2
     """
-    Поддерживаем формат:
-    Date,HomeTeam,AwayTeam,FTHG,FTAG,HC,AC
-    и приводим к:
-    Date,p1,p2,score_p1,score_p2
+    columns = set(columns)
+    if "Date" not in columns:
+        return None
+    for schema in _FORM_SCHEMAS:
+        if set(schema.values()).issubset(columns):
+            return schema
+    return None
+
+
+def _parse_form_dates(values, date_format):
+    """
+    Даты формата date_format (быстрый разбор); не подошедшие -> dayfirst, как раньше.
     """
     import pandas as pd
 
-    df = pd.read_csv(path)
-    df.columns = [c.strip() for c in df.columns]
-
-    required = {"Date", "HomeTeam", "AwayTeam", "HC", "AC"}
-    if not required.issubset(set(df.columns)):
-        raise KeyError(f"Нет нужных колонок. Есть: {list(df.columns)}")
-
-    # приводим к единому виду
-    df = df.rename(columns={
-        "HomeTeam": "p1",
-        "AwayTeam": "p2",
-        "HC": "score_p1",
-        "AC": "score_p2"
-    })
-
-    df["Date"] = pd.to_datetime(df["Date"], dayfirst=True, errors="coerce")
-    df["p1"] = df["p1"].astype(str).str.strip()
-    df["p2"] = df["p2"].astype(str).str.strip()
-    df["score_p1"] = pd.to_numeric(df["score_p1"], errors="coerce")
-    df["score_p2"] = pd.to_numeric(df["score_p2"], errors="coerce")
-
-    df = df.dropna(subset=["Date", "p1", "p2", "score_p1", "score_p2"])
+    dates = pd.to_datetime(values, format=date_format, errors="coerce")
+    bad = dates.isna() & values.notna()
+    if bad.any():
+        dates[bad] = pd.to_datetime(values[bad], dayfirst=True, errors="coerce")
+    return dates
+
+
+def load_form_history(path="data/history_5matches.csv", registry=None, date_format=None):
+    """
+    Файл формы любой из схем (form_schema) -> Date,p1,p2,score_p1,score_p2,
+    строки отсортированы по дате (внутри дня — порядок файла).
+    Строки без даты/команд/угловых отбрасываются.
+
+    Разобранный результат кэшируется по (путь, mtime, размер): повторный вызов
+    на неизменённом файле файл не перечитывает.
+    registry — TeamRegistry: канонические имена + p1_id/p2_id (копия кэша).
+    Тот же DataFrame (и с ним кэш индекса формы в калькуляторе, по объекту)
+    возвращается только для того же объекта реестра без новых команд/алиасов;
+    новый реестр (predict.py, каждый перезапуск app.py) — новая копия.
+    """
+    import pandas as pd
+
+    from src.config import CONFIG
+
+    date_format = CONFIG["FORM_DATE_FORMAT"] if date_format is None else date_format
+    st = os.stat(path)
+    signature = (os.path.abspath(path), st.st_mtime_ns, st.st_size, date_format)
+
+    with _FORM_CACHE_LOCK:
+        df = _FORM_CACHE.get(signature)
+    if df is None:
+        raw = pd.read_csv(path)
+        raw.columns = [str(c).strip() for c in raw.columns]
+        schema = form_schema(raw.columns)
+        if schema is None:
+            raise KeyError(f"Нет нужных колонок. Есть: {list(raw.columns)}")
+
+        df = pd.DataFrame({
+            "Date": _parse_form_dates(raw["Date"], date_format),
+            "p1": raw[schema["p1"]].astype(str).str.strip(),
+            "p2": raw[schema["p2"]].astype(str).str.strip(),
+            "score_p1": pd.to_numeric(raw[schema["score_p1"]], errors="coerce"),
+            "score_p2": pd.to_numeric(raw[schema["score_p2"]], errors="coerce"),
+        })
+        df = df[raw[schema["p1"]].notna() & raw[schema["p2"]].notna()]
+        df = df.dropna(subset=["Date", "score_p1", "score_p2"])
+        df = df.sort_values("Date", kind="stable").reset_index(drop=True)
+        with _FORM_CACHE_LOCK:
+            # старые версии этого файла больше не нужны
+            for key in [k for k in _FORM_CACHE if k[0] == signature[0]]:
+                del _FORM_CACHE[key]
+            _FORM_CACHE[signature] = df
+
+    if registry is None:
+        return df
+
+    # id зависят от реестра: новая команда/алиас могли сопоставить ранее ненайденные имена
+    state = (len(registry._ids), len(registry._aliases))
+    with _FORM_CACHE_LOCK:
+        cached = _FORM_IDS_CACHE.get(signature)
+    if cached is not None and cached[0] is registry and cached[1] == state:
+        return cached[2]
+
+    df = attach_team_ids(df.copy(), registry, [("p1", "p1_id"), ("p2", "p2_id")], "history_5matches")
+    with _FORM_CACHE_LOCK:
+        for key in [k for k in _FORM_IDS_CACHE if k[0] == signature[0]]:
+            del _FORM_IDS_CACHE[key]
+        _FORM_IDS_CACHE[signature] = (registry, state, df)
     return df
 
 
-def load_historical_data(filepath):
+def load_historical_data(filepath, registry=None):
     """
-    Загрузка исторических данных
+    Загрузка исторических данных.
+    registry — TeamRegistry: команды заводятся здесь, добавляются HomeTeam_id/AwayTeam_id.
     """
+    import pandas as pd
+
     df = pd.read_csv(filepath)
 
     # Проверка обязательных колонок
@@ -51,18 +295,339 @@ def load_historical_data(filepath):
     if missing:
         raise ValueError(f"Отсутствуют колонки: {missing}")
 
+    if registry is not None:
+        attach_team_ids(df, registry, [("HomeTeam", "HomeTeam_id"), ("AwayTeam", "AwayTeam_id")])
+
     return df
 
 
-def load_future_matches(filepath):
+def load_future_matches(filepath, registry=None):
     """
-    Загрузка будущих матчей
+    Загрузка будущих матчей.
+    registry — TeamRegistry: имена сводятся к каноническим, добавляются HomeTeam_id/AwayTeam_id
+    (-1 + запись в registry.unmatched["future_matches"], если команды нет в истории).
     """
-    df = pd.read_csv(filepath)
+    import pandas as pd
+
+    return _prepare_future(pd.read_csv(filepath), registry)
+
+
+def iter_future_matches(filepath, chunksize=None, registry=None):
+    """
+    Будущие матчи кусками по chunksize строк (по умолчанию CONFIG["STREAM_CHUNK_SIZE"]):
+    генератор DataFrame, каждый — как load_future_matches для своих строк
+    (индекс — номер строки в файле). Память не зависит от размера файла.
+    """
+    import pandas as pd
+
+    from src.config import CONFIG
 
+    chunksize = CONFIG["STREAM_CHUNK_SIZE"] if chunksize is None else int(chunksize)
+    with pd.read_csv(filepath, chunksize=max(1, chunksize)) as reader:
+        for chunk in reader:
+            yield _prepare_future(chunk, registry)
+
+
+def _prepare_future(df, registry):
     # Поддержка разных форматов колонок
     if 'home' in df.columns and 'away' in df.columns:
         df['HomeTeam'] = df['home']
         df['AwayTeam'] = df['away']
 
-    return df
\ No newline at end of file
+    if registry is not None:
+        for home_col, away_col in (("HomeTeam", "AwayTeam"), ("p1", "p2")):
+            if home_col in df.columns and away_col in df.columns and df[home_col].notna().any():
+                attach_team_ids(
+                    df, registry,
+                    [(home_col, f"{home_col}_id"), (away_col, f"{away_col}_id")],
+                    "future_matches",
+                )
+                break
+
+    return df
+
+
+# ==================================================
+# SQLite-хранилище истории и формы
+# ==================================================
+_STORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (source TEXT PRIMARY KEY, path TEXT, mtime_ns INTEGER, size INTEGER);
+CREATE TABLE IF NOT EXISTS matches (
+    row INTEGER PRIMARY KEY, div TEXT, date TEXT, date_raw TEXT,
+    home TEXT, away TEXT, hc REAL, ac REAL
+);
+CREATE TABLE IF NOT EXISTS form (
+    row INTEGER PRIMARY KEY, date TEXT, p1 TEXT, p2 TEXT, score_p1 REAL, score_p2 REAL
+);
+-- строка на команду в матче: запросы по команде — диапазон индекса (team, date)
+CREATE TABLE IF NOT EXISTS team_games (
+    source TEXT, team TEXT, date TEXT, row INTEGER, div TEXT, is_home INTEGER,
+    opponent TEXT, corners_for REAL, corners_against REAL
+);
+CREATE INDEX IF NOT EXISTS team_games_team_date ON team_games (source, team, date, row);
+CREATE INDEX IF NOT EXISTS matches_div ON matches (div);
+"""
+
+
+class HistoryStore:
+    """
+    Локальное SQLite-хранилище historical.csv и файла формы: один файл на диске
+    для CLI, app и сервисов вместо загрузки CSV целиком в каждом процессе.
+
+        store = HistoryStore("data/cache/history.sqlite")
+        store.sync_history("data/historical.csv")        # загрузка, если файл изменился
+        store.team_aggregates("Majd FC")                 # суммы/средние как в профилях калькулятора
+        store.last_games("Majd FC", 5)                   # последние N игр формы
+        store.history_frame(registry=registry)           # DataFrame как load_historical_data
+
+    Команды хранятся по нормализованному ключу (TeamRegistry.key: регистр,
+    пробелы, алиасы registry), поэтому запросы не зависят от написания.
+    """
+
+    def __init__(self, path=None, registry=None):
+        from src.config import CONFIG
+
+        self.path = CONFIG["HISTORY_STORE_PATH"] if path is None else path
+        self.registry = registry
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # одно соединение на хранилище; потоки (Streamlit) — под замком
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_STORE_SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def _key(self, name):
+        return self.registry.key(name) if self.registry is not None else TeamRegistry.normalize(name)
+
+    # ---------------- загрузка ----------------
+    def _signature(self, source, path):
+        st = os.stat(path)
+        return (source, os.path.abspath(path), st.st_mtime_ns, st.st_size)
+
+    def _is_fresh(self, signature):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT path, mtime_ns, size FROM meta WHERE source = ?", signature[:1]
+            ).fetchone()
+        return row is not None and tuple(row) == signature[1:]
+
+    def sync_history(self, path="data/historical.csv"):
+        """
+        Загружает historical.csv, если он изменился с прошлой загрузки. -> True, если загружен.
+        """
+        signature = self._signature("history", path)
+        if self._is_fresh(signature):
+            return False
+        self.ingest_history(load_historical_data(path), signature)
+        return True
+
+    def sync_form(self, path="data/history_5matches.csv"):
+        """
+        То же для файла формы (любая схема form_schema).
+        """
+        signature = self._signature("form", path)
+        if self._is_fresh(signature):
+            return False
+        self.ingest_form(load_form_history(path), signature)
+        return True
+
+    def ingest_history(self, df, signature=None):
+        """
+        DataFrame истории (HomeTeam, AwayTeam, HC, AC; Div/Date — если есть) -> таблицы
+        matches/team_games (прежнее содержимое заменяется).
+        """
+        import pandas as pd
+
+        from src.config import CONFIG
+
+        n = len(df)
+        divs = df["Div"].astype(str).str.strip().where(df["Div"].notna(), None) if "Div" in df.columns else [None] * n
+        if "Date" in df.columns:
+            dates_iso = _iso_dates(_parse_form_dates(df["Date"], CONFIG["FORM_DATE_FORMAT"]))
+            raw_dates = df["Date"].astype(str).where(df["Date"].notna(), None)
+        else:
+            dates_iso = raw_dates = [None] * n
+        hc = pd.to_numeric(df["HC"], errors="coerce")
+        ac = pd.to_numeric(df["AC"], errors="coerce")
+
+        rows = list(zip(
+            range(n), list(divs), list(dates_iso), list(raw_dates),
+            [_clean_name(t) or None for t in df["HomeTeam"]], [_clean_name(t) or None for t in df["AwayTeam"]],
+            _nullable(hc), _nullable(ac),
+        ))
+        self._replace("history", "matches", rows, signature)
+
+    def ingest_form(self, df, signature=None):
+        """
+        Форма в формате load_form_history (Date, p1, p2, score_p1, score_p2) -> form/team_games.
+        """
+        rows = list(zip(
+            range(len(df)), _iso_dates(df["Date"]),
+            [_clean_name(t) or None for t in df["p1"]], [_clean_name(t) or None for t in df["p2"]],
+            _nullable(df["score_p1"]), _nullable(df["score_p2"]),
+        ))
+        self._replace("form", "form", rows, signature)
+
+    def _replace(self, source, table, rows, signature):
+        if table == "matches":
+            # (row, div, date, date_raw, home, away, hc, ac)
+            games = [
+                (source, self._key(r[4]), r[2], r[0], r[1], 1, r[5], r[6], r[7]) for r in rows
+            ] + [
+                (source, self._key(r[5]), r[2], r[0], r[1], 0, r[4], r[7], r[6]) for r in rows
+            ]
+        else:
+            # (row, date, p1, p2, score_p1, score_p2)
+            games = [
+                (source, self._key(r[2]), r[1], r[0], None, 1, r[3], r[4], r[5]) for r in rows
+            ] + [
+                (source, self._key(r[3]), r[1], r[0], None, 0, r[2], r[5], r[4]) for r in rows
+            ]
+        games = [g for g in games if g[1]]
+
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM {table}")
+            self._conn.execute("DELETE FROM team_games WHERE source = ?", (source,))
+            if rows:
+                self._conn.executemany(f"INSERT INTO {table} VALUES ({', '.join('?' * len(rows[0]))})", rows)
+            self._conn.executemany("INSERT INTO team_games VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", games)
+            if signature is not None:
+                self._conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?, ?, ?)", signature)
+
+    # ---------------- запросы ----------------
+    def team_aggregates(self, team, div=None):
+        """
+        Суммы угловых команды по истории — те же величины, что профили калькулятора
+        (_accumulate_history): home_hc_sum/home_n, away_ac_sum/away_n,
+        home_ac_sum/home_ac_n, away_hc_sum/away_hc_n, for_avg, against_avg (NaN — нет профиля).
+        div — только матчи этой лиги.
+        """
+        sql = (
+            "SELECT is_home, TOTAL(corners_for), COUNT(corners_for), TOTAL(corners_against), COUNT(corners_against) "
+            "FROM team_games WHERE source = 'history' AND team = ?"
+        )
+        params = [self._key(team)]
+        if div is not None:
+            sql += " AND div = ?"
+            params.append(str(div).strip())
+        with self._lock:
+            rows = self._conn.execute(sql + " GROUP BY is_home", params).fetchall()
+
+        out = dict.fromkeys(("home_hc_sum", "away_ac_sum", "home_ac_sum", "away_hc_sum"), 0.0)
+        out.update(dict.fromkeys(("home_n", "away_n", "home_ac_n", "away_hc_n"), 0))
+        for is_home, for_sum, for_n, against_sum, against_n in rows:
+            if is_home:
+                out.update(home_hc_sum=for_sum, home_n=for_n, home_ac_sum=against_sum, home_ac_n=against_n)
+            else:
+                out.update(away_ac_sum=for_sum, away_n=for_n, away_hc_sum=against_sum, away_hc_n=against_n)
+
+        for_n = out["home_n"] + out["away_n"]
+        against_n = out["home_ac_n"] + out["away_hc_n"]
+        has_profile = for_n > 0 and against_n > 0
+        out["for_avg"] = (out["home_hc_sum"] + out["away_ac_sum"]) / for_n if has_profile else np.nan
+        out["against_avg"] = (out["home_ac_sum"] + out["away_hc_sum"]) / against_n if has_profile else np.nan
+        return out
+
+    def league_averages(self, div=None):
+        """
+        -> (средние HC, средние AC) по истории (или по лиге div); нет данных -> NaN.
+        """
+        sql = "SELECT TOTAL(hc), COUNT(hc), TOTAL(ac), COUNT(ac) FROM matches"
+        params = ()
+        if div is not None:
+            sql += " WHERE div = ?"
+            params = (str(div).strip(),)
+        with self._lock:
+            hc_sum, hc_n, ac_sum, ac_n = self._conn.execute(sql, params).fetchone()
+        return (hc_sum / hc_n if hc_n else np.nan, ac_sum / ac_n if ac_n else np.nan)
+
+    def last_games(self, team, n_games, source="form", before=None):
+        """
+        Последние n_games игр команды (source="form" — файл формы, "history" — история),
+        по возрастанию даты (внутри дня — порядок файла), как срез формы калькулятора.
+        before — только игры строго до даты (ISO "YYYY-MM-DD").
+
+        Возвращает список dict: date, opponent, is_home, corners_for, corners_against.
+        """
+        sql = (
+            "SELECT date, opponent, is_home, corners_for, corners_against FROM team_games "
+            "WHERE source = ? AND team = ?"
+        )
+        params = [source, self._key(team)]
+        if before is not None:
+            sql += " AND date < ?"
+            params.append(str(before))
+        sql += " ORDER BY date DESC, row DESC LIMIT ?"
+        params.append(int(n_games))
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+
+        keys = ("date", "opponent", "is_home", "corners_for", "corners_against")
+        games = [dict(zip(keys, r)) for r in reversed(rows)]
+        for g in games:
+            g["is_home"] = bool(g["is_home"])
+        return games
+
+    def history_frame(self, div=None, registry=None):
+        """
+        История из хранилища -> DataFrame (Div, Date, HomeTeam, AwayTeam, HC, AC)
+        в порядке исходного файла; registry — как в load_historical_data.
+        """
+        import pandas as pd
+
+        sql = "SELECT div, date_raw, home, away, hc, ac FROM matches"
+        params = ()
+        if div is not None:
+            sql += " WHERE div = ?"
+            params = (str(div).strip(),)
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY row", params).fetchall()
+
+        df = pd.DataFrame(rows, columns=["Div", "Date", "HomeTeam", "AwayTeam", "HC", "AC"])
+        df["HC"] = pd.to_numeric(df["HC"], errors="coerce").astype(float)
+        df["AC"] = pd.to_numeric(df["AC"], errors="coerce").astype(float)
+        if registry is not None:
+            attach_team_ids(df, registry, [("HomeTeam", "HomeTeam_id"), ("AwayTeam", "AwayTeam_id")])
+        return df
+
+    def form_frame(self, registry=None):
+        """
+        Форма из хранилища -> DataFrame как load_form_history (Date, p1, p2, score_p1, score_p2).
+        """
+        import pandas as pd
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT date, p1, p2, score_p1, score_p2 FROM form ORDER BY row"
+            ).fetchall()
+        df = pd.DataFrame(rows, columns=["Date", "p1", "p2", "score_p1", "score_p2"])
+        df["Date"] = pd.to_datetime(df["Date"], format="%Y-%m-%d")
+        for col in ("score_p1", "score_p2"):
+            df[col] = df[col].astype(float)
+        if registry is not None:
+            df = attach_team_ids(df, registry, [("p1", "p1_id"), ("p2", "p2_id")], "history_5matches")
+        return df
+
+
+def _iso_dates(dates):
+    """
+    datetime-серия -> "YYYY-MM-DD" (NaT -> None): строки сортируются как даты.
+    """
+    return [None if d is None or d != d else d.strftime("%Y-%m-%d") for d in dates]
+
+
+def _nullable(values):
+    """
+    Числа -> float/None (NaN -> NULL в SQLite).
+    """
+    return [None if v != v else float(v) for v in values]
@@ -0,0 +1,351 @@
+# src/distributions.py
+"""
+Распределения угловых для стадии рынков (COUNT_DISTRIBUTION в CONFIG).
+
+λ матча считаются как раньше (профили, strength, форма, anchor) и остаются
+средними; модель задаёт только форму совместного распределения (home, away):
+  poisson    — независимые Poisson (движки mc/exact/table, как раньше)
+  negbin     — независимые отрицательные биномиальные: Var = λ + α λ²
+               (α — дисперсия; угловые обычно overdispersed)
+  bivariate  — двумерный Poisson: home = X1 + X3, away = X2 + X3,
+               X3 ~ Poisson(λ3), λ3 = ρ sqrt(λ_home λ_away), corr(home, away) = ρ
+               (модель умеет только ρ >= 0)
+
+Параметр (α или ρ) задаётся в CONFIG или подбирается по истории методом моментов
+(fit): средние — профили команд калькулятора.
+
+Все модели считают точные усечённые pmf сразу по пакету матчей — маргиналы
+home/away, total и diff (свёртки через FFT по всем матчам) -> тот же оценщик
+f(var, k), что у poisson_cdf_sf_batch. Стоимость — как у движка exact, выборок нет.
+"""
+
+import math
+
+import numpy as np
+
+from src.pmf_tables import (
+    cdf_sf_from_pmfs,
+    poisson_cdf_sf_batch,
+    poisson_k_max,
+    poisson_pmf,
+    poisson_pmf_derivatives,
+    poisson_pmf_matrix,
+)
+
+# ρ выше не подбирается: при ρ -> 1 у X1/X2 почти не остаётся массы
+_MAX_CORRELATION = 0.95
+# относительный шаг численных производных по λ (reprice_delta)
+_DERIVATIVE_STEP = 1e-4
+
+
+def _convolve(a, b, size):
+    """
+    Построчная свёртка [матчи, k] через FFT, первые size колонок
+    (size >= длины полной свёртки — без заворота).
+    """
+    n = a.shape[1] + b.shape[1] - 1
+    out = np.fft.irfft(np.fft.rfft(a, n) * np.fft.rfft(b, n), n)[:, :size]
+    return np.clip(out, 0.0, None)
+
+
+def _moment_pairs(hc, ac, mu_home, mu_away):
+    """
+    Строки истории, где есть угловые и средние обеих команд.
+    """
+    hc, ac, mu_home, mu_away = (np.asarray(x, dtype=float) for x in (hc, ac, mu_home, mu_away))
+    ok = ~(np.isnan(hc) | np.isnan(ac) | np.isnan(mu_home) | np.isnan(mu_away))
+    return hc[ok], ac[ok], mu_home[ok], mu_away[ok]
+
+
+class CountModel:
+    """
+    Плагин распределения. Независимые маргиналы задаются k_max/marginal_pmf,
+    остальное (пакетный оценщик, совместная pmf, производные) — общее;
+    модели с зависимостью переопределяют _batch_pmfs и joint_pmf.
+    """
+
+    name = None
+    # ключ CONFIG с параметром модели (None в CONFIG -> fit по истории)
+    config_key = None
+
+    def params(self):
+        return {}
+
+    @classmethod
+    def fit(cls, hc, ac, mu_home, mu_away):
+        """
+        Параметр по истории: HC/AC матчей и средние команд (μ) для этих матчей.
+        """
+        return cls()
+
+    @classmethod
+    def from_config(cls, config, history=None):
+        """
+        Параметр из config[config_key]; None -> fit(*history) (если история есть),
+        иначе значение по умолчанию.
+        """
+        value = config.get(cls.config_key) if cls.config_key else None
+        if value is not None:
+            return cls(float(value))
+        if history is not None:
+            return cls.fit(*history)
+        return cls()
+
+    # --------------------------------------------------
+    def k_max(self, lam):
+        raise NotImplementedError
+
+    def marginal_pmf(self, lams, k_max):
+        """
+        Векторно: строка i = pmf маргинала со средним lams[i] для k = 0..k_max.
+        """
+        raise NotImplementedError
+
+    def _batch_pmfs(self, lam_home, lam_away, k_max):
+        """
+        -> (ph, pa, pt, pd) для cdf_sf_from_pmfs.
+        """
+        ph = self.marginal_pmf(lam_home, k_max)
+        pa = self.marginal_pmf(lam_away, k_max)
+        pt = _convolve(ph, pa, k_max + 1)
+        pd = _convolve(ph, pa[:, ::-1], 2 * k_max + 1)
+        return ph, pa, pt, pd
+
+    def cdf_sf_batch(self, lam_home, lam_away, home_shift=0, away_shift=0):
+        """
+        Оценщик f(var, k) -> (P(var <= k), P(var > k)) сразу по массиву матчей
+        (как poisson_cdf_sf_batch, сдвиги — уже поданные угловые).
+        """
+        lam_home = np.asarray(lam_home, dtype=float).reshape(-1)
+        lam_away = np.asarray(lam_away, dtype=float).reshape(-1)
+        k_max = self.k_max(float(np.max(lam_home + lam_away, initial=0.0)))
+        return cdf_sf_from_pmfs(*self._batch_pmfs(lam_home, lam_away, k_max), home_shift, away_shift)
+
+    def joint_pmf(self, lam_home, lam_away, k_max=None):
+        """
+        Усечённая совместная pmf P(home=i, away=j), i, j = 0..k_max.
+        """
+        if k_max is None:
+            k_max = self.k_max(max(float(lam_home), float(lam_away)))
+        ph = self.marginal_pmf([lam_home], k_max)[0]
+        pa = self.marginal_pmf([lam_away], k_max)[0]
+        return np.outer(ph, pa)
+
+    def joint_derivatives(self, lam_home, lam_away):
+        """
+        Совместная pmf и её производные по λ (центральные разности на общем носителе):
+        dict p, d_home, d_away, d2_home, d2_away, d2_home_away.
+        """
+        lam_home, lam_away = float(lam_home), float(lam_away)
+        hh = _DERIVATIVE_STEP * max(1.0, lam_home)
+        ha = _DERIVATIVE_STEP * max(1.0, lam_away)
+        k_max = self.k_max(max(lam_home, lam_away) + 1.0)
+
+        def joint(dh, da):
+            return self.joint_pmf(lam_home + dh, lam_away + da, k_max)
+
+        p = joint(0.0, 0.0)
+        ph_, pl_ = joint(hh, 0.0), joint(-hh, 0.0)
+        pa_, pb_ = joint(0.0, ha), joint(0.0, -ha)
+        return {
+            "p": p,
+            "d_home": (ph_ - pl_) / (2.0 * hh),
+            "d_away": (pa_ - pb_) / (2.0 * ha),
+            "d2_home": (ph_ - 2.0 * p + pl_) / (hh * hh),
+            "d2_away": (pa_ - 2.0 * p + pb_) / (ha * ha),
+            "d2_home_away": (
+                joint(hh, ha) - joint(hh, -ha) - joint(-hh, ha) + joint(-hh, -ha)
+            ) / (4.0 * hh * ha),
+        }
+
+    def __repr__(self):
+        params = ", ".join(f"{k}={v:.4g}" for k, v in self.params().items())
+        return f"{type(self).__name__}({params})"
+
+
+class PoissonModel(CountModel):
+    """
+    Независимые Poisson — те же точные функции, что у движка exact.
+    """
+
+    name = "poisson"
+
+    def k_max(self, lam):
+        return poisson_k_max(lam)
+
+    def marginal_pmf(self, lams, k_max):
+        return poisson_pmf_matrix(lams, k_max)
+
+    def cdf_sf_batch(self, lam_home, lam_away, home_shift=0, away_shift=0):
+        return poisson_cdf_sf_batch(lam_home, lam_away, home_shift, away_shift)
+
+    def joint_pmf(self, lam_home, lam_away, k_max=None):
+        return np.outer(poisson_pmf(lam_home, k_max), poisson_pmf(lam_away, k_max))
+
+    def joint_derivatives(self, lam_home, lam_away):
+        # аналитически: dp/dλ (k) = p(k-1) - p(k) и т.д. (poisson_pmf_derivatives)
+        ph, dph, d2ph = poisson_pmf_derivatives(lam_home)
+        pa, dpa, d2pa = poisson_pmf_derivatives(lam_away)
+        return {
+            "p": np.outer(ph, pa),
+            "d_home": np.outer(dph, pa),
+            "d_away": np.outer(ph, dpa),
+            "d2_home": np.outer(d2ph, pa),
+            "d2_away": np.outer(ph, d2pa),
+            "d2_home_away": np.outer(dph, dpa),
+        }
+
+
+class NegBinomialModel(CountModel):
+    """
+    NB со средним λ и дисперсией α: Var = λ + α λ², r = 1/α
+    (α = 0 — Poisson). pmf — в лог-пространстве без scipy, в форме,
+    устойчивой при больших r (переходит в Poisson):
+      log p(k) = k log λ - log k! - r log1p(λ / r) + Σ_{j=1..k} log1p((j - 1 - λ) / (r + λ))
+    """
+
+    name = "negbin"
+    config_key = "NEGBIN_DISPERSION"
+
+    def __init__(self, dispersion=0.0):
+        self.dispersion = max(0.0, float(dispersion))
+
+    def params(self):
+        return {"dispersion": self.dispersion}
+
+    @classmethod
+    def fit(cls, hc, ac, mu_home, mu_away):
+        """
+        Метод моментов по хозяевам и гостям вместе:
+          α = Σ((y - μ)² - y) / Σ μ²  (>= 0)
+        """
+        hc, ac, mu_home, mu_away = _moment_pairs(hc, ac, mu_home, mu_away)
+        y = np.concatenate([hc, ac])
+        mu = np.concatenate([mu_home, mu_away])
+        denominator = float(np.sum(mu * mu))
+        if denominator <= 0:
+            return cls()
+        return cls(max(0.0, float(np.sum((y - mu) ** 2 - y)) / denominator))
+
+    def k_max(self, lam):
+        lam = max(float(lam), 0.0)
+        if self.dispersion <= 0:
+            return poisson_k_max(lam)
+        # гауссова граница + геометрический хвост NB (отношение соседних pmf -> λ / (r + λ))
+        gauss = lam + 12.0 * math.sqrt(lam + self.dispersion * lam * lam) + 12.0
+        ratio = lam / (1.0 / self.dispersion + lam)
+        tail = 28.0 / -math.log(ratio) if 0 < ratio < 1 else 0.0
+        return int(math.ceil(max(gauss, tail)))
+
+    def marginal_pmf(self, lams, k_max):
+        if self.dispersion <= 0:
+            return poisson_pmf_matrix(lams, k_max)
+
+        lams = np.asarray(lams, dtype=float).reshape(-1)
+        r = 1.0 / self.dispersion
+        k = np.arange(int(k_max) + 1, dtype=float)
+        log_fact = np.concatenate(([0.0], np.cumsum(np.log(k[1:]))))
+
+        zero = lams <= 0
+        lam = np.where(zero, 1.0, lams)[:, None]
+        log_ratio = np.zeros((len(lams), len(k)))
+        np.cumsum(np.log1p((k[None, 1:] - 1.0 - lam) / (r + lam)), axis=1, out=log_ratio[:, 1:])
+        logp = k[None, :] * np.log(lam) - log_fact[None, :] - r * np.log1p(lam / r) + log_ratio
+        pmf = np.exp(logp)
+
+        # λ = 0 -> вся масса в нуле
+        if np.any(zero):
+            pmf[zero] = 0.0
+            pmf[zero, 0] = 1.0
+        return pmf
+
+
+class BivariatePoissonModel(CountModel):
+    """
+    home = X1 + X3, away = X2 + X3: X1 ~ Poisson(λ_home - λ3), X2 ~ Poisson(λ_away - λ3),
+    X3 ~ Poisson(λ3), λ3 = min(ρ sqrt(λ_home λ_away), λ_home, λ_away).
+    Маргиналы — Poisson(λ), diff = X1 - X2 (X3 сокращается),
+    total = (X1 + X2) + 2 X3, X1 + X2 ~ Poisson(λ_home + λ_away - 2 λ3).
+    """
+
+    name = "bivariate"
+    config_key = "BIVARIATE_CORRELATION"
+
+    def __init__(self, correlation=0.0):
+        self.correlation = min(max(0.0, float(correlation)), _MAX_CORRELATION)
+
+    def params(self):
+        return {"correlation": self.correlation}
+
+    @classmethod
+    def fit(cls, hc, ac, mu_home, mu_away):
+        """
+        cov(home, away) = λ3 = ρ sqrt(λ_home λ_away):
+          ρ = Σ (h - μh)(a - μa) / Σ sqrt(μh μa)  (в [0, 0.95])
+        """
+        hc, ac, mu_home, mu_away = _moment_pairs(hc, ac, mu_home, mu_away)
+        denominator = float(np.sum(np.sqrt(mu_home * mu_away)))
+        if denominator <= 0:
+            return cls()
+        return cls(float(np.sum((hc - mu_home) * (ac - mu_away))) / denominator)
+
+    def common(self, lam_home, lam_away):
+        lam_home = np.asarray(lam_home, dtype=float)
+        lam_away = np.asarray(lam_away, dtype=float)
+        lam3 = self.correlation * np.sqrt(np.maximum(lam_home, 0.0) * np.maximum(lam_away, 0.0))
+        return np.minimum(lam3, np.minimum(lam_home, lam_away))
+
+    def k_max(self, lam):
+        # Var(total) = λ_total + 2 λ3 <= (1 + ρ) λ_total
+        return poisson_k_max(float(lam) * (1.0 + self.correlation))
+
+    def marginal_pmf(self, lams, k_max):
+        return poisson_pmf_matrix(lams, k_max)
+
+    def _batch_pmfs(self, lam_home, lam_away, k_max):
+        lam3 = self.common(lam_home, lam_away)
+        p1 = poisson_pmf_matrix(lam_home - lam3, k_max)
+        p2 = poisson_pmf_matrix(lam_away - lam3, k_max)
+
+        # 2 X3: масса X3 = m на чётном индексе 2m
+        p3 = poisson_pmf_matrix(lam3, k_max // 2)
+        p3_twice = np.zeros((len(lam3), 2 * p3.shape[1] - 1))
+        p3_twice[:, ::2] = p3
+
+        ph = poisson_pmf_matrix(lam_home, k_max)
+        pa = poisson_pmf_matrix(lam_away, k_max)
+        p12 = poisson_pmf_matrix(lam_home + lam_away - 2.0 * lam3, k_max)
+        pt = _convolve(p12, p3_twice, k_max + 1)
+        pd = _convolve(p1, p2[:, ::-1], 2 * k_max + 1)
+        return ph, pa, pt, pd
+
+    def joint_pmf(self, lam_home, lam_away, k_max=None):
+        if k_max is None:
+            k_max = self.k_max(max(float(lam_home), float(lam_away)))
+        lam3 = float(self.common(lam_home, lam_away))
+        p1 = poisson_pmf(float(lam_home) - lam3, k_max)
+        p2 = poisson_pmf(float(lam_away) - lam3, k_max)
+        p3 = poisson_pmf(lam3, k_max)
+
+        # P(i, j) = Σ_m P(X3 = m) P(X1 = i - m) P(X2 = j - m)
+        joint = np.zeros((k_max + 1, k_max + 1))
+        for m in range(k_max + 1):
+            joint[m:, m:] += p3[m] * np.outer(p1[:k_max + 1 - m], p2[:k_max + 1 - m])
+        return joint
+
+
+DISTRIBUTIONS = {
+    "poisson": PoissonModel,
+    "negbin": NegBinomialModel,
+    "bivariate": BivariatePoissonModel,
+}
+
+
+def count_model(name, config, history=None):
+    """
+    Имя распределения -> модель с параметром из config или подобранным по
+    history = (hc, ac, mu_home, mu_away).
+    """
+    if name not in DISTRIBUTIONS:
+        raise ValueError(f"Неизвестное распределение: {name!r} (есть: {tuple(DISTRIBUTIONS)})")
+    return DISTRIBUTIONS[name].from_config(config, history)
@@ -0,0 +1,220 @@
+# src/fast_loader.py
+"""
+Загрузка без pandas для быстрого старта (cron, маленькие слейты).
+
+CSV читается модулем csv в numpy-колонки, история дополнительно кэшируется
+в .npz (DATA_CACHE_DIR) и при следующих запусках читается только numpy.
+Результат — ArrayFrame: минимальная таблица колонок, которую понимают
+CornerOddsCalculator и predict.py (df[col], df.columns, len(df), iterrows()).
+Семантика — как у загрузчиков src/data_loader.py.
+"""
+
+import csv
+import hashlib
+import os
+from datetime import datetime
+
+import numpy as np
+
+from src.config import CONFIG
+from src.data_loader import attach_team_ids, form_schema
+
+_DATE_FORMATS = ("%d/%m/%Y", "%d/%m/%y", "%d.%m.%Y", "%d-%m-%Y", "%Y-%m-%d")
+
+
+class ArrayFrame:
+    """
+    Колонки numpy одинаковой длины.
+    """
+
+    def __init__(self, columns):
+        self._data = {}
+        self.columns = []
+        for col, values in columns.items():
+            self[col] = values
+
+    def __getitem__(self, col):
+        return self._data[col]
+
+    def __setitem__(self, col, values):
+        if col not in self._data:
+            self.columns.append(col)
+        self._data[col] = np.asarray(values)
+
+    def __len__(self):
+        return len(self._data[self.columns[0]]) if self.columns else 0
+
+    def append(self, columns):
+        """
+        Дописать строки на месте (объект тот же: кэши калькулятора по id(df)
+        остаются валидными, см. src/watcher.py). Нет колонки -> "" / NaN.
+        """
+        n = len(next(iter(columns.values()))) if columns else 0
+        for col in self.columns:
+            old = self._data[col]
+            if col in columns:
+                values = np.asarray(columns[col])
+            elif old.dtype.kind == "f":
+                values = np.full(n, np.nan)
+            else:
+                values = np.full(n, "", dtype=old.dtype)
+            self._data[col] = np.concatenate([old, values])
+
+    def take(self, mask):
+        return ArrayFrame({col: self._data[col][mask] for col in self.columns})
+
+    def iterrows(self):
+        for i in range(len(self)):
+            yield i, {col: self._data[col][i] for col in self.columns}
+
+
+def _read_csv_columns(path):
+    """
+    CSV -> {колонка: list[str]} (BOM и пробелы в заголовке убираем).
+    """
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        header = [h.strip() for h in next(reader, [])]
+        rows = [r for r in reader if r]
+    return {h: [r[i].strip() if i < len(r) else "" for r in rows] for i, h in enumerate(header)}
+
+
+def _to_float(values):
+    out = np.empty(len(values), dtype=float)
+    for i, v in enumerate(values):
+        try:
+            out[i] = float(v) if v else np.nan
+        except ValueError:
+            out[i] = np.nan
+    return out
+
+
+def _to_date(values):
+    """
+    Даты в формате dayfirst (как pd.to_datetime(dayfirst=True)); не распознано -> NaT.
+    """
+    formats = (CONFIG["FORM_DATE_FORMAT"],) + tuple(f for f in _DATE_FORMATS if f != CONFIG["FORM_DATE_FORMAT"])
+    out = np.full(len(values), np.datetime64("NaT"), dtype="datetime64[ns]")
+    for i, v in enumerate(values):
+        for fmt in formats:
+            try:
+                out[i] = np.datetime64(datetime.strptime(v, fmt), "ns")
+                break
+            except ValueError:
+                continue
+    return out
+
+
+def _require(columns, required, path):
+    missing = [col for col in required if col not in columns]
+    if missing:
+        raise ValueError(f"Отсутствуют колонки: {missing} ({path})")
+
+
+def history_columns(raw, path=""):
+    """
+    Сырые колонки истории -> numpy (HC/AC — float, прочие — str).
+    """
+    _require(raw, ["HomeTeam", "AwayTeam", "HC", "AC"], path)
+    return {
+        col: _to_float(values) if col in ("HC", "AC") else np.asarray(values, dtype=str)
+        for col, values in raw.items()
+    }
+
+
+def form_columns(raw, path=""):
+    """
+    Сырые колонки формы (любая схема из data_loader.form_schema) -> Date,p1,p2,score_p1,score_p2,
+    по дате (stable); строки без даты/команд/угловых отбрасываются.
+    """
+    schema = form_schema(raw)
+    if schema is None:
+        raise KeyError(f"Нет нужных колонок. Есть: {list(raw)} ({path})")
+    columns = {
+        "Date": _to_date(raw["Date"]),
+        "p1": np.asarray(raw[schema["p1"]], dtype=object),
+        "p2": np.asarray(raw[schema["p2"]], dtype=object),
+        "score_p1": _to_float(raw[schema["score_p1"]]),
+        "score_p2": _to_float(raw[schema["score_p2"]]),
+    }
+    ok = (
+        ~np.isnat(columns["Date"])
+        & ~np.isnan(columns["score_p1"]) & ~np.isnan(columns["score_p2"])
+        & (columns["p1"] != "") & (columns["p2"] != "")
+    )
+    order = np.nonzero(ok)[0]
+    order = order[np.argsort(columns["Date"][order], kind="stable")]
+    return {col: values[order] for col, values in columns.items()}
+
+
+def _cache_path(path, cache_dir):
+    st = os.stat(path)
+    raw = f"{os.path.abspath(path)}|{st.st_mtime_ns}|{st.st_size}".encode("utf-8")
+    return os.path.join(cache_dir, f"history_{hashlib.sha1(raw).hexdigest()[:12]}.npz")
+
+
+def load_historical_arrays(filepath, registry=None, cache_dir=None):
+    """
+    История -> ArrayFrame (HomeTeam/AwayTeam — str, HC/AC — float, прочие колонки — str).
+    Кэш .npz по (путь, mtime, размер): повторный запуск не парсит CSV.
+    registry — как в load_historical_data (HomeTeam_id/AwayTeam_id).
+    """
+    cache_dir = CONFIG["DATA_CACHE_DIR"] if cache_dir is None else cache_dir
+    cache_path = _cache_path(filepath, cache_dir)
+
+    if os.path.exists(cache_path):
+        with np.load(cache_path, allow_pickle=False) as data:
+            columns = {col: data[col] for col in data.files}
+    else:
+        columns = history_columns(_read_csv_columns(filepath), filepath)
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = cache_path + ".tmp.npz"
+        np.savez(tmp_path, **columns)
+        os.replace(tmp_path, cache_path)
+
+    df = ArrayFrame(columns)
+    if registry is not None:
+        attach_team_ids(df, registry, [("HomeTeam", "HomeTeam_id"), ("AwayTeam", "AwayTeam_id")])
+    return df
+
+
+def load_future_arrays(filepath, registry=None):
+    """
+    Будущие матчи -> ArrayFrame (все колонки — str, пусто = нет значения).
+    """
+    raw = _read_csv_columns(filepath)
+    if "home" in raw and "away" in raw:
+        raw["HomeTeam"] = raw["home"]
+        raw["AwayTeam"] = raw["away"]
+    df = ArrayFrame({col: np.asarray(values, dtype=object) for col, values in raw.items()})
+
+    if registry is not None:
+        for home_col, away_col in (("HomeTeam", "AwayTeam"), ("p1", "p2")):
+            if home_col in raw and away_col in raw and any(raw[home_col]):
+                attach_team_ids(
+                    df, registry,
+                    [(home_col, f"{home_col}_id"), (away_col, f"{away_col}_id")],
+                    "future_matches",
+                )
+                break
+    return df
+
+
+def load_team_strength_fast(path="data/team_strength.csv", registry=None):
+    raw = _read_csv_columns(path)
+    _require(raw, ["Team", "Strength"], path)
+    teams = raw["Team"]
+    if registry is not None:
+        ids = registry.lookup_many(teams, "team_strength")
+        teams = registry.canonical_names(ids, teams)
+    return dict(zip(teams, _to_float(raw["Strength"])))
+
+
+def load_form_arrays(path="data/history_5matches.csv", registry=None):
+    """
+    Файл формы -> ArrayFrame Date,p1,p2,score_p1,score_p2 (см. form_columns).
+    """
+    df = ArrayFrame(form_columns(_read_csv_columns(path), path))
+    if registry is not None:
+        attach_team_ids(df, registry, [("p1", "p1_id"), ("p2", "p2_id")], "history_5matches")
+    return df
@@ -0,0 +1,67 @@
+# src/inplay.py
+"""
+Live-переоценка угловых по ходу матча.
+
+На входе — предматчевые λ (из CornerOddsCalculator._calculate_lambdas), минута
+и текущий счёт по угловым. Оставшиеся угловые ~ Poisson(λ * оставшееся_время / MATCH_MINUTES),
+итог = уже поданные + оставшиеся. Все рынки считаются точно (pmf Poisson/Skellam),
+сразу для всех live-матчей одним вызовом.
+"""
+
+import numpy as np
+
+from src.bookmaker_grid import normalize_odds_triplet_array
+from src.calculator import CornerOddsCalculator
+from src.pmf_tables import poisson_cdf_sf_batch
+
+# исход 1X2 с p <= eps или p >= 1 - eps считается уже рассчитанным (счёт/минута его решили)
+_SETTLED_EPS = 1e-9
+
+
+class InPlayCornerPricer:
+    def __init__(self, margin=None, match_minutes=None, config=None):
+        # расчёт рынков/маржи общий с предматчем, движок тут не используется
+        self.calculator = CornerOddsCalculator(margin=margin, engine="exact", config=config)
+        self.config = self.calculator.config
+        self.match_minutes = float(self.config["MATCH_MINUTES"] if match_minutes is None else match_minutes)
+
+    # ==================================================
+    # PUBLIC
+    # ==================================================
+    def remaining_lambdas(self, lambda_home, lambda_away, minute):
+        """
+        λ на оставшееся время: λ * max(0, T - minute) / T.
+        """
+        minute = np.asarray(minute, dtype=float)
+        left = np.clip(self.match_minutes - minute, 0.0, self.match_minutes) / self.match_minutes
+        return np.asarray(lambda_home, dtype=float) * left, np.asarray(lambda_away, dtype=float) * left
+
+    def market_probabilities(self, lambda_home, lambda_away, minute, home_corners, away_corners):
+        """
+        Сырые вероятности рынков (ключи как в CornerOddsCalculator._market_probabilities),
+        каждая — массив по live-матчам.
+        """
+        rem_home, rem_away = self.remaining_lambdas(lambda_home, lambda_away, minute)
+        # итог = уже поданные + Poisson(остаток); Skellam по остатку — FFT по всем матчам
+        cdf_sf = poisson_cdf_sf_batch(rem_home, rem_away, home_corners, away_corners)
+        return self.calculator._market_probabilities(cdf_sf, self.config)
+
+    def price_board(self, lambda_home, lambda_away, minute, home_corners, away_corners):
+        """
+        Коэффициенты всех рынков для всей live-доски.
+
+        Возвращает плоский dict: ключ рынка -> массив коэффициентов по матчам
+        (NaN = рынок уже рассчитан/закрыт, например тотал уже пройден).
+        """
+        probs = self.market_probabilities(lambda_home, lambda_away, minute, home_corners, away_corners)
+        odds = self.calculator._odds_arrays_from_probabilities(probs)
+
+        # 1X2: решённые исходы (p≈0) выкидываем до нормализации тройки, решённый
+        # рынок (какой-то p≈1) закрываем целиком; коэффициент <= 1 не выставляем
+        triplet = np.stack([np.asarray(probs[k], dtype=float) for k in ("P1", "X", "P2")])
+        dead = triplet <= _SETTLED_EPS
+        closed = (triplet >= 1.0 - _SETTLED_EPS).any(axis=0)
+        o1, ox, o2 = normalize_odds_triplet_array(*np.where(dead, 0.0, triplet), self.calculator.margin)
+        for n, (key, o) in enumerate(zip(("P1", "X", "P2"), (o1, ox, o2))):
+            odds[key] = np.where(dead[n] | closed | ~(o > 1.0), np.nan, o)
+        return odds
@@ -0,0 +1,163 @@
+# src/leagues.py
+"""
+Шарды истории по лиге (колонка Div): у каждого шарда свои индексы команд
+и свои league_avg_home/away (свой калькулятор — свой кэш профилей).
+
+Матч направляется в шард по колонке league из future_matches.csv
+(CONFIG["LEAGUE_ALIASES"]: код лиги в фикстурах -> Div). Лига не найдена ->
+вся история, как раньше. Шарды можно считать в отдельных процессах
+(iter_league_prices(..., workers=N)).
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from src.config import CONFIG
+
+DIV_COL = "Div"
+
+
+def league_key(value):
+    """
+    Код лиги -> нормализованный ключ (strip + без регистра); пусто/NaN -> "".
+    """
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return ""
+    s = str(value).strip().casefold()
+    return "" if s == "nan" else s
+
+
+class LeagueShards:
+    """
+    historical_df (DataFrame или ArrayFrame) -> {Div: строки этой лиги}.
+
+        shards = LeagueShards(historical_df, calculator)
+        calc, df = shards.route("E0")   # калькулятор шарда + его история
+    """
+
+    def __init__(self, historical_df, calculator, aliases=None):
+        self.history = historical_df
+        self.base = calculator
+        aliases = CONFIG["LEAGUE_ALIASES"] if aliases is None else aliases
+        self._aliases = {league_key(k): league_key(v) for k, v in aliases.items()}
+
+        self.shards = {}
+        if DIV_COL in historical_df.columns:
+            divs = np.array([league_key(v) for v in historical_df[DIV_COL]], dtype=object)
+            keys = [k for k in dict.fromkeys(divs) if k]
+            if len(keys) == 1 and (divs == keys[0]).all():
+                # одна лига — шард = вся история, без копии
+                self.shards[keys[0]] = historical_df
+            else:
+                for key in keys:
+                    self.shards[key] = _take_rows(historical_df, np.nonzero(divs == key)[0])
+
+        self._calculators = {None: calculator}
+        self.unmatched = set()  # коды лиг из фикстур без шарда (-> вся история)
+
+    def resolve(self, league):
+        """
+        Код лиги -> ключ шарда или None (вся история).
+        """
+        key = league_key(league)
+        key = self._aliases.get(key, key)
+        if key in self.shards:
+            return key
+        if key:
+            self.unmatched.add(str(league).strip())
+        return None
+
+    def route(self, league):
+        """
+        -> (калькулятор, historical_df) для матча этой лиги.
+        """
+        key = self.resolve(league)
+        return self.calculator(key), self.frame(key)
+
+    def frame(self, key):
+        return self.history if key is None else self.shards[key]
+
+    def calculator(self, key):
+        """
+        Калькулятор шарда: те же настройки/реестр, свой кэш профилей
+        (иначе чередование лиг пересобирало бы профили на каждом матче).
+        """
+        if key is not None and self.shards[key] is self.history:
+            key = None
+        calc = self._calculators.get(key)
+        if calc is None:
+            calc = self._calculators[key] = _clone_calculator(self.base)
+        return calc
+
+    def __len__(self):
+        return len(self.shards)
+
+
+def _take_rows(df, rows):
+    if hasattr(df, "iloc"):
+        return df.iloc[rows].reset_index(drop=True)
+    return df.take(rows)
+
+
+def _clone_calculator(calculator):
+    return type(calculator)(
+        margin=calculator.margin,
+        n_simulations=calculator.n_simulations,
+        engine=calculator.engine,
+        config=calculator.config,
+        registry=calculator.registry,
+        distribution=calculator.distribution,
+        ewma_state=calculator.ewma_state,
+    )
+
+
+def _price_group(args):
+    """
+    Матчи одного шарда (в процессе-воркере). Ошибка матча -> объект исключения
+    на его месте, чтобы остальные матчи шарда посчитались.
+    """
+    calculator, historical_df, pairs, team_strength, form_df = args
+    out = []
+    for home_team, away_team in pairs:
+        try:
+            out.append(calculator.calculate_match_odds(
+                historical_df, home_team, away_team, team_strength=team_strength, form_df=form_df,
+            ))
+        except Exception as e:
+            out.append(e)
+    return out
+
+
+def iter_league_prices(shards, fixtures, team_strength=None, form_df=None, workers=1):
+    """
+    fixtures — список (league, home, away). Выдаёт результаты calculate_match_odds
+    (или исключение матча) в порядке fixtures.
+
+    workers=1 — по одному матчу в текущем процессе (вывод идёт по мере расчёта),
+    иначе матчи группируются по шардам и шарды считаются в ProcessPoolExecutor
+    (None = число ядер).
+    """
+    keys = [shards.resolve(league) for league, _, _ in fixtures]
+    workers = (os.cpu_count() or 1) if workers is None else int(workers)
+
+    groups = {}
+    for i, key in enumerate(keys):
+        groups.setdefault(key, []).append(i)
+
+    if workers <= 1 or len(groups) <= 1:
+        for key, (_, home, away) in zip(keys, fixtures):
+            yield _price_group((shards.calculator(key), shards.frame(key), [(home, away)], team_strength, form_df))[0]
+        return
+
+    tasks = [
+        (shards.calculator(key), shards.frame(key), [fixtures[i][1:] for i in rows], team_strength, form_df)
+        for key, rows in groups.items()
+    ]
+    results = [None] * len(fixtures)
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+        for rows, group_results in zip(groups.values(), pool.map(_price_group, tasks)):
+            for i, result in zip(rows, group_results):
+                results[i] = result
+    yield from results
@@ -0,0 +1,67 @@
+# src/manifest.py
+"""
+Манифест прогона predict.py рядом с файлом результатов (<out>.manifest.json):
+для каждого матча — отпечаток входов (CornerOddsCalculator.input_fingerprint)
+и посчитанный результат. Следующий прогон пересчитывает только матчи с
+изменившимся отпечатком, остальные берёт из манифеста.
+"""
+
+import json
+import os
+
+from src.results import as_dict
+
+_VERSION = 1
+
+
+def fixture_key(league, home_team, away_team):
+    league = "" if league is None else str(league).strip()
+    return f"{league}|{home_team}|{away_team}"
+
+
+class RunManifest:
+    def __init__(self, path):
+        self.path = path
+        self.previous = {}
+        self.current = {}
+
+    @classmethod
+    def for_output(cls, out_path):
+        return cls(os.path.splitext(out_path)[0] + ".manifest.json")
+
+    def load(self):
+        """
+        Читает прошлый манифест (нет файла / другая версия / битый JSON -> пусто).
+        """
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return self
+        if data.get("version") == _VERSION:
+            self.previous = data.get("fixtures", {})
+        return self
+
+    def lookup(self, key, fingerprint):
+        """
+        Результат прошлого прогона, если отпечаток входов не изменился, иначе None.
+        """
+        entry = self.previous.get(key)
+        if entry is None or fingerprint is None or entry.get("fingerprint") != fingerprint:
+            return None
+        return entry["odds"]
+
+    def record(self, key, fingerprint, match_odds):
+        if fingerprint is not None:
+            self.current[key] = {"fingerprint": fingerprint, "odds": as_dict(match_odds)}
+
+    def save(self):
+        """
+        Только матчи этого прогона; запись через временный файл (прерванный
+        прогон не оставляет полманифеста).
+        """
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": _VERSION, "fixtures": self.current}, f, ensure_ascii=False, default=float)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,377 @@
+# src/pmf_tables.py
+"""
+Предрасчитанные таблицы Poisson CDF и Skellam CDF по сетке λ.
+
+Вместо пересчёта pmf на каждый матч берём CDF из таблицы и интерполируем по λ:
+  - Poisson CDF  F(k; λ)          — 1D-сетка λ ∈ [MIN_LAMBDA, 2*MAX_LAMBDA]
+                                     (2*MAX — чтобы покрыть тотал λ_home + λ_away),
+                                     линейная интерполяция по λ
+  - Skellam CDF  P(H - A <= d)    — 2D-сетка (λ_home, λ_away) ∈ [MIN_LAMBDA, MAX_LAMBDA]²,
+                                     d ∈ [-SKELLAM_TABLE_MAX_DIFF, +SKELLAM_TABLE_MAX_DIFF],
+                                     билинейная интерполяция
+
+Таблицы сохраняются в PMF_TABLE_DIR как .npy и открываются через np.load(mmap_mode="r"),
+т.е. второй и последующие процессы не строят их заново и не держат целиком в памяти.
+
+Точность (по умолчанию: PMF_TABLE_STEP=0.01, SKELLAM_TABLE_STEP=0.05),
+максимальная абсолютная ошибка вероятности по серединам ячеек сетки
+(худший случай для линейной интерполяции):
+  - Poisson CDF: ~7e-6
+  - Skellam CDF: ~9e-5 (в основном у нижней границы λ ≈ 0.5)
+Фактические значения считаются при построении и лежат в tables.max_error
+(и в meta-файле рядом с таблицами).
+"""
+
+import json
+import math
+import os
+import hashlib
+import threading
+
+import numpy as np
+
+from src.config import CONFIG
+
+_TABLES_CACHE = {}
+# построение/загрузка — под замком: параллельные расчёты не строят таблицы дважды
+_TABLES_LOCK = threading.Lock()
+
+
+# ==================================================
+# POISSON PMF
+# ==================================================
+def poisson_k_max(lam):
+    """
+    Граница усечения: хвост P(X > k_max) пренебрежимо мал (~1e-12 и меньше).
+    """
+    lam = float(lam)
+    return int(math.ceil(lam + 12.0 * math.sqrt(max(lam, 0.0)) + 12.0))
+
+
+def poisson_pmf(lam, k_max=None):
+    """
+    pmf Poisson(λ) для k = 0..k_max (в лог-пространстве, без scipy).
+    """
+    lam = float(lam)
+    if k_max is None:
+        k_max = poisson_k_max(lam)
+    return poisson_pmf_matrix(np.array([lam]), k_max)[0]
+
+
+def poisson_pmf_derivatives(lam, k_max=None):
+    """
+    pmf Poisson(λ) и её производные по λ (аналитически):
+      dp/dλ (k)   = p(k-1) - p(k)
+      d²p/dλ² (k) = p(k-2) - 2 p(k-1) + p(k)
+    Носитель на 2 больше обычного, чтобы сдвиги не теряли массу.
+    """
+    lam = float(lam)
+    if k_max is None:
+        k_max = poisson_k_max(lam) + 2
+    p = poisson_pmf(lam, k_max)
+    p1 = np.concatenate(([0.0], p[:-1]))
+    p2 = np.concatenate(([0.0, 0.0], p[:-2]))
+    return p, p1 - p, p2 - 2.0 * p1 + p
+
+
+def poisson_pmf_matrix(lams, k_max):
+    """
+    Векторно: строка i = pmf Poisson(lams[i]) для k = 0..k_max.
+    """
+    lams = np.asarray(lams, dtype=float).reshape(-1)
+    k = np.arange(int(k_max) + 1, dtype=float)
+    log_fact = np.concatenate(([0.0], np.cumsum(np.log(k[1:]))))
+
+    zero = lams <= 0
+    log_lam = np.log(np.where(zero, 1.0, lams))[:, None]
+    logp = k[None, :] * log_lam - lams[:, None] - log_fact[None, :]
+    pmf = np.exp(logp)
+
+    # λ = 0 -> вся масса в нуле
+    if np.any(zero):
+        pmf[zero] = 0.0
+        pmf[zero, 0] = 1.0
+    return pmf
+
+
+def poisson_cdf_sf_batch(lam_home, lam_away, home_shift=0, away_shift=0):
+    """
+    Точный оценщик f(var, k) -> (P(var <= k), P(var > k)) сразу по массиву матчей:
+      home  = home_shift + Poisson(lam_home)
+      away  = away_shift + Poisson(lam_away)
+      total = home + away,  diff = home - away
+    Сдвиги — уже поданные угловые (live), для предматча 0.
+    Skellam считаем свёрткой через FFT по всем матчам сразу.
+    """
+    lam_home, lam_away, home_shift, away_shift = np.broadcast_arrays(
+        np.asarray(lam_home, dtype=float).reshape(-1),
+        np.asarray(lam_away, dtype=float).reshape(-1),
+        np.asarray(home_shift, dtype=np.int64).reshape(-1),
+        np.asarray(away_shift, dtype=np.int64).reshape(-1),
+    )
+
+    k_max = poisson_k_max(float(np.max(lam_home + lam_away, initial=0.0)))
+    ph = poisson_pmf_matrix(lam_home, k_max)
+    pa = poisson_pmf_matrix(lam_away, k_max)
+    pt = poisson_pmf_matrix(lam_home + lam_away, k_max)
+
+    # свёртка ph с развёрнутой pa: индекс j соответствует разнице d = j - k_max
+    size = 2 * k_max + 1
+    pd = np.fft.irfft(np.fft.rfft(ph, size) * np.fft.rfft(pa[:, ::-1], size), size)
+    return cdf_sf_from_pmfs(ph, pa, pt, pd, home_shift, away_shift)
+
+
+def cdf_sf_from_pmfs(ph, pa, pt, pd, home_shift=0, away_shift=0):
+    """
+    Пакет pmf [матчи, k] -> оценщик f(var, k) -> (P(var <= k), P(var > k)):
+      ph/pa/pt — home/away/total для k = 0..k_max,
+      pd       — diff = home - away, индекс j соответствует d = j - k_max (2*k_max + 1 колонок).
+    Общий для poisson_cdf_sf_batch и распределений src/distributions.py.
+    """
+    k_max = ph.shape[1] - 1
+    rows = np.arange(ph.shape[0])
+    home_shift = np.asarray(home_shift, dtype=np.int64)
+    away_shift = np.asarray(away_shift, dtype=np.int64)
+
+    # (накопленная CDF, сдвиг значения, смещение индекса)
+    cum = {
+        "home": (np.cumsum(ph, axis=1), home_shift, 0),
+        "away": (np.cumsum(pa, axis=1), away_shift, 0),
+        "total": (np.cumsum(pt, axis=1), home_shift + away_shift, 0),
+        "diff": (np.cumsum(np.clip(pd, 0.0, None), axis=1), home_shift - away_shift, k_max),
+    }
+
+    def f(var, k):
+        cdf, shift, offset = cum[var]
+        idx = int(k) - shift + offset
+        c = cdf[rows, np.clip(idx, 0, cdf.shape[1] - 1)]
+        c = np.where(idx < 0, 0.0, np.where(idx >= cdf.shape[1], 1.0, c))
+        c = np.clip(c, 0.0, 1.0)
+        return c, 1.0 - c
+
+    return f
+
+
+# ==================================================
+# TABLES
+# ==================================================
+class PmfTables:
+    def __init__(self, poisson_cdf, skellam_cdf, meta):
+        self.poisson_table = poisson_cdf
+        self.skellam_table = skellam_cdf
+        self.meta = meta
+
+        self.lam_min = float(meta["lam_min"])
+        self.step = float(meta["step"])
+        self.n_poisson = int(meta["n_poisson"])
+        self.k_max = int(meta["k_max"])
+
+        self.skellam_step = float(meta["skellam_step"])
+        self.n_skellam = int(meta["n_skellam"])
+        self.max_diff = int(meta["max_diff"])
+
+        self.max_error = meta.get("max_error", {})
+
+    # --------------------------------------------------
+    @staticmethod
+    def _cell(lam, lam_min, step, n):
+        x = (np.asarray(lam, dtype=float) - lam_min) / step
+        x = np.clip(x, 0.0, n - 1.0)
+        i0 = np.minimum(np.floor(x).astype(np.int64), n - 2)
+        return i0, x - i0
+
+    def poisson_cdf(self, lam, k):
+        """
+        P(X <= k), X ~ Poisson(lam). lam и k броадкастятся друг с другом.
+        """
+        lam, k = np.broadcast_arrays(np.asarray(lam, dtype=float), np.asarray(k, dtype=np.int64))
+        i0, w = self._cell(lam, self.lam_min, self.step, self.n_poisson)
+        kk = np.clip(k, 0, self.k_max)
+
+        t = self.poisson_table
+        out = (1.0 - w) * t[i0, kk] + w * t[i0 + 1, kk]
+        out = np.where(k < 0, 0.0, out)
+        out = np.where(k > self.k_max, 1.0, out)
+        return out
+
+    def skellam_cdf(self, lam_home, lam_away, d):
+        """
+        P(H - A <= d), H ~ Poisson(lam_home), A ~ Poisson(lam_away).
+        """
+        lam_home, lam_away, d = np.broadcast_arrays(
+            np.asarray(lam_home, dtype=float),
+            np.asarray(lam_away, dtype=float),
+            np.asarray(d, dtype=np.int64),
+        )
+        if np.any(np.abs(d) > self.max_diff):
+            raise ValueError(
+                f"Разница {int(np.max(np.abs(d)))} вне таблицы Skellam (±{self.max_diff}), "
+                f"увеличь SKELLAM_TABLE_MAX_DIFF"
+            )
+
+        i0, wi = self._cell(lam_home, self.lam_min, self.skellam_step, self.n_skellam)
+        j0, wj = self._cell(lam_away, self.lam_min, self.skellam_step, self.n_skellam)
+        dd = d + self.max_diff
+
+        t = self.skellam_table
+        return (
+            (1.0 - wi) * (1.0 - wj) * t[i0, j0, dd]
+            + wi * (1.0 - wj) * t[i0 + 1, j0, dd]
+            + (1.0 - wi) * wj * t[i0, j0 + 1, dd]
+            + wi * wj * t[i0 + 1, j0 + 1, dd]
+        )
+
+    def cdf_sf(self, lam_home, lam_away):
+        """
+        Оценщик для CornerOddsCalculator._market_probabilities:
+          f(var, k) -> (P(var <= k), P(var > k)), var ∈ home/away/diff/total
+        """
+        lam_home = np.asarray(lam_home, dtype=float)
+        lam_away = np.asarray(lam_away, dtype=float)
+
+        def f(var, k):
+            if var == "home":
+                c = self.poisson_cdf(lam_home, k)
+            elif var == "away":
+                c = self.poisson_cdf(lam_away, k)
+            elif var == "total":
+                c = self.poisson_cdf(lam_home + lam_away, k)
+            else:
+                c = self.skellam_cdf(lam_home, lam_away, k)
+            return c, 1.0 - c
+
+        return f
+
+
+# ==================================================
+# BUILD / LOAD
+# ==================================================
+def _table_params(config=None):
+    config = CONFIG if config is None else config
+    lam_min = float(config["MIN_LAMBDA"])
+    lam_max = float(config["MAX_LAMBDA"])
+    step = float(config["PMF_TABLE_STEP"])
+    skellam_step = float(config["SKELLAM_TABLE_STEP"])
+
+    # Poisson — до 2*MAX (тотал), Skellam — до MAX
+    n_poisson = int(round((2.0 * lam_max - lam_min) / step)) + 1
+    n_skellam = int(round((lam_max - lam_min) / skellam_step)) + 1
+    return {
+        "lam_min": lam_min,
+        "lam_max": lam_max,
+        "step": step,
+        "n_poisson": n_poisson,
+        "k_max": poisson_k_max(2.0 * lam_max),
+        "skellam_step": skellam_step,
+        "n_skellam": n_skellam,
+        "skellam_k_max": poisson_k_max(lam_max),
+        "max_diff": int(config["SKELLAM_TABLE_MAX_DIFF"]),
+    }
+
+
+def _signature(params):
+    raw = json.dumps(params, sort_keys=True).encode("utf-8")
+    return hashlib.sha1(raw).hexdigest()[:12]
+
+
+def _exact_poisson_cdf(lams, k_max):
+    return np.cumsum(poisson_pmf_matrix(lams, k_max), axis=1)
+
+
+def _exact_skellam_cdf(lams_home, lams_away, k_max, max_diff):
+    """
+    F[i, j, d] = P(H_i - A_j <= d) = Σ_k P(H_i = k) * P(A_j >= k - d)
+    """
+    ph = poisson_pmf_matrix(lams_home, k_max)
+    pa = poisson_pmf_matrix(lams_away, k_max)
+
+    # sa[j, m] = P(A_j >= m) для m = 0..k_max (+ m < 0 -> 1, m > k_max -> 0)
+    sa = 1.0 - np.cumsum(pa, axis=1) + pa
+    k = np.arange(k_max + 1)
+
+    out = np.empty((len(lams_home), len(lams_away), 2 * max_diff + 1))
+    for n, d in enumerate(range(-max_diff, max_diff + 1)):
+        m = k - d
+        shifted = np.where(m < 0, 1.0, sa[:, np.clip(m, 0, k_max)])
+        shifted = np.where(m > k_max, 0.0, shifted)
+        out[:, :, n] = ph @ shifted.T
+    return out
+
+
+def build_tables(params):
+    lam_min, step = params["lam_min"], params["step"]
+    grid = lam_min + step * np.arange(params["n_poisson"])
+    poisson_cdf = _exact_poisson_cdf(grid, params["k_max"])
+
+    sgrid = lam_min + params["skellam_step"] * np.arange(params["n_skellam"])
+    skellam_cdf = _exact_skellam_cdf(sgrid, sgrid, params["skellam_k_max"], params["max_diff"])
+
+    meta = dict(params)
+    tables = PmfTables(poisson_cdf, skellam_cdf, meta)
+    meta["max_error"] = _measure_error(tables, params)
+    tables.max_error = meta["max_error"]
+    return tables
+
+
+def _measure_error(tables, params):
+    """
+    Максимальная ошибка интерполяции — по серединам ячеек (там она наибольшая).
+    """
+    lam_min = params["lam_min"]
+
+    step = params["step"]
+    mid = lam_min + step * (np.arange(params["n_poisson"] - 1) + 0.5)
+    k = np.arange(params["k_max"] + 1)
+    exact = _exact_poisson_cdf(mid, params["k_max"])
+    approx = tables.poisson_cdf(mid[:, None], k[None, :])
+    poisson_err = float(np.max(np.abs(exact - approx)))
+
+    sstep = params["skellam_step"]
+    smid = lam_min + sstep * (np.arange(params["n_skellam"] - 1) + 0.5)
+    d = np.arange(-params["max_diff"], params["max_diff"] + 1)
+    exact = _exact_skellam_cdf(smid, smid, params["skellam_k_max"], params["max_diff"])
+    approx = tables.skellam_cdf(smid[:, None, None], smid[None, :, None], d[None, None, :])
+    skellam_err = float(np.max(np.abs(exact - approx)))
+
+    return {"poisson_cdf": poisson_err, "skellam_cdf": skellam_err}
+
+
+def load_tables(config=None, cache_dir=None, rebuild=False):
+    """
+    Таблицы из кеша на диске (mmap) или строим и сохраняем.
+    Внутри процесса — один объект на набор параметров.
+    """
+    config = CONFIG if config is None else config
+    cache_dir = config["PMF_TABLE_DIR"] if cache_dir is None else cache_dir
+
+    params = _table_params(config)
+    sig = _signature(params)
+    if not rebuild and sig in _TABLES_CACHE:
+        return _TABLES_CACHE[sig]
+
+    with _TABLES_LOCK:
+        if not rebuild and sig in _TABLES_CACHE:
+            return _TABLES_CACHE[sig]
+
+        poisson_path = os.path.join(cache_dir, f"poisson_cdf_{sig}.npy")
+        skellam_path = os.path.join(cache_dir, f"skellam_cdf_{sig}.npy")
+        meta_path = os.path.join(cache_dir, f"pmf_tables_{sig}.json")
+
+        have_files = all(os.path.exists(p) for p in (poisson_path, skellam_path, meta_path))
+        if rebuild or not have_files:
+            built = build_tables(params)
+            os.makedirs(cache_dir, exist_ok=True)
+            np.save(poisson_path, built.poisson_table)
+            np.save(skellam_path, built.skellam_table)
+            with open(meta_path, "w", encoding="utf-8") as f:
+                json.dump(built.meta, f, indent=2)
+
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        tables = PmfTables(
+            np.load(poisson_path, mmap_mode="r"),
+            np.load(skellam_path, mmap_mode="r"),
+            meta,
+        )
+        _TABLES_CACHE[sig] = tables
+        return tables
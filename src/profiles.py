@@ -0,0 +1,242 @@
+# src/profiles.py
+"""
+EWMA-профили команд по угловым (PROFILE_HALF_LIFE в CONFIG).
+
+Вместо плоских средних по всей истории — экспоненциально взвешенные:
+вес игры = 0.5 ** (игр команды после неё / half_life). Время — игры команды
+(дома и в гостях вместе): в historical.csv нет дат, порядок строк = порядок матчей.
+
+На команду и слот хранится бегущее состояние (S, W, t) — взвешенная сумма,
+сумма весов и номер игры команды при последнем обновлении:
+  home_for = HC дома, home_against = AC дома, away_for = AC в гостях, away_against = HC в гостях
+Новый матч обновляет состояние за O(1):
+  f = 0.5 ** ((g - t) / half_life);  S = f S + y;  W = f W + 1;  t = g
+Среднее слота = S / W (общий множитель затухания сокращается); for/against по
+слотам вместе — после приведения слотов к текущей игре команды.
+
+Состояние сериализуется (to_dict / save -> JSON по именам команд) вместе с числом
+учтённых строк истории и последней из них: load + дописанные строки = то же, что
+пересчёт всей истории (covers() проверяет, что история та же).
+"""
+
+import json
+import os
+
+import numpy as np
+
+SLOTS = ("home_for", "home_against", "away_for", "away_against")
+# слот -> (сторона матча, колонка угловых)
+_SLOT_SOURCES = {
+    "home_for": ("home", "hc"),
+    "home_against": ("home", "ac"),
+    "away_for": ("away", "ac"),
+    "away_against": ("away", "hc"),
+}
+
+
+class EwmaProfiles:
+    """
+    Массивы по id команды (TeamRegistry): games — сыграно игр, state[slot] — [S, W, t].
+    """
+
+    def __init__(self, half_life, n_teams=0):
+        self.half_life = float(half_life)
+        if self.half_life <= 0:
+            raise ValueError(f"half_life должен быть > 0: {half_life!r}")
+        self.rows = 0  # строк истории учтено
+        self.last = None  # последняя учтённая строка: (id хозяев, id гостей, HC, AC)
+        self.games = np.zeros(0, dtype=np.int64)
+        self.state = {slot: np.zeros((3, 0)) for slot in SLOTS}
+        self._grow(n_teams)
+
+    def _grow(self, n_teams):
+        grow = int(n_teams) - len(self.games)
+        if grow <= 0:
+            return
+        self.games = np.concatenate([self.games, np.zeros(grow, dtype=np.int64)])
+        for slot in SLOTS:
+            self.state[slot] = np.concatenate([self.state[slot], np.zeros((3, grow))], axis=1)
+
+    def _decay(self, elapsed):
+        return 0.5 ** (np.asarray(elapsed, dtype=float) / self.half_life)
+
+    # ==================================================
+    # UPDATES
+    # ==================================================
+    def update(self, home_id, away_id, hc, ac):
+        """
+        Один матч (id хозяев/гостей, -1 = пропуск; HC/AC, NaN = пропуск) — O(1).
+        """
+        home_id, away_id = int(home_id), int(away_id)
+        self._grow(max(home_id, away_id) + 1)
+        self.rows += 1
+        self.last = (home_id, away_id, float(hc), float(ac))
+        teams = {"home": home_id, "away": away_id}
+        values = {"hc": float(hc), "ac": float(ac)}
+        for team in teams.values():
+            if team >= 0:
+                self.games[team] += 1
+
+        for slot, (side, col) in _SLOT_SOURCES.items():
+            team, y = teams[side], values[col]
+            if team < 0 or np.isnan(y):
+                continue
+            s, w, t = self.state[slot][:, team]
+            g = self.games[team]
+            f = float(self._decay(g - t))
+            self.state[slot][:, team] = (f * s + y, f * w + 1.0, g)
+
+    def update_many(self, home_ids, away_ids, hc, ac):
+        """
+        Пакет матчей по порядку — то же, что update() по строкам, но векторно
+        (начальная сборка по всей истории, дописанные куски).
+        """
+        home_ids = np.asarray(home_ids, dtype=np.int64)
+        away_ids = np.asarray(away_ids, dtype=np.int64)
+        n = len(home_ids)
+        if n == 0:
+            return
+        self._grow(int(max(home_ids.max(), away_ids.max())) + 1)
+        n_teams = len(self.games)
+
+        # номер игры команды в каждой строке: игры до пакета + порядковый номер в пакете
+        ids = np.concatenate([home_ids, away_ids])
+        rows = np.concatenate([np.arange(n), np.arange(n)])
+        known = ids >= 0
+        order = np.lexsort((rows[known], ids[known]))
+        sorted_ids = ids[known][order]
+        first = np.searchsorted(sorted_ids, sorted_ids)
+        game = np.zeros(len(ids), dtype=np.int64)
+        game[np.nonzero(known)[0][order]] = self.games[sorted_ids] + np.arange(len(sorted_ids)) - first + 1
+        games = {"home": game[:n], "away": game[n:]}
+        teams = {"home": home_ids, "away": away_ids}
+        values = {"hc": np.asarray(hc, dtype=float), "ac": np.asarray(ac, dtype=float)}
+
+        for slot, (side, col) in _SLOT_SOURCES.items():
+            team, g, y = teams[side], games[side], values[col]
+            ok = (team >= 0) & ~np.isnan(y)
+            team, g, y = team[ok], g[ok], y[ok]
+            if len(team) == 0:
+                continue
+            s, w, t = self.state[slot]
+            t_new = t.copy()
+            np.maximum.at(t_new, team, g.astype(float))
+            weight = self._decay(t_new[team] - g)
+            f = self._decay(t_new - t)
+            self.state[slot] = np.stack([
+                f * s + np.bincount(team, weights=weight * y, minlength=n_teams),
+                f * w + np.bincount(team, weights=weight, minlength=n_teams),
+                t_new,
+            ])
+
+        self.games += np.bincount(ids[known], minlength=n_teams)
+        self.rows += n
+        self.last = (int(home_ids[-1]), int(away_ids[-1]), float(values["hc"][-1]), float(values["ac"][-1]))
+
+    def covers(self, home_ids, away_ids, hc, ac):
+        """
+        Состояние построено по началу этой истории (массивы строк)? Сверяется
+        последняя учтённая строка; состояние без неё (старый JSON) — только по числу строк.
+        """
+        if self.rows > len(hc):
+            return False
+        if self.last is None or self.rows == 0:
+            return True
+        i = self.rows - 1
+        row = (int(home_ids[i]), int(away_ids[i]), float(hc[i]), float(ac[i]))
+        return row[:2] == self.last[:2] and all(
+            a == b or (np.isnan(a) and np.isnan(b)) for a, b in zip(row[2:], self.last[2:])
+        )
+
+    # ==================================================
+    # MEANS
+    # ==================================================
+    def means(self, ids=None):
+        """
+        Средние по командам ids (по умолчанию все), NaN — нет игр в слоте:
+          home_for ... away_against — средние слотов,
+          for_avg / against_avg     — свои / допущенные угловые дома и в гостях вместе
+                                      (NaN, если нет хотя бы одного из двух).
+        """
+        ids = np.arange(len(self.games)) if ids is None else np.asarray(ids, dtype=np.int64)
+        now = self.games[ids]
+        out = {}
+        weighted = {}
+        with np.errstate(invalid="ignore", divide="ignore"):
+            for slot in SLOTS:
+                s, w, t = self.state[slot][:, ids]
+                out[slot] = np.where(w > 0, s / w, np.nan)
+                f = self._decay(now - t)
+                weighted[slot] = (f * s, f * w)
+            for key, (a, b) in (("for_avg", ("home_for", "away_for")), ("against_avg", ("home_against", "away_against"))):
+                s = weighted[a][0] + weighted[b][0]
+                w = weighted[a][1] + weighted[b][1]
+                out[key] = np.where(w > 0, s / w, np.nan)
+        has_profile = ~np.isnan(out["for_avg"]) & ~np.isnan(out["against_avg"])
+        out["for_avg"] = np.where(has_profile, out["for_avg"], np.nan)
+        out["against_avg"] = np.where(has_profile, out["against_avg"], np.nan)
+        return out
+
+    # ==================================================
+    # SERIALIZATION
+    # ==================================================
+    def to_dict(self, names):
+        """
+        -> JSON-совместимый dict; names — имена команд по id (registry.names).
+        """
+        teams = {}
+        for team_id in np.nonzero(self.games > 0)[0]:
+            entry = {"games": int(self.games[team_id])}
+            for slot in SLOTS:
+                entry[slot] = [float(v) for v in self.state[slot][:, team_id]]
+            teams[str(names[team_id])] = entry
+        data = {"half_life": self.half_life, "rows": int(self.rows), "teams": teams}
+        if self.last is not None:
+            home_id, away_id, hc, ac = self.last
+            data["last"] = [
+                str(names[home_id]) if home_id >= 0 else None,
+                str(names[away_id]) if away_id >= 0 else None,
+                hc, ac,
+            ]
+        return data
+
+    @classmethod
+    def from_dict(cls, data, registry):
+        """
+        dict из to_dict -> состояние по id registry (команды, которых нет в реестре, пропускаются).
+        """
+        profiles = cls(data["half_life"], len(registry))
+        profiles.rows = int(data["rows"])
+        if data.get("last") is not None:
+            home, away, hc, ac = data["last"]
+            profiles.last = (
+                -1 if home is None else registry.lookup(home),
+                -1 if away is None else registry.lookup(away),
+                float(hc), float(ac),
+            )
+        for name, entry in data["teams"].items():
+            team_id = registry.lookup(name)
+            if team_id < 0:
+                continue
+            profiles._grow(team_id + 1)
+            profiles.games[team_id] = int(entry["games"])
+            for slot in SLOTS:
+                profiles.state[slot][:, team_id] = entry[slot]
+        return profiles
+
+    def save(self, path, names):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(names), f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+
+def load_ewma_state(path):
+    """
+    JSON-состояние (EwmaProfiles.save) -> dict или None (нет файла).
+    """
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
@@ -0,0 +1,188 @@
+# src/profiling.py
+"""
+Встроенное профилирование расчёта (predict.py --profile, переключатель в app.py).
+
+  cprofile — cProfile (каждый вызов): reports/<name>_<время>.pstats + .collapsed
+  sample   — семплирующий профайлер: стек целевого потока каждые PROFILE_INTERVAL сек
+             (почти без накладных расходов на горячих циклах): .collapsed
+
+.collapsed — "f1;f2;f3 N" по строке на стек (flamegraph.pl, speedscope, inferno).
+У cProfile полных стеков нет: стек функции восстанавливается по самому
+тяжёлому (по cumtime) вызывающему, вес — собственное время в мкс.
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+
+from src.config import CONFIG
+
+PROFILE_MODES = ("cprofile", "sample")
+
+
+def _label(filename, name):
+    """
+    (файл, функция) -> "src/calculator.py:_monte_carlo_simulation"
+    (файлы вне проекта — пакет/файл, например "pandas/__init__.py"; встроенные — как есть).
+    """
+    if not filename or filename.startswith("<") or filename == "~":
+        return name
+    path = os.path.relpath(filename)
+    if path.startswith(".."):
+        path = "/".join(filename.replace(os.sep, "/").split("/")[-2:])
+    return f"{path}:{name}"
+
+
+class SamplingProfiler:
+    """
+    Фоновый поток раз в interval сек снимает стек потока thread_id
+    (по умолчанию — того, кто вызвал start()) через sys._current_frames().
+    Стек обрезается на кадре, из которого вызван start() (сам вызывающий не пишется).
+    """
+
+    def __init__(self, interval=None, thread_id=None):
+        self.interval = CONFIG["PROFILE_INTERVAL"] if interval is None else float(interval)
+        self.thread_id = thread_id
+        self.stacks = Counter()  # (корень, ..., лист) -> число семплов
+        self._stop = threading.Event()
+        self._thread = None
+        self._root = None
+
+    def start(self):
+        if self.thread_id is None:
+            self.thread_id = threading.get_ident()
+            self._root = sys._getframe(1)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and frame is not self._root:
+                stack.append(_label(frame.f_code.co_filename, frame.f_code.co_name))
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += 1
+
+    def collapsed(self):
+        return [f"{';'.join(stack)} {n}" for stack, n in self.stacks.most_common()]
+
+    def top(self, n=None):
+        """
+        -> [(функция, включительно сек, собственное сек)] по убыванию включительного времени.
+        """
+        inclusive = Counter()
+        own = Counter()
+        for stack, count in self.stacks.items():
+            for label in set(stack):
+                inclusive[label] += count
+            own[stack[-1]] += count
+        rows = [(label, inclusive[label] * self.interval, own[label] * self.interval) for label in inclusive]
+        rows.sort(key=lambda r: -r[1])
+        return rows[:n]
+
+
+def _cprofile_collapsed(stats):
+    """
+    pstats.Stats -> строки .collapsed: стек функции — цепочка самых тяжёлых
+    вызывающих до корня, вес — собственное время (мкс).
+    """
+    entries = stats.stats
+    lines = []
+    for func, (_, _, tottime, _, callers) in entries.items():
+        weight = int(tottime * 1e6)
+        if weight <= 0:
+            continue
+        stack = [func]
+        seen = {func}
+        while callers:
+            parent = max(callers, key=lambda c: callers[c][3])
+            if parent in seen or parent not in entries:
+                break
+            stack.append(parent)
+            seen.add(parent)
+            callers = entries[parent][4]
+        labels = [_label(f[0], f[2]) for f in reversed(stack)]
+        lines.append(f"{';'.join(labels)} {weight}")
+    return lines
+
+
+def _cprofile_top(stats, n=None):
+    """
+    -> [(функция, cumtime, tottime, ncalls)] по убыванию cumtime.
+    """
+    rows = [
+        (_label(func[0], func[2]), cumtime, tottime, ncalls)
+        for func, (_, ncalls, tottime, cumtime, _) in stats.stats.items()
+    ]
+    rows.sort(key=lambda r: -r[1])
+    return rows[:n]
+
+
+def _write_lines(path, lines):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + ("\n" if lines else ""))
+
+
+def profile_call(fn, *args, mode="cprofile", name="profile", out_dir="reports", top=None, log=print, **kwargs):
+    """
+    Вызывает fn(*args, **kwargs) под профайлером mode, сохраняет файлы в out_dir
+    и печатает top горячих функций по включительному (cumulative) времени.
+
+    Возвращает (результат fn, отчёт): отчёт — dict mode, files, top
+    (строки: function, cumulative_s, own_s[, calls]), wall_s.
+    """
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Неизвестный профайлер: {mode!r} (есть: {PROFILE_MODES})")
+    top = CONFIG["PROFILE_TOP"] if top is None else int(top)
+    os.makedirs(out_dir, exist_ok=True)
+    base = os.path.join(out_dir, f"{name}_{time.strftime('%Y%m%d_%H%M%S')}")
+
+    start = time.perf_counter()
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        try:
+            result = profiler.runcall(fn, *args, **kwargs)
+        finally:
+            wall = time.perf_counter() - start
+            stats = pstats.Stats(profiler, stream=io.StringIO())
+            stats.dump_stats(base + ".pstats")
+            _write_lines(base + ".collapsed", _cprofile_collapsed(stats))
+        files = [base + ".pstats", base + ".collapsed"]
+        rows = [
+            {"function": f, "cumulative_s": cum, "own_s": own, "calls": calls}
+            for f, cum, own, calls in _cprofile_top(stats, top)
+        ]
+    else:
+        profiler = SamplingProfiler().start()
+        try:
+            result = fn(*args, **kwargs)
+        finally:
+            profiler.stop()
+            wall = time.perf_counter() - start
+            _write_lines(base + ".collapsed", profiler.collapsed())
+        files = [base + ".collapsed"]
+        rows = [{"function": f, "cumulative_s": cum, "own_s": own} for f, cum, own in profiler.top(top)]
+
+    log(f"\n⏱️  Профиль ({mode}), {wall:.2f} с — топ {len(rows)} по cumulative:")
+    for r in rows:
+        calls = f"  {r['calls']:>9}" if "calls" in r else ""
+        log(f"  {r['cumulative_s']:9.3f}  {r['own_s']:9.3f}{calls}  {r['function']}")
+    for path in files:
+        log(f"💾 {path}")
+    return result, {"mode": mode, "files": files, "top": rows, "wall_s": wall}
@@ -0,0 +1,162 @@
+# src/ratings.py
+"""
+Рейтинги команд по угловым из истории -> team_strength.csv.
+
+Мультипликативная модель (Poisson, log-link):
+  HC ~ Poisson(base_home * attack[хозяева] * defence[гости])
+  AC ~ Poisson(base_away * attack[гости]   * defence[хозяева])
+attack > 1 — подаёт больше угловых, defence > 1 — больше допускает.
+
+Максимум правдоподобия — поочерёдные точные обновления блоков attack/defence/base
+(покоординатный IRLS для log-link): разреженная матрица команда x матч
+не строится, её строки — массивы id, суммы по столбцам — np.bincount.
+Итерация O(матчей), тысячи команд сходятся за доли секунды.
+Приор: prior_games псевдо-матчей с рейтингом 1.0 (мало игр -> ближе к 1).
+
+Strength = sqrt(attack / defence), среднее геометрическое по командам = 1.
+"""
+
+import csv
+import os
+
+import numpy as np
+
+from src.config import CONFIG
+
+
+def fit_team_ratings(home_ids, away_ids, hc, ac, n_teams, init=None, prior_games=None, tol=1e-9, max_iter=1000):
+    """
+    home_ids/away_ids — id команд (-1 = пропуск), hc/ac — угловые (NaN = пропуск).
+    init — (attack, defence) прошлого решения для тёплого старта (длина <= n_teams,
+    новые команды стартуют с 1.0).
+
+    Возвращает dict: attack, defence, games (массивы по id), base_home, base_away, n_iter.
+    """
+    prior_games = CONFIG["RATING_PRIOR_GAMES"] if prior_games is None else float(prior_games)
+    home_ids = np.asarray(home_ids, dtype=np.int64)
+    away_ids = np.asarray(away_ids, dtype=np.int64)
+    hc = np.asarray(hc, dtype=float)
+    ac = np.asarray(ac, dtype=float)
+
+    # наблюдение = (кто подаёт, против кого, хозяева ли, угловые)
+    ok_h = (home_ids >= 0) & (away_ids >= 0) & ~np.isnan(hc)
+    ok_a = (home_ids >= 0) & (away_ids >= 0) & ~np.isnan(ac)
+    att_id = np.concatenate([home_ids[ok_h], away_ids[ok_a]])
+    def_id = np.concatenate([away_ids[ok_h], home_ids[ok_a]])
+    is_home = np.concatenate([np.ones(ok_h.sum(), bool), np.zeros(ok_a.sum(), bool)])
+    y = np.concatenate([hc[ok_h], ac[ok_a]])
+
+    attack = np.ones(n_teams)
+    defence = np.ones(n_teams)
+    if init is not None:
+        n_init = min(n_teams, len(init[0]))
+        attack[:n_init] = np.asarray(init[0], dtype=float)[:n_init]
+        defence[:n_init] = np.asarray(init[1], dtype=float)[:n_init]
+
+    y_for = np.bincount(att_id, weights=y, minlength=n_teams)
+    y_against = np.bincount(def_id, weights=y, minlength=n_teams)
+    games = np.bincount(att_id, minlength=n_teams)
+    y_home, y_away = y[is_home].sum(), y[~is_home].sum()
+    rate = attack[att_id] * defence[def_id]
+    base_home = y_home / max(rate[is_home].sum(), 1e-12)
+    base_away = y_away / max(rate[~is_home].sum(), 1e-12)
+
+    n_iter = 0
+    for n_iter in range(1, max_iter + 1):
+        prev_attack, prev_defence = attack, defence
+        base = np.where(is_home, base_home, base_away)
+
+        # attack: Σ угловых / Σ ожидаемых при attack = 1 (+ приор к 1.0)
+        expected = np.bincount(att_id, weights=base * defence[def_id], minlength=n_teams)
+        attack = (y_for + prior_games * expected / np.maximum(games, 1)) / (
+            expected + prior_games * expected / np.maximum(games, 1)
+        )
+        attack = np.where(games > 0, attack, 1.0)
+
+        expected = np.bincount(def_id, weights=base * attack[att_id], minlength=n_teams)
+        games_against = np.bincount(def_id, minlength=n_teams)
+        defence = (y_against + prior_games * expected / np.maximum(games_against, 1)) / (
+            expected + prior_games * expected / np.maximum(games_against, 1)
+        )
+        defence = np.where(games_against > 0, defence, 1.0)
+
+        # нормировка: среднее геометрическое attack/defence = 1, масштаб — в base
+        played = games > 0
+        if played.any():
+            attack = attack / np.exp(np.log(attack[played]).mean())
+            defence = defence / np.exp(np.log(defence[games_against > 0]).mean())
+
+        rate = attack[att_id] * defence[def_id]
+        base_home = y_home / max(rate[is_home].sum(), 1e-12)
+        base_away = y_away / max(rate[~is_home].sum(), 1e-12)
+
+        change = max(np.max(np.abs(attack - prev_attack), initial=0.0), np.max(np.abs(defence - prev_defence), initial=0.0))
+        if change < tol:
+            break
+
+    return {
+        "attack": attack,
+        "defence": defence,
+        "games": games,
+        "base_home": float(base_home),
+        "base_away": float(base_away),
+        "n_iter": n_iter,
+    }
+
+
+def strength_from_ratings(attack, defence, played=None):
+    """
+    Strength для _calculate_lambdas: sqrt(attack / defence),
+    среднее геометрическое по played (по умолчанию по всем) = 1.
+    """
+    strength = np.sqrt(np.asarray(attack, dtype=float) / np.asarray(defence, dtype=float))
+    played = np.ones(len(strength), bool) if played is None else np.asarray(played, bool)
+    if not played.any():
+        return strength
+    return strength / np.exp(np.log(strength[played]).mean())
+
+
+def load_ratings(path, registry):
+    """
+    Прошлое решение (write_team_strength) -> (attack, defence) по id реестра
+    для тёплого старта; нет файла / колонок Attack/Defence -> None.
+    """
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        rows = list(csv.DictReader(f))
+    if not rows or "Attack" not in rows[0] or "Defence" not in rows[0]:
+        return None
+
+    attack = np.ones(len(registry))
+    defence = np.ones(len(registry))
+    for row in rows:
+        team_id = registry.lookup(row["Team"])
+        if team_id >= 0:
+            attack[team_id] = float(row["Attack"])
+            defence[team_id] = float(row["Defence"])
+    return attack, defence
+
+
+def write_team_strength(path, registry, ratings):
+    """
+    Team,Strength,Attack,Defence,Games (команды без игр не пишутся).
+    """
+    strength = strength_from_ratings(ratings["attack"], ratings["defence"], ratings["games"] > 0)
+    order = np.argsort(-strength, kind="stable")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Team", "Strength", "Attack", "Defence", "Games"])
+        for i in order:
+            if ratings["games"][i] == 0:
+                continue
+            writer.writerow([
+                registry.names[i],
+                f"{strength[i]:.4f}",
+                f"{ratings['attack'][i]:.6f}",
+                f"{ratings['defence'][i]:.6f}",
+                int(ratings["games"][i]),
+            ])
+    os.replace(tmp_path, path)
@@ -0,0 +1,333 @@
+# src/results.py
+"""
+Компактный результат расчёта матча.
+
+MatchPrice — слоты + массивы фиксированной раскладки вместо вложенных dict:
+  values — float поля (λ, strength, form, anchor_scale, вероятности 1X2),
+  odds   — коэффициенты рынков в порядке MarketLayout (NaN = коэффициента нет).
+Раскладка одна на набор линий (market_layout(config)), поэтому запись,
+валидатор и app берут значения по индексам, не разбирая строковые ключи.
+
+Для старого кода MatchPrice читается как dict (Mapping) с теми же ключами
+и вложенными dict рынков, что и прежний результат calculate_match_odds
+(вложенные dict собираются только при обращении).
+
+PriceBatch — пакет матчей в одной матрице [матчи x (поля + рынки)]:
+строки — MatchPrice-представления без копии, to_frame() — DataFrame без копии.
+"""
+
+from collections.abc import Mapping
+
+import numpy as np
+
+# float поля MatchPrice.values (p_* — вероятности 1X2 внутри "odds_1x2")
+FLOAT_FIELDS = (
+    "lambda_home", "lambda_away", "expected_total",
+    "base_lambda_home", "base_lambda_away", "strength_home", "strength_away", "strength_ratio",
+    "form_home", "form_away", "anchor_scale",
+    "p_home", "p_draw", "p_away",
+)
+_FIELD_INDEX = {k: i for i, k in enumerate(FLOAT_FIELDS)}
+
+MARKET_SECTIONS = ("odds_1x2", "handicaps", "totals", "individual_home", "individual_away")
+
+# ключи верхнего уровня в порядке прежнего dict calculate_match_odds
+RESULT_KEYS = (
+    "lambda_home", "lambda_away", "expected_total", "favorite",
+    "base_lambda_home", "base_lambda_away", "strength_home", "strength_away", "strength_ratio",
+    "form_home", "form_away",
+    "anchor_line", "anchor_scale",
+) + MARKET_SECTIONS
+_TOP_FLOATS = {k: _FIELD_INDEX[k] for k in RESULT_KEYS if k in _FIELD_INDEX}
+
+HANDICAP_NAMES = {"HomeTeam": "1-я команда (Дома)", "AwayTeam": "2-я команда (Гости)"}
+
+
+def _handicap_values(handicap_lines):
+    """
+    Уникальные неотрицательные значения фор (0, 1.5, 2.5 -> ±1.5, ±2.5 на выводе).
+    """
+    values = []
+    for h in handicap_lines:
+        h = abs(float(h))
+        if h not in values:
+            values.append(h)
+    return values
+
+
+def handicap_keys(handicap_lines):
+    """
+    Ключи фор в порядке вывода: F(0), F(-h)..., F(+h)...
+    """
+    values = _handicap_values(handicap_lines)
+    positive = [h for h in values if h != 0]
+    keys = ["F(0)"] if 0 in values else []
+    keys.extend(f"F(-{h:g})" for h in positive)
+    keys.extend(f"F(+{h:g})" for h in positive)
+    return keys
+
+
+class MarketLayout:
+    """
+    Порядок рынков в MatchPrice.odds для набора линий. Для рынка i:
+      keys[i]     — ключ как в _market_probabilities (P1, HomeTeam_F(-1.5), Over_8.5, Home_IT_3.5_over)
+      columns[i]  — колонка плоской таблицы (Corners_P1, Handicap_HomeTeam_F(-1.5), Total_Over_8.5, ...)
+      sections[i], teams[i], labels[i] — путь во вложенном dict (teams — только у фор)
+    Порядок совпадает с порядком ключей прежнего вложенного dict и колонок ResultWriter.
+    """
+
+    __slots__ = (
+        "keys", "columns", "sections", "teams", "labels", "index",
+        "groups", "handicap_lines", "total_lines", "it_lines",
+    )
+
+    def __init__(self, handicap_lines, total_lines, it_lines):
+        self.handicap_lines = tuple(handicap_lines)
+        self.total_lines = tuple(total_lines)
+        self.it_lines = tuple(it_lines)
+
+        entries = [("odds_1x2", None, k, k, f"Corners_{k}") for k in ("P1", "X", "P2")]
+        for team in ("HomeTeam", "AwayTeam"):
+            for k in handicap_keys(self.handicap_lines):
+                entries.append(("handicaps", team, k, f"{team}_{k}", f"Handicap_{team}_{k}"))
+        for line in self.total_lines:
+            for side in ("Over", "Under"):
+                key = f"{side}_{line}"
+                entries.append(("totals", None, key, key, f"Total_{key}"))
+        for prefix, section in (("Home", "individual_home"), ("Away", "individual_away")):
+            for line in self.it_lines:
+                for side in ("over", "under"):
+                    key = f"IT_{line}_{side}"
+                    entries.append((section, None, key, f"{prefix}_{key}", f"{prefix}_{key}"))
+
+        self.sections, self.teams, self.labels, self.keys, self.columns = (tuple(x) for x in zip(*entries))
+        self.index = {k: i for i, k in enumerate(self.keys)}
+
+        # (section, team) -> (start, stop): рынки группы идут подряд
+        self.groups = {}
+        for i, group in enumerate(zip(self.sections, self.teams)):
+            start, _ = self.groups.get(group, (i, i))
+            self.groups[group] = (start, i + 1)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def line_ladder(self, section):
+        """
+        Тоталы/ИТ секции -> [(линия, индекс over, индекс under)] по возрастанию линии.
+        """
+        lines = self.total_lines if section == "totals" else self.it_lines
+        prefix = {"totals": "", "individual_home": "Home_", "individual_away": "Away_"}[section]
+        if section == "totals":
+            fmt = ("Over_{}", "Under_{}")
+        else:
+            fmt = ("IT_{}_over", "IT_{}_under")
+        return [
+            (line, self.index[prefix + fmt[0].format(line)], self.index[prefix + fmt[1].format(line)])
+            for line in sorted(lines)
+        ]
+
+    def handicap_ladder(self, team):
+        """
+        Форы стороны -> [(значение, ключ F(h), индекс)] по возрастанию форы.
+        """
+        start, stop = self.groups.get(("handicaps", team), (0, 0))
+        ladder = [(float(self.labels[i][2:-1]), self.labels[i], i) for i in range(start, stop)]
+        return sorted(ladder, key=lambda x: x[0])
+
+
+_LAYOUTS = {}
+
+
+def market_layout(config):
+    """
+    Раскладка рынков для линий config (одна на набор линий — кэш).
+    """
+    lines = (config["HANDICAP_LINES"], config["TOTAL_LINES"], config["IT_LINES"])
+    key = tuple(tuple(str(x) for x in values) for values in lines)
+    layout = _LAYOUTS.get(key)
+    if layout is None:
+        layout = _LAYOUTS[key] = MarketLayout(*lines)
+    return layout
+
+
+def _none_if_nan(values):
+    return [None if v != v else v for v in values]
+
+
+class MatchPrice(Mapping):
+    """
+    Результат одного матча: values/odds — float массивы (могут быть строкой PriceBatch),
+    favorite/anchor_line — как в прежнем dict, extra — необязательные поля
+    (probabilities/sensitivities из calculate_match_odds(..., with_sensitivities=True)).
+
+        price["lambda_home"], price["handicaps"]["HomeTeam"]["F(-1.5)"]   # как раньше
+        price.odds[price.layout.index["HomeTeam_F(-1.5)"]]                  # без dict
+    """
+
+    __slots__ = ("layout", "values", "odds", "favorite", "anchor_line", "extra")
+
+    def __init__(self, layout, values, odds, favorite, anchor_line=None, extra=None):
+        self.layout = layout
+        self.values = values
+        self.odds = odds
+        self.favorite = favorite
+        self.anchor_line = anchor_line
+        self.extra = extra
+
+    @classmethod
+    def from_arrays(cls, layout, fields, odds, favorite, anchor_line=None, extra=None):
+        """
+        fields — значения FLOAT_FIELDS по порядку, odds — коэффициенты в порядке layout.keys.
+        """
+        data = np.empty(len(FLOAT_FIELDS) + len(layout))
+        data[:len(FLOAT_FIELDS)] = fields
+        data[len(FLOAT_FIELDS):] = odds
+        return cls(layout, data[:len(FLOAT_FIELDS)], data[len(FLOAT_FIELDS):], favorite, anchor_line, extra)
+
+    # ---------------- dict-представление ----------------
+    def __getitem__(self, key):
+        i = _TOP_FLOATS.get(key)
+        if i is not None:
+            return float(self.values[i])
+        if key == "favorite":
+            return self.favorite
+        if key == "anchor_line":
+            return self.anchor_line
+        if key in MARKET_SECTIONS:
+            return self.section(key)
+        if self.extra is not None and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in RESULT_KEYS or (self.extra is not None and key in self.extra)
+
+    def __iter__(self):
+        yield from RESULT_KEYS
+        if self.extra:
+            yield from self.extra
+
+    def __len__(self):
+        return len(RESULT_KEYS) + len(self.extra or ())
+
+    def __repr__(self):
+        return (
+            f"MatchPrice(lambda_home={self['lambda_home']:.3f}, lambda_away={self['lambda_away']:.3f}, "
+            f"markets={len(self.layout)})"
+        )
+
+    def section(self, name):
+        """
+        Вложенный dict рынка (как в прежнем результате), NaN -> None.
+        """
+        layout = self.layout
+        if name == "handicaps":
+            out = {}
+            for team in ("HomeTeam", "AwayTeam"):
+                start, stop = layout.groups.get((name, team), (0, 0))
+                out[team] = {"name": HANDICAP_NAMES[team]}
+                out[team].update(zip(layout.labels[start:stop], _none_if_nan(self.odds[start:stop].tolist())))
+            return out
+
+        start, stop = layout.groups.get((name, None), (0, 0))
+        out = dict(zip(layout.labels[start:stop], _none_if_nan(self.odds[start:stop].tolist())))
+        if name == "odds_1x2":
+            for k in ("p_home", "p_draw", "p_away"):
+                out[k] = float(self.values[_FIELD_INDEX[k]])
+        return out
+
+    def to_dict(self):
+        """
+        Полная копия в виде обычного вложенного dict (json, манифест).
+        """
+        return {k: self[k] for k in self}
+
+
+def as_dict(result):
+    """
+    MatchPrice -> dict, dict/прочее -> как есть.
+    """
+    return result.to_dict() if isinstance(result, MatchPrice) else result
+
+
+class PriceBatch:
+    """
+    Пакет матчей: data [матчи x (FLOAT_FIELDS + рынки layout)], строки растут по мере append.
+
+        batch = PriceBatch(layout)
+        batch.append(home, away, price)
+        batch[i]          # MatchPrice (представление строки, без копии)
+        batch.to_frame()  # DataFrame поверх той же матрицы
+    """
+
+    __slots__ = ("layout", "data", "home", "away", "favorite", "anchor_line", "n")
+
+    def __init__(self, layout, capacity=16):
+        self.layout = layout
+        self.data = np.empty((max(1, int(capacity)), len(FLOAT_FIELDS) + len(layout)))
+        self.home = []
+        self.away = []
+        self.favorite = []
+        self.anchor_line = []
+        self.n = 0
+
+    @classmethod
+    def from_arrays(cls, layout, fields, odds, favorite, anchor_line=None, home=None, away=None):
+        """
+        fields — [матчи x FLOAT_FIELDS], odds — [матчи x рынки] (сразу для всего пакета).
+        """
+        n = len(favorite)
+        batch = cls(layout, n)
+        batch.data[:n, :len(FLOAT_FIELDS)] = fields
+        batch.data[:n, len(FLOAT_FIELDS):] = odds
+        batch.favorite = list(favorite)
+        batch.anchor_line = [None] * n if anchor_line is None else list(anchor_line)
+        batch.home = [None] * n if home is None else list(home)
+        batch.away = [None] * n if away is None else list(away)
+        batch.n = n
+        return batch
+
+    def append(self, home_team, away_team, price):
+        if price.layout is not self.layout:
+            raise ValueError("MatchPrice с другой раскладкой рынков")
+        if self.n == len(self.data):
+            self.data = np.concatenate([self.data, np.empty_like(self.data)])
+        self.data[self.n, :len(FLOAT_FIELDS)] = price.values
+        self.data[self.n, len(FLOAT_FIELDS):] = price.odds
+        self.home.append(home_team)
+        self.away.append(away_team)
+        self.favorite.append(price.favorite)
+        self.anchor_line.append(price.anchor_line)
+        self.n += 1
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, i):
+        if not -self.n <= i < self.n:
+            raise IndexError(i)
+        i %= self.n
+        row = self.data[i]
+        return MatchPrice(
+            self.layout, row[:len(FLOAT_FIELDS)], row[len(FLOAT_FIELDS):],
+            self.favorite[i], self.anchor_line[i],
+        )
+
+    def __iter__(self):
+        for i in range(self.n):
+            yield self[i]
+
+    def to_frame(self):
+        """
+        DataFrame поверх матрицы пакета (float колонки без копии):
+        HomeTeam, AwayTeam, FLOAT_FIELDS (favorite, anchor_line — строками/объектами), рынки по layout.columns.
+        """
+        import pandas as pd
+
+        df = pd.DataFrame(self.data[:self.n], columns=list(FLOAT_FIELDS) + list(self.layout.columns), copy=False)
+        df.insert(0, "HomeTeam", self.home)
+        df.insert(1, "AwayTeam", self.away)
+        df.insert(5, "favorite", self.favorite)
+        df.insert(df.columns.get_loc("anchor_scale"), "anchor_line", pd.Series(self.anchor_line, dtype=object))
+        return df
@@ -0,0 +1,125 @@
+# src/season.py
+"""
+Симуляция оставшегося сезона по угловым (outright-рынки).
+
+λ всех оставшихся матчей берутся одним пакетом (CornerOddsCalculator.fixture_lambdas),
+дальше выборки Poisson рисуются сразу матрицей [симуляции x матчи] кусками
+(память ограничена SEASON_CHUNK_DRAWS), по каждому куску копятся:
+  - распределение итогового тотала угловых команды (гистограмма),
+  - доля симуляций, где команда подала больше всех (дележ при равенстве),
+  - распределение места команды в таблице угловых.
+"""
+
+import numpy as np
+import pandas as pd
+
+from src.config import CONFIG
+
+
+def simulate_season(
+    home_teams,
+    away_teams,
+    lambdas_home,
+    lambdas_away,
+    n_simulations=None,
+    base_totals=None,
+    chunk_draws=None,
+    seed=0,
+):
+    """
+    home_teams/away_teams/lambdas_* — оставшиеся матчи (в одном порядке).
+    base_totals — {команда: угловые на сегодня} (к симуляции прибавляется).
+
+    Возвращает dict:
+      teams        — команды (порядок строк во всех массивах)
+      base         — угловые на сегодня
+      totals_hist  — [команда, тотал]: доля симуляций с таким итоговым тоталом
+      p_most       — P(больше всех угловых), равенство делится поровну
+      rank_probs   — [команда, место]: P(место), место 0 = больше всех
+      n            — число симуляций
+    """
+    n_simulations = CONFIG["SEASON_SIMULATIONS"] if n_simulations is None else int(n_simulations)
+    chunk_draws = CONFIG["SEASON_CHUNK_DRAWS"] if chunk_draws is None else int(chunk_draws)
+    base_totals = base_totals or {}
+
+    home_teams = [str(t) for t in home_teams]
+    away_teams = [str(t) for t in away_teams]
+    teams = list(dict.fromkeys(home_teams + away_teams + list(base_totals)))
+    index = {t: i for i, t in enumerate(teams)}
+    n_teams, n_fixtures = len(teams), len(home_teams)
+
+    lambdas_home = np.asarray(lambdas_home, dtype=float)
+    lambdas_away = np.asarray(lambdas_away, dtype=float)
+    base = np.array([float(base_totals.get(t, 0.0)) for t in teams])
+
+    # матч -> команда: матрицы [матчи, команды], угловые команды = выборки @ матрица
+    home_map = np.zeros((n_fixtures, n_teams))
+    away_map = np.zeros((n_fixtures, n_teams))
+    home_map[np.arange(n_fixtures), [index[t] for t in home_teams]] = 1.0
+    away_map[np.arange(n_fixtures), [index[t] for t in away_teams]] = 1.0
+
+    rng = np.random.default_rng(seed)
+    chunk = max(1, chunk_draws // max(1, 2 * n_fixtures))
+
+    hist = np.zeros((n_teams, 1))
+    p_most = np.zeros(n_teams)
+    rank_counts = np.zeros((n_teams, n_teams))
+
+    done = 0
+    while done < n_simulations:
+        size = min(chunk, n_simulations - done)
+        home = rng.poisson(lambdas_home, size=(size, n_fixtures)).astype(float)
+        away = rng.poisson(lambdas_away, size=(size, n_fixtures)).astype(float)
+        totals = base + home @ home_map + away @ away_map  # [симуляции, команды]
+
+        # гистограмма итоговых тоталов (растёт по мере надобности)
+        ints = np.rint(totals - base).astype(np.int64)
+        width = int(ints.max()) + 1 if ints.size else 1
+        if width > hist.shape[1]:
+            hist = np.pad(hist, ((0, 0), (0, width - hist.shape[1])))
+        flat = np.bincount((np.arange(n_teams) * hist.shape[1] + ints).ravel(), minlength=hist.size)
+        hist += flat.reshape(hist.shape)
+
+        # больше всех: при равенстве доля 1/k каждому
+        top = totals == totals.max(axis=1, keepdims=True)
+        p_most += (top / top.sum(axis=1, keepdims=True)).sum(axis=0)
+
+        # места: случайный разбор равенств
+        order = np.lexsort((rng.random(totals.shape), -totals), axis=1)
+        ranks = np.empty_like(order)
+        ranks[np.arange(size)[:, None], order] = np.arange(n_teams)[None, :]
+        for r in range(n_teams):
+            rank_counts[:, r] += (ranks == r).sum(axis=0)
+
+        done += size
+
+    return {
+        "teams": teams,
+        "base": base,
+        "totals_hist": hist / n_simulations,
+        "p_most": p_most / n_simulations,
+        "rank_probs": rank_counts / n_simulations,
+        "n": n_simulations,
+    }
+
+
+def season_table(result, total_lines=()):
+    """
+    Итог simulate_season -> таблица по командам (по убыванию P(больше всех)):
+    team, base, expected_total, p_most, expected_rank (1 = первое место),
+    over_<line> — P(итоговый тотал команды > line).
+    """
+    hist = result["totals_hist"]
+    remaining = np.arange(hist.shape[1])
+    table = pd.DataFrame({
+        "team": result["teams"],
+        "base": result["base"],
+        "expected_total": result["base"] + hist @ remaining,
+        "p_most": result["p_most"],
+        "expected_rank": result["rank_probs"] @ np.arange(1, len(result["teams"]) + 1),
+    })
+    for line in total_lines:
+        # итог = base + remaining > line  <=>  remaining > line - base
+        over = remaining[None, :] > (float(line) - result["base"])[:, None]
+        table[f"over_{line:g}"] = (hist * over).sum(axis=1)
+    return table.sort_values(["p_most", "expected_total"], ascending=False).reset_index(drop=True)
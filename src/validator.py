@@ -2,117 +2,292 @@
 Валидатор для проверки логичности динамических коэффициентов
 """
 
+from __future__ import annotations
+
+import re
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from src.config import PricingConfig
+from src.results import HANDICAP_NAMES, MatchPrice, market_layout
+
+# pandas — только для аннотаций (импорт внутри функций, где он нужен)
+if TYPE_CHECKING:
+    import pandas as pd
+
+# колонки плоской таблицы результатов (MarketLayout.columns / reports/predictions.csv)
+_HANDICAP_COL_RE = re.compile(r'^Handicap_(HomeTeam|AwayTeam|Team1|Team2)_F\(([+-]?\d+(?:\.\d+)?)\)$')
+_TOTAL_COL_RE = re.compile(r'^Total_(Over|Under)_(\d+(?:\.\d+)?)$')
+_IT_COL_RE = re.compile(r'^(Home|Away)_IT_(\d+(?:\.\d+)?)_(over|under)$')
+
+_1X2_COLS = ["Corners_P1", "Corners_X", "Corners_P2"]
+
+_WARNING_COLUMNS = [
+    "row", "HomeTeam", "AwayTeam", "market", "check",
+    "column", "ref_column", "value", "ref_value", "message",
+]
+
+# пары сторон для проверки маржи фор: Home F(h) <-> Away F(-h)
+_OPPOSITE_SIDE = {"HomeTeam": "AwayTeam", "Team1": "Team2"}
+
+_LADDER_TITLES = {"Total": "Тотал", "IT_Home": "ИТ хозяев", "IT_Away": "ИТ гостей"}
+_SIDE_LABELS = {"over": "Больше", "under": "Меньше"}
+
+# набор колонок -> правила (один на раскладку/таблицу — кэш)
+_RULES = {}
+
+
+def _market_rules(columns):
+    """
+    Единый набор правил по названиям колонок плоской таблицы (validate и
+    validate_batch). Линии берутся из колонок, а не из CONFIG.
+
+    Правило — dict:
+      check="monotonic": cols (по возрастанию линии), labels, increasing,
+                         title/verb для сообщения
+      check="overround": cols (исходы одного рынка), title
+    плюс market (метка рынка в отчёте validate_batch).
+    """
+    columns = tuple(columns)
+    rules = _RULES.get(columns)
+    if rules is not None:
+        return rules
+
+    handicap_ladders = {}
+    total_ladders = {}
+    for col in columns:
+        m = _HANDICAP_COL_RE.match(col)
+        if m:
+            handicap_ladders.setdefault(m.group(1), []).append((float(m.group(2)), m.group(2), col))
+            continue
+        m = _TOTAL_COL_RE.match(col)
+        if m:
+            total_ladders.setdefault(("Total", m.group(1).lower()), []).append((float(m.group(2)), m.group(2), col))
+            continue
+        m = _IT_COL_RE.match(col)
+        if m:
+            total_ladders.setdefault((f"IT_{m.group(1)}", m.group(3)), []).append((float(m.group(2)), m.group(2), col))
+    for ladder in list(handicap_ladders.values()) + list(total_ladders.values()):
+        ladder.sort()
+
+    rules = []
+
+    # форы: коэффициент не растёт вместе с форой
+    for side, ladder in handicap_ladders.items():
+        rules.append({
+            "check": "monotonic", "market": f"AH_{side}", "title": HANDICAP_NAMES.get(side, side),
+            "cols": [c for _, _, c in ladder], "labels": [f"F({raw})" for _, raw, _ in ladder],
+            "increasing": False, "verb": "должна быть >=",
+        })
+
+    # тоталы/ИТ: over растёт с линией, under падает
+    for (market, kind), ladder in total_ladders.items():
+        increasing = kind == "over"
+        rules.append({
+            "check": "monotonic", "market": market, "title": _LADDER_TITLES[market],
+            "cols": [c for _, _, c in ladder], "labels": [f"{_SIDE_LABELS[kind]} {raw}" for _, raw, _ in ladder],
+            "increasing": increasing, "verb": "должно быть <=" if increasing else "должно быть >=",
+        })
+
+    # маржа: 1X2
+    if all(c in columns for c in _1X2_COLS):
+        rules.append({"check": "overround", "market": "1X2", "title": "1X2", "cols": list(_1X2_COLS)})
+
+    # маржа: тоталы/ИТ (over + under на одной линии)
+    for (market, kind), ladder in total_ladders.items():
+        if kind != "over":
+            continue
+        under = {line: c for line, _, c in total_ladders.get((market, "under"), [])}
+        for line, raw, over_col in ladder:
+            if line in under:
+                rules.append({
+                    "check": "overround", "market": f"{market}_{raw}",
+                    "title": f"{_LADDER_TITLES[market]} {raw}", "cols": [over_col, under[line]],
+                })
+
+    # маржа: форы (Home F(h) против Away F(-h))
+    for side, other in _OPPOSITE_SIDE.items():
+        if side not in handicap_ladders or other not in handicap_ladders:
+            continue
+        other_cols = {h: (raw, c) for h, raw, c in handicap_ladders[other]}
+        for h, raw, col in handicap_ladders[side]:
+            if -h in other_cols:
+                other_raw, other_col = other_cols[-h]
+                rules.append({
+                    "check": "overround", "market": f"AH_{h:+g}",
+                    "title": f"Фора F({raw}) / F({other_raw})", "cols": [col, other_col],
+                })
+
+    _RULES[columns] = rules
+    return rules
+
+
 class OddsValidator:
+    def __init__(self, overround_min=None, overround_max=None, config=None):
+        self.config = PricingConfig.coerce(config)
+        self.overround_min = self.config["OVERROUND_MIN"] if overround_min is None else float(overround_min)
+        self.overround_max = self.config["OVERROUND_MAX"] if overround_max is None else float(overround_max)
+
+    # ==================================================
+    # ОДИН МАТЧ (MatchPrice или вложенный dict из calculate_match_odds)
+    # ==================================================
     def validate(self, match_odds):
         """
         Проверка логичности коэффициентов
 
-        ПРАВИЛА:
-        1. Для отрицательных фор (фаворит): чем больше фора, тем ВЫШЕ коэффициент
-           F(-0.5) < F(-1.5) < F(-2.5)
+        ПРАВИЛА (_market_rules, общие с validate_batch):
+        1. Для каждой стороны коэффициент не растёт вместе с форой:
+           F(-2.5) >= F(-1.5) >= F(0) >= F(+1.5) >= F(+2.5)
+
+        2. Тоталы/ИТ: Больше растёт с линией, Меньше падает.
 
-        2. Для положительных фор (аутсайдер): чем больше фора, тем НИЖЕ коэффициент
-           F(+0.5) > F(+1.5) > F(+2.5)
+        3. Сумма обратных коэффициентов пары (1X2 — тройки, форы — Home F(h)
+           против Away F(-h)) лежит в [OVERROUND_MIN, OVERROUND_MAX].
+
+        Пропуски (None/NaN/0) не проверяются; в лесенке сравниваются соседние
+        заполненные коэффициенты.
         """
-        warnings = []
-        handicaps = match_odds.get('handicaps', {})
-
-        # Проверка Team1
-        if 'Team1' in handicaps:
-            team1 = handicaps['Team1']
-            team_name = team1.get('name', 'Team1')
-
-            # Извлекаем форы
-            foras = []
-            for key, value in team1.items():
-                if key.startswith('F(') and value is not None:
-                    handicap_val = self._extract_handicap_value(key)
-                    foras.append((handicap_val, key, value))
-
-            # Сортируем по значению форы
-            foras.sort(key=lambda x: x[0])
-
-            # Проверяем логику
-            for i in range(len(foras) - 1):
-                current_val, current_name, current_odd = foras[i]
-                next_val, next_name, next_odd = foras[i + 1]
-
-                # Определяем правило в зависимости от знака
-                if current_val < 0 and next_val < 0:
-                    # Отрицательные форы: коэффициент должен расти
-                    # F(-2.5) > F(-1.5) > F(-0.5)
-                    if current_odd < next_odd:
-                        warnings.append(
-                            f"⚠️  {team_name}: {current_name} ({current_odd:.2f}) должна быть >= {next_name} ({next_odd:.2f})"
-                        )
-                elif current_val > 0 and next_val > 0:
-                    # Положительные форы: коэффициент должен падать
-                    # F(+0.5) > F(+1.5) > F(+2.5)
-                    if current_odd < next_odd:
-                        warnings.append(
-                            f"⚠️  {team_name}: {current_name} ({current_odd:.2f}) должна быть >= {next_name} ({next_odd:.2f})"
-                        )
-
-        # Проверка Team2
-        if 'Team2' in handicaps:
-            team2 = handicaps['Team2']
-            team_name = team2.get('name', 'Team2')
-
-            # Извлекаем форы
-            foras = []
-            for key, value in team2.items():
-                if key.startswith('F(') and value is not None:
-                    handicap_val = self._extract_handicap_value(key)
-                    foras.append((handicap_val, key, value))
-
-            # Сортируем по значению форы
-            foras.sort(key=lambda x: x[0])
-
-            # Проверяем логику
-            for i in range(len(foras) - 1):
-                current_val, current_name, current_odd = foras[i]
-                next_val, next_name, next_odd = foras[i + 1]
-
-                # Определяем правило в зависимости от знака
-                if current_val < 0 and next_val < 0:
-                    # Отрицательные форы: коэффициент должен расти
-                    if current_odd < next_odd:
-                        warnings.append(
-                            f"⚠️  {team_name}: {current_name} ({current_odd:.2f}) должна быть >= {next_name} ({next_odd:.2f})"
-                        )
-                elif current_val > 0 and next_val > 0:
-                    # Положительные форы: коэффициент должен падать
-                    if current_odd < next_odd:
-                        warnings.append(
-                            f"⚠️  {team_name}: {current_name} ({current_odd:.2f}) должна быть >= {next_name} ({next_odd:.2f})"
-                        )
-
-        # Проверка тоталов
-        totals = match_odds.get('totals', {})
-        for line in [8.5, 9.5, 10.5, 11.5]:
-            over_key = f'Over_{line}'
-            under_key = f'Under_{line}'
-
-            if over_key in totals and under_key in totals:
-                over_odd = totals[over_key]
-                under_odd = totals[under_key]
-
-                if over_odd and under_odd:
-                    # Проверяем, что сумма обратных вероятностей близка к 1 + маржа
-                    sum_probs = (1/over_odd) + (1/under_odd)
-                    if not (1.05 <= sum_probs <= 1.15):  # Допустимый диапазон с маржой 8.5%
-                        warnings.append(
-                            f"⚠️  Тотал {line}: сумма вероятностей {sum_probs:.3f} (норма 1.08-1.10)"
-                        )
-
-        return warnings
-
-    def _extract_handicap_value(self, handicap_str):
+        if isinstance(match_odds, MatchPrice):
+            layout = match_odds.layout
+            odds = np.asarray(match_odds.odds, dtype=float)
+        else:
+            # вложенный dict (манифест, старый формат) — по раскладке линий config
+            layout = market_layout(self.config)
+            odds = np.array([self._dict_odd(match_odds, layout, i) for i in range(len(layout))])
+        found = self._violations(odds[None, :], layout.columns)
+        return [msg for v in found for msg in v["message"]]
+
+    @staticmethod
+    def _dict_odd(match_odds, layout, i):
+        v = match_odds.get(layout.sections[i]) or {}
+        if layout.teams[i] is not None:
+            v = v.get(layout.teams[i]) or {}
+        v = v.get(layout.labels[i])
+        return np.nan if v is None else float(v)
+
+    # ==================================================
+    # BATCH (плоская таблица результатов, все матчи сразу)
+    # ==================================================
+    def validate_batch(self, results_df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Те же правила, что и validate(), но сразу для всех матчей:
+        results_df — плоская таблица как в reports/predictions.csv или
+        PriceBatch.to_frame() (Handicap_<side>_F(h), Total_Over_<l>/Total_Under_<l>,
+        Home_IT_<l>_over/..., Corners_P1/X/P2).
+
+        Возвращает "длинный" df: одна строка = одно нарушение
+          row, HomeTeam, AwayTeam, market, check, column, ref_column,
+          value, ref_value, message
+        """
+        import pandas as pd
+
+        columns = list(results_df.columns)
+        rules = _market_rules(columns)
+        used = list(dict.fromkeys(c for rule in rules for c in rule["cols"]))
+        odds = self._odds_matrix(results_df, used)
+
+        parts = []
+        for v in self._violations(odds, used):
+            out = self._frame(results_df, v["rows"])
+            for key in _WARNING_COLUMNS[3:]:
+                out[key] = v[key]
+            parts.append(out)
+
+        if not parts:
+            return pd.DataFrame(columns=_WARNING_COLUMNS)
+        return pd.concat(parts, ignore_index=True)[_WARNING_COLUMNS]
+
+    # ==================================================
+    # ПРАВИЛА (общие для validate и validate_batch)
+    # ==================================================
+    def _violations(self, odds, columns):
         """
-        Извлекает числовое значение форы из строки типа 'F(-1.5)' или 'F(+2.5)'
+        odds — [матчи x columns]; -> список нарушений по правилам _market_rules(columns),
+        каждое — dict массивов: rows, market, check, column, ref_column, value, ref_value, message.
         """
-        import re
-        match = re.search(r'([+-]?\d+\.?\d*)', handicap_str)
-        if match:
-            return float(match.group(1))
-        return 0.0
\ No newline at end of file
+        position = {c: i for i, c in enumerate(columns)}
+        found = []
+        for rule in _market_rules(columns):
+            sub = odds[:, [position[c] for c in rule["cols"]]]
+            if rule["check"] == "monotonic":
+                v = self._ladder_violations(sub, rule)
+            else:
+                v = self._overround_violations(sub, rule)
+            if v is not None:
+                v["market"] = rule["market"]
+                v["check"] = rule["check"]
+                found.append(v)
+        return found
+
+    @staticmethod
+    def _ladder_violations(odds, rule):
+        n_cols = odds.shape[1]
+        if n_cols < 2:
+            return None
+
+        # каждый коэффициент сравнивается с предыдущим заполненным в лесенке
+        valid = np.isfinite(odds) & (odds > 0)
+        last = np.maximum.accumulate(np.where(valid, np.arange(n_cols), -1), axis=1)
+        prev = last[:, :-1]
+        prev_odds = np.take_along_axis(odds, np.maximum(prev, 0), axis=1)
+        cur_odds = odds[:, 1:]
+        ok = valid[:, 1:] & (prev >= 0)
+        bad = ok & ((prev_odds > cur_odds) if rule["increasing"] else (prev_odds < cur_odds))
+        rows, pos = np.nonzero(bad)
+        if len(rows) == 0:
+            return None
+
+        ref = prev[rows, pos]
+        cols = np.asarray(rule["cols"], dtype=object)
+        labels = np.asarray(rule["labels"], dtype=object)
+        value, ref_value = prev_odds[rows, pos], cur_odds[rows, pos]
+        return {
+            "rows": rows,
+            "column": cols[ref],
+            "ref_column": cols[pos + 1],
+            "value": value,
+            "ref_value": ref_value,
+            "message": [
+                f"⚠️  {rule['title']}: {a} ({v:.2f}) {rule['verb']} {b} ({rv:.2f})"
+                for a, v, b, rv in zip(labels[ref], value, labels[pos + 1], ref_value)
+            ],
+        }
+
+    def _overround_violations(self, odds, rule):
+        # пропуск (None/NaN, 0) хотя бы одного исхода -> рынок не проверяется
+        complete = (np.isfinite(odds) & (odds > 0)).all(axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            sum_probs = (1.0 / odds).sum(axis=1)
+        bad = complete & ((sum_probs < self.overround_min) | (sum_probs > self.overround_max))
+        rows = np.nonzero(bad)[0]
+        if len(rows) == 0:
+            return None
+
+        return {
+            "rows": rows,
+            "column": rule["cols"][0],
+            "ref_column": ",".join(rule["cols"][1:]),
+            "value": sum_probs[rows],
+            "ref_value": np.nan,
+            "message": [
+                f"⚠️  {rule['title']}: сумма вероятностей {s:.3f} "
+                f"(норма {self.overround_min:.2f}-{self.overround_max:.2f})"
+                for s in sum_probs[rows]
+            ],
+        }
+
+    @staticmethod
+    def _odds_matrix(results_df, cols):
+        import pandas as pd
+
+        return results_df[cols].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+
+    @staticmethod
+    def _frame(results_df, rows):
+        import pandas as pd
+
+        out = pd.DataFrame({"row": results_df.index.to_numpy()[rows]})
+        for c in ("HomeTeam", "AwayTeam"):
+            out[c] = results_df[c].to_numpy()[rows] if c in results_df.columns else None
+        return out
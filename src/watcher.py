@@ -0,0 +1,308 @@
+# src/watcher.py
+"""
+Горячая подгрузка данных для долгоживущих процессов (watch.py, сервисы).
+
+FileTail следит за CSV по (размер, mtime, inode) и читает только дописанный
+хвост (целые строки). DataWatcher применяет новые строки инкрементально:
+  - история  -> суммы/профили команд в кэше калькулятора (_accumulate_history),
+  - форма    -> индекс последних игр (_extend_form_index),
+и сбрасывает кэш цен только для затронутых команд. Файл переписан/усечён ->
+полная перезагрузка этого файла и сброс всего кэша.
+"""
+
+import csv
+import io
+import os
+import threading
+
+import numpy as np
+
+from src.config import CONFIG
+from src.data_loader import attach_team_ids
+from src.fast_loader import ArrayFrame, form_columns, history_columns
+
+
+class FileTail:
+    """
+    Смещение в файле + его (inode, размер, mtime): read() отдаёт только новые строки.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+        self.header = None
+        self._ident = None
+        self._mtime_ns = None
+
+    def read(self):
+        """
+        -> (колонки {имя: list[str]} или None, full)
+        full=True — файл прочитан целиком (первое чтение или файл переписан).
+        """
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None, False
+
+        ident = (st.st_dev, st.st_ino)
+        if self.header is not None and (
+            ident != self._ident
+            or st.st_size < self.offset
+            or (st.st_size == self.offset and st.st_mtime_ns != self._mtime_ns)
+        ):
+            # замена файла / усечение / правка на месте -> читаем заново
+            self.offset = 0
+            self.header = None
+        self._ident = ident
+        self._mtime_ns = st.st_mtime_ns
+
+        if st.st_size <= self.offset:
+            return None, False
+
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            data = f.read(st.st_size - self.offset)
+
+        full = self.header is None
+        if not full:
+            # недописанную последнюю строку оставляем до следующего read()
+            data = data[:data.rfind(b"\n") + 1]
+            if not data:
+                return None, False
+        self.offset += len(data)
+
+        text = data.decode("utf-8-sig" if full else "utf-8")
+        rows = [r for r in csv.reader(io.StringIO(text, newline="")) if r]
+        if full:
+            if not rows:
+                self.offset = 0
+                return None, False
+            self.header = [h.strip() for h in rows[0]]
+            rows = rows[1:]
+        columns = {h: [r[i].strip() if i < len(r) else "" for r in rows] for i, h in enumerate(self.header)}
+        return columns, full
+
+
+class DataWatcher:
+    """
+    История + форма в памяти, обновляемые по мере дописывания файлов,
+    и кэш цен по паре команд.
+
+        watcher = DataWatcher(calculator, "data/historical.csv", "data/history_5matches.csv")
+        watcher.start()                  # фоновый опрос раз в WATCH_INTERVAL секунд
+        odds = watcher.price("A", "B")   # из кэша, пока данные A/B не менялись
+    """
+
+    def __init__(self, calculator, history_path, form_path=None, team_strength=None, log=print):
+        self.calculator = calculator
+        self.team_strength = {} if team_strength is None else team_strength
+        self.log = log
+
+        self._history_tail = FileTail(history_path)
+        self._form_tail = FileTail(form_path) if form_path else None
+        self.history = None
+        self.form = None
+
+        self._prices = {}  # (ключ хозяев, ключ гостей) -> результат calculate_match_odds
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.poll()
+        if self.history is None:
+            raise ValueError(f"Нет данных истории: {history_path}")
+
+    # ==================================================
+    # PRICES
+    # ==================================================
+    def price(self, home_team, away_team):
+        with self._lock:
+            registry = self._stats()["registry"]
+            pair = (registry.key(home_team), registry.key(away_team))
+            result = self._prices.get(pair)
+            if result is None:
+                result = self.calculator.calculate_match_odds(
+                    self.history, home_team, away_team,
+                    team_strength=self.team_strength, form_df=self.form,
+                )
+                self._prices[pair] = result
+            return result
+
+    def _stats(self):
+        return self.calculator._get_corner_profiles_cached(self.history)
+
+    # ==================================================
+    # POLL
+    # ==================================================
+    def poll(self):
+        """
+        Один проход по файлам. Возвращает сводку:
+          history_rows / form_rows — сколько строк добавлено,
+          reloaded                 — файлы, перечитанные целиком,
+          affected                 — ключи команд, чьи цены сброшены,
+          invalidated              — сколько цен сброшено.
+        """
+        with self._lock:
+            summary = {"history_rows": 0, "form_rows": 0, "reloaded": [], "affected": set(), "invalidated": 0}
+            league_changed = False
+
+            raw, full = self._history_tail.read()
+            if raw is not None:
+                if full:
+                    self._load_history(raw)
+                    summary["reloaded"].append(self._history_tail.path)
+                else:
+                    summary["affected"] |= self._append_history(raw)
+                    league_changed = True
+                summary["history_rows"] = len(raw["HC"])
+
+            if self._form_tail is not None:
+                raw, full = self._form_tail.read()
+                if raw is not None:
+                    before = 0 if full or self.form is None else len(self.form)
+                    if full:
+                        self._load_form(raw)
+                        summary["reloaded"].append(self._form_tail.path)
+                    else:
+                        summary["affected"] |= self._append_form(raw)
+                    # строки после разбора (form_columns): в схеме формы нет колонки HC
+                    summary["form_rows"] = len(self.form) - before
+
+            if summary["reloaded"]:
+                summary["invalidated"] = len(self._prices)
+                self._prices.clear()
+            elif summary["affected"] or league_changed:
+                summary["invalidated"] = self._invalidate(summary["affected"], league_changed)
+            return summary
+
+    def _load_history(self, raw):
+        df = ArrayFrame(history_columns(raw, self._history_tail.path))
+        if self.calculator.registry is not None:
+            attach_team_ids(df, self.calculator.registry, [("HomeTeam", "HomeTeam_id"), ("AwayTeam", "AwayTeam_id")])
+        self.history = df
+        # кэш калькулятора по id(df): не полагаемся на то, что id старого объекта не переиспользуют
+        self.calculator._profiles_cache = None
+
+    def _load_form(self, raw):
+        df = ArrayFrame(form_columns(raw, self._form_tail.path))
+        if self.calculator.registry is not None:
+            attach_team_ids(df, self.calculator.registry, [("p1", "p1_id"), ("p2", "p2_id")], "history_5matches")
+        self.form = df
+        if self.history is not None:
+            self._stats()["form_id"] = None
+
+    def _append_history(self, raw):
+        """
+        Новые матчи истории -> суммы/профили в stats на месте. Возвращает ключи команд,
+        чьи цены устарели: сами команды + те, у кого они соперники в форме
+        (residual формы считается от профиля соперника).
+        """
+        columns = history_columns(raw, self._history_tail.path)
+        if not len(columns["HC"]):
+            return set()
+
+        stats = self._stats()
+        registry = stats["registry"]
+        home_ids = registry.intern_many(columns["HomeTeam"])
+        away_ids = registry.intern_many(columns["AwayTeam"])
+        if "HomeTeam_id" in self.history.columns:
+            columns["HomeTeam"] = registry.canonical_names(home_ids, columns["HomeTeam"])
+            columns["AwayTeam"] = registry.canonical_names(away_ids, columns["AwayTeam"])
+            columns["HomeTeam_id"] = home_ids
+            columns["AwayTeam_id"] = away_ids
+
+        self.history.append(columns)
+        touched = self.calculator._accumulate_history(stats, home_ids, away_ids, columns["HC"], columns["AC"])
+        affected = {registry.key(registry.names[i]) for i in touched}
+
+        if self.form is not None and len(self.form):
+            form = self.calculator._form_index(stats, self.form)
+            codes = list(form["code"])
+            opp_hit = np.isin(form["stats_id"], touched)
+            rows_home = opp_hit[form["p2"]]
+            rows_away = opp_hit[form["p1"]]
+            for code in np.unique(np.concatenate([form["p1"][rows_home], form["p2"][rows_away]])):
+                affected.add(codes[code])
+        return affected
+
+    def _append_form(self, raw):
+        columns = form_columns(raw, self._form_tail.path)
+        if not len(columns["Date"]):
+            return set()
+
+        if self.form is None:
+            self._load_form(raw)
+        else:
+            new = ArrayFrame(columns)
+            if self.calculator.registry is not None:
+                attach_team_ids(new, self.calculator.registry, [("p1", "p1_id"), ("p2", "p2_id")], "history_5matches")
+            start = len(self.form)
+            self.form.append({col: new[col] for col in new.columns})
+
+            stats = self._stats()
+            if stats["form_id"] == id(self.form):
+                self.calculator._extend_form_index(stats, self.form, start)
+
+        registry = self._stats()["registry"]
+        return {registry.key(name) for col in ("p1", "p2") for name in columns[col]}
+
+    def _invalidate(self, keys, league_changed):
+        """
+        Сбросить цены пар с командами из keys. league_changed — сдвинулись средние лиги:
+        сбрасываем и пары, где у команды нет своей истории (база = средняя лиги).
+        """
+        stats = self._stats()
+        registry = stats["registry"]
+
+        def uses_league_avg(key, n):
+            team_id = registry.lookup(key)
+            return team_id < 0 or not n[team_id]
+
+        stale = [
+            pair for pair in self._prices
+            if pair[0] in keys or pair[1] in keys or (
+                league_changed
+                and (uses_league_avg(pair[0], stats["home_n"]) or uses_league_avg(pair[1], stats["away_n"]))
+            )
+        ]
+        model = self.calculator._count_model(stats) if league_changed else None
+        if model is not None and model.config_key and self.calculator.config.get(model.config_key) is None:
+            # параметр распределения подобран по всей истории и сдвинулся — устарели все цены
+            stale = list(self._prices)
+        for pair in stale:
+            del self._prices[pair]
+        return len(stale)
+
+    # ==================================================
+    # BACKGROUND
+    # ==================================================
+    def start(self, interval=None):
+        """
+        Фоновый поток: poll() раз в interval секунд (по умолчанию CONFIG["WATCH_INTERVAL"]).
+        """
+        if self._thread is not None:
+            return
+        interval = CONFIG["WATCH_INTERVAL"] if interval is None else float(interval)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,), name="data-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                summary = self.poll()
+            except Exception as e:
+                self.log(f"⚠️ watcher: {e}")
+                continue
+            if summary["history_rows"] or summary["form_rows"]:
+                self.log(
+                    f"🔄 +{summary['history_rows']} матчей истории, +{summary['form_rows']} формы; "
+                    f"сброшено цен: {summary['invalidated']}"
+                )
@@ -0,0 +1,329 @@
+# src/writer.py
+
+import csv
+import os
+import threading
+from collections.abc import Mapping
+
+from src.config import CONFIG
+from src.results import FLOAT_FIELDS, HANDICAP_NAMES, MatchPrice, handicap_keys, market_layout
+
+# базовые (не рыночные) поля результата: (колонка, ключ в match_odds, тип)
+_BASE_FIELDS = [
+    ("lambda_home", "lambda_home", "float"),
+    ("lambda_away", "lambda_away", "float"),
+    ("expected_total", "expected_total", "float"),
+    ("favorite", "favorite", "str"),
+
+    ("base_lambda_home", "base_lambda_home", "float"),
+    ("base_lambda_away", "base_lambda_away", "float"),
+    ("strength_home", "strength_home", "float"),
+    ("strength_away", "strength_away", "float"),
+    ("strength_ratio", "strength_ratio", "float"),
+
+    ("form_home", "form_home", "float"),
+    ("form_away", "form_away", "float"),
+
+    ("anchor_line", "anchor_line", "float"),
+    ("anchor_scale", "anchor_scale", "float"),
+]
+
+_FORMATS = {
+    ".csv": "csv",
+    ".parquet": "parquet",
+    ".arrow": "arrow",
+    ".ipc": "arrow",
+    ".feather": "arrow",
+}
+
+
+def result_schema(config=None):
+    """
+    Фиксированная схема плоской таблицы результатов (считается один раз из линий).
+
+    Возвращает список (колонка, путь в match_odds, тип), где путь — кортеж
+    ключей во вложенном dict. "HomeTeam"/"AwayTeam" берутся не из odds.
+    """
+    config = CONFIG if config is None else config
+
+    schema = [
+        ("HomeTeam", None, "str"),
+        ("AwayTeam", None, "str"),
+    ]
+    schema.extend((col, (key,), kind) for col, key, kind in _BASE_FIELDS)
+
+    # 1X2 corners
+    for k in ("P1", "X", "P2"):
+        schema.append((f"Corners_{k}", ("odds_1x2", k), "float"))
+
+    # handicaps
+    for team_key in ("HomeTeam", "AwayTeam"):
+        schema.append((f"Handicap_{team_key}_Group", ("handicaps", team_key, "name"), "str"))
+        for k in handicap_keys(config["HANDICAP_LINES"]):
+            schema.append((f"Handicap_{team_key}_{k}", ("handicaps", team_key, k), "float"))
+
+    # тоталы
+    for line in config["TOTAL_LINES"]:
+        schema.append((f"Total_Over_{line}", ("totals", f"Over_{line}"), "float"))
+        schema.append((f"Total_Under_{line}", ("totals", f"Under_{line}"), "float"))
+
+    # индивидуальные тоталы
+    for prefix, section in (("Home", "individual_home"), ("Away", "individual_away")):
+        for line in config["IT_LINES"]:
+            for side in ("over", "under"):
+                key = f"IT_{line}_{side}"
+                schema.append((f"{prefix}_{key}", (section, key), "float"))
+
+    return schema
+
+
+def flatten_result(schema, home_team, away_team, match_odds):
+    """
+    Вложенный результат calculate_match_odds -> список значений в порядке схемы.
+    """
+    row = []
+    for col, path, kind in schema:
+        if path is None:
+            row.append(home_team if col == "HomeTeam" else away_team)
+            continue
+
+        v = match_odds
+        for key in path:
+            v = v.get(key) if isinstance(v, Mapping) else None
+            if v is None:
+                break
+
+        if v is None:
+            row.append(None)
+        elif kind == "float":
+            row.append(float(v))
+        else:
+            row.append(str(v))
+    return row
+
+
+def price_plan(schema, layout):
+    """
+    Схема -> откуда брать каждую колонку в MatchPrice (считается один раз):
+    ("team", 0/1), ("field", i), ("odds", i), ("const", значение), ("favorite"/"anchor_line", None).
+    """
+    fields = {k: i for i, k in enumerate(FLOAT_FIELDS)}
+    columns = {c: i for i, c in enumerate(layout.columns)}
+    plan = []
+    for col, path, _ in schema:
+        if path is None:
+            plan.append(("team", 0 if col == "HomeTeam" else 1))
+        elif path[0] in ("favorite", "anchor_line"):
+            plan.append((path[0], None))
+        elif len(path) == 1:
+            plan.append(("field", fields[path[0]]))
+        elif path[0] == "handicaps" and path[2] == "name":
+            plan.append(("const", HANDICAP_NAMES[path[1]]))
+        else:
+            plan.append(("odds", columns[col]))
+    return plan
+
+
+def flatten_price(plan, home_team, away_team, price):
+    """
+    MatchPrice -> строка в порядке схемы по индексам (без обхода вложенных dict).
+    """
+    values = price.values.tolist()
+    odds = price.odds.tolist()
+    row = []
+    for source, i in plan:
+        if source == "odds":
+            v = odds[i]
+            row.append(None if v != v else v)
+        elif source == "field":
+            row.append(values[i])
+        elif source == "team":
+            row.append(away_team if i else home_team)
+        elif source == "const":
+            row.append(i)
+        elif source == "favorite":
+            row.append(None if price.favorite is None else str(price.favorite))
+        else:
+            row.append(None if price.anchor_line is None else float(price.anchor_line))
+    return row
+
+
+class ResultWriter:
+    """
+    Пишет результаты по мере расчёта (строка за строкой), а не в конце прогона.
+
+    Формат — по расширению path:
+      .csv                     — дописываем строку + flush (падение посреди
+                                 прогона не теряет уже посчитанные матчи)
+      .parquet                 — row group на каждые batch_size матчей
+                                 (нужен pyarrow; файл читается только после close)
+      .arrow / .ipc / .feather — Arrow IPC stream, батч на каждые batch_size
+                                 матчей (нужен pyarrow; читается до последнего батча)
+
+    excel_mode:
+      "off"        — без Excel
+      "sync"       — Excel при close() (как раньше)
+      "background" — Excel в отдельном потоке после close()
+    """
+
+    def __init__(
+        self,
+        path="reports/predictions.csv",
+        excel_path=None,
+        excel_mode="sync",
+        batch_size=256,
+        config=None,
+        log=print,
+    ):
+        self.path = path
+        ext = os.path.splitext(path)[1].lower()
+        if ext not in _FORMATS:
+            raise ValueError(f"Неизвестный формат вывода: {path} (есть: {sorted(_FORMATS)})")
+        self.fmt = _FORMATS[ext]
+
+        if excel_mode not in ("off", "sync", "background"):
+            raise ValueError(f"excel_mode: off/sync/background, а не {excel_mode!r}")
+        self.excel_path = excel_path
+        self.excel_mode = excel_mode if excel_path else "off"
+
+        self.batch_size = max(1, int(batch_size))
+        self.schema = result_schema(config)
+        self.columns = [col for col, _, _ in self.schema]
+        self.layout = market_layout(CONFIG if config is None else config)
+        self._plan = price_plan(self.schema, self.layout)
+        self.log = log
+
+        self.n_rows = 0
+        self.excel_thread = None
+        self._closed = False
+
+        self._file = None
+        self._csv = None
+        self._arrow_writer = None
+        self._arrow_schema = None
+        self._pending = []
+
+    # --------------------------------------------------
+    def write(self, home_team, away_team, match_odds):
+        if isinstance(match_odds, MatchPrice) and match_odds.layout is self.layout:
+            row = flatten_price(self._plan, home_team, away_team, match_odds)
+        else:
+            row = flatten_result(self.schema, home_team, away_team, match_odds)
+        self.write_row(row)
+
+    def write_row(self, row):
+        if self.fmt == "csv":
+            if self._csv is None:
+                self._open_csv()
+            self._csv.writerow(["" if v is None else v for v in row])
+            self._file.flush()
+        else:
+            self._pending.append(row)
+            if len(self._pending) >= self.batch_size:
+                self._flush_arrow()
+        self.n_rows += 1
+
+    def close(self):
+        """
+        Дописывает хвост и закрывает файл. Excel (если включен) — в конце.
+        Возвращает поток Excel в режиме "background" (или None).
+        """
+        if self._closed:
+            return self.excel_thread
+        self._closed = True
+
+        # файл пишется и без строк (только заголовок/схема), иначе на диске
+        # остался бы результат прошлого прогона
+        if self.fmt == "csv":
+            if self._csv is None:
+                self._open_csv()
+            self._file.close()
+            self._file = None
+        else:
+            if self._pending or self._arrow_writer is None:
+                self._flush_arrow()
+            if self._arrow_writer is not None:
+                self._arrow_writer.close()
+                self._arrow_writer = None
+                self._file.close()
+                self._file = None
+
+        if self.n_rows == 0:
+            return None
+
+        self.log(f"\n💾 {self.fmt.upper()}: {self.path}")
+
+        if self.excel_mode == "sync":
+            self._write_excel()
+        elif self.excel_mode == "background":
+            self.excel_thread = threading.Thread(target=self._write_excel, name="excel-export")
+            self.excel_thread.start()
+        return self.excel_thread
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    # --------------------------------------------------
+    def _ensure_dir(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+
+    def _open_csv(self):
+        self._ensure_dir()
+        self._file = open(self.path, "w", newline="", encoding="utf-8")
+        self._csv = csv.writer(self._file, lineterminator="\n")
+        self._csv.writerow(self.columns)
+
+    def _arrow(self):
+        try:
+            import pyarrow as pa
+        except ImportError as e:
+            raise ImportError(f"Для формата {self.fmt} нужен pyarrow: pip install pyarrow ({e})")
+        return pa
+
+    def _flush_arrow(self):
+        pa = self._arrow()
+
+        if self._arrow_writer is None:
+            self._ensure_dir()
+            self._arrow_schema = pa.schema([
+                (col, pa.string() if kind == "str" else pa.float64())
+                for col, _, kind in self.schema
+            ])
+            self._file = open(self.path, "wb")
+            if self.fmt == "parquet":
+                import pyarrow.parquet as pq
+                self._arrow_writer = pq.ParquetWriter(self._file, self._arrow_schema)
+            else:
+                self._arrow_writer = pa.ipc.new_stream(self._file, self._arrow_schema)
+
+        if self._pending:
+            columns = list(zip(*self._pending))
+            batch = pa.RecordBatch.from_arrays(
+                [pa.array(columns[i], type=field.type) for i, field in enumerate(self._arrow_schema)],
+                schema=self._arrow_schema,
+            )
+            self._arrow_writer.write_batch(batch)
+        self._file.flush()
+        self._pending = []
+
+    def _read_back(self):
+        import pandas as pd
+
+        if self.fmt == "csv":
+            return pd.read_csv(self.path)
+        if self.fmt == "parquet":
+            return pd.read_parquet(self.path)
+        pa = self._arrow()
+        with pa.OSFile(self.path, "rb") as f:
+            return pa.ipc.open_stream(f).read_all().to_pandas()
+
+    def _write_excel(self):
+        try:
+            self._read_back().to_excel(self.excel_path, index=False)
+            self.log(f"💾 Excel: {self.excel_path}")
+        except Exception as e:
+            self.log(f"❌ Excel не сохранился: {e}")
@@ -0,0 +1,134 @@
+# watch.py
+
+import argparse
+import time
+
+from src.config import CONFIG, PricingConfig
+from src.data_loader import TeamRegistry, load_team_aliases
+from src.calculator import CornerOddsCalculator, ENGINES
+from src.distributions import DISTRIBUTIONS
+from src.fast_loader import load_future_arrays, load_team_strength_fast
+from src.profiles import load_ewma_state
+from src.watcher import DataWatcher
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Долгоживущий расчёт: следит за дописыванием истории/формы и пересчитывает затронутые матчи"
+    )
+    parser.add_argument("--history", default="data/historical.csv")
+    parser.add_argument("--form", default="data/history_5matches.csv")
+    parser.add_argument("--future", default="data/future_matches.csv")
+    parser.add_argument("--engine", choices=list(ENGINES), default=None)
+    parser.add_argument("--distribution", choices=list(DISTRIBUTIONS), default=None)
+    parser.add_argument(
+        "--half-life",
+        type=float,
+        default=None,
+        help="EWMA-профили команд с полупериодом N игр (по умолчанию CONFIG['PROFILE_HALF_LIFE'])",
+    )
+    parser.add_argument(
+        "--ewma-state",
+        nargs="?",
+        const=CONFIG["PROFILE_STATE_PATH"],
+        default=None,
+        help="файл EWMA-состояния: на старте продолжить с него (без пересчёта всей истории), "
+             "после новых матчей — сохранить; без значения — CONFIG['PROFILE_STATE_PATH']",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=None,
+        help="период опроса файлов, сек (по умолчанию CONFIG['WATCH_INTERVAL'])",
+    )
+    parser.add_argument("--once", action="store_true", help="один расчёт без ожидания изменений")
+    return parser.parse_args(argv)
+
+
+def _fixtures(path, registry):
+    df = load_future_arrays(path, registry=registry)
+    home_col, away_col = ("HomeTeam", "AwayTeam") if "HomeTeam" in df.columns else ("p1", "p2")
+    return [
+        (str(h).strip(), str(a).strip())
+        for h, a in zip(df[home_col], df[away_col])
+        if str(h).strip() and str(a).strip()
+    ]
+
+
+def _print_prices(watcher, fixtures, previous):
+    """
+    Печатает матчи, у которых изменились λ (кэш watcher'а не пересчитывает остальные).
+    """
+    for home, away in fixtures:
+        odds = watcher.price(home, away)
+        lambdas = (odds["lambda_home"], odds["lambda_away"])
+        if previous.get((home, away)) != lambdas:
+            previous[(home, away)] = lambdas
+            print(f"  {home} vs {away}: λ {lambdas[0]:.2f} / {lambdas[1]:.2f}  total {odds['expected_total']:.2f}")
+
+
+def _save_ewma(args, calculator, watcher):
+    """
+    --ewma-state: сохранить EWMA-состояние профилей текущей истории.
+    """
+    if not args.ewma_state:
+        return
+    with watcher._lock:
+        profiles = calculator.ewma_profiles(watcher.history)
+        if profiles is None:
+            print("⚠️ --ewma-state без PROFILE_HALF_LIFE / --half-life: состояние не сохраняется")
+            return
+        profiles.save(args.ewma_state, watcher._stats()["registry"].names)
+    print(f"💾 EWMA-состояние: {args.ewma_state} ({profiles.rows} матчей)")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    interval = CONFIG["WATCH_INTERVAL"] if args.interval is None else args.interval
+
+    registry = TeamRegistry(load_team_aliases("data/team_aliases.csv"))
+    config = PricingConfig() if args.half_life is None else PricingConfig(PROFILE_HALF_LIFE=args.half_life)
+    calculator = CornerOddsCalculator(
+        engine=args.engine,
+        config=config,
+        registry=registry,
+        distribution=args.distribution,
+        ewma_state=load_ewma_state(args.ewma_state),
+    )
+    try:
+        team_strength = load_team_strength_fast("data/team_strength.csv", registry=registry)
+    except Exception as e:
+        team_strength = {}
+        print(f"⚠️ team_strength отключен: {e}")
+
+    watcher = DataWatcher(calculator, args.history, args.form, team_strength=team_strength)
+    print(f"✅ История: {len(watcher.history)} матчей, форма: {len(watcher.form) if watcher.form is not None else 0}")
+    _save_ewma(args, calculator, watcher)
+
+    fixtures = _fixtures(args.future, registry)
+    previous = {}
+    print(f"\n🔄 {len(fixtures)} матч(ей):")
+    _print_prices(watcher, fixtures, previous)
+    if args.once:
+        return
+
+    print(f"\n👀 Слежу за {args.history}, {args.form} (каждые {interval:g} с, Ctrl+C — выход)")
+    try:
+        while True:
+            time.sleep(interval)
+            summary = watcher.poll()
+            if not (summary["history_rows"] or summary["form_rows"]):
+                continue
+            print(
+                f"\n🔄 +{summary['history_rows']} матчей истории, +{summary['form_rows']} формы; "
+                f"сброшено цен: {summary['invalidated']}"
+            )
+            if summary["history_rows"]:
+                _save_ewma(args, calculator, watcher)
+            _print_prices(watcher, fixtures, previous)
+    except KeyboardInterrupt:
+        print("\n👋 Остановлено")
+
+
+if __name__ == "__main__":
+    main()